@@ -11,8 +11,8 @@ from pydantic import BaseModel
 
 from app.db.session import get_db
 from app.models.favorite import Favorite
-from app.models.poi import POI
 from app.models.user import User
+from app.services.poi_cache import poi_cache
 
 router = APIRouter()
 
@@ -37,7 +37,7 @@ async def toggle_favorite(
     poi_id = request.poi_id
     
     # Check if POI exists
-    poi = db.query(POI).filter(POI.id == poi_id).first()
+    poi = await poi_cache.get(db, poi_id)
     if not poi:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -91,12 +91,12 @@ async def get_favorites(
         Favorite.user_id == user_id
     ).all()
     
-    # Get POI details for each favorite
+    # Get POI details for all favorites at once (mostly from cache)
+    pois_by_id = await poi_cache.get_many(db, [favorite.poi_id for favorite in favorites])
     favorite_pois = []
     for favorite in favorites:
-        poi = db.query(POI).filter(POI.id == favorite.poi_id).first()
-        if poi:
-            poi_dict = poi.to_dict()
+        poi_dict = pois_by_id.get(favorite.poi_id)
+        if poi_dict:
             poi_dict['is_favorite'] = True
             poi_dict['favorited_at'] = favorite.created_at.isoformat() if favorite.created_at else None
             favorite_pois.append(poi_dict)
@@ -1,40 +1,190 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from math import radians, cos, sin, asin, sqrt
+import asyncio
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
+from datetime import datetime
 from typing import List, Optional
 
-from sqlalchemy import or_
+import numpy as np
+from sqlalchemy import or_, tuple_
 from sqlalchemy.orm import Session
 
+from app.config import get_settings
+from app.db.fulltext import search_candidates
 from app.db.session import get_db
-from app.models.poi import POI
+from app.db.spatial import within_radius
+from app.models.poi import POI, POPULARITY_RANK, RATING_RANK
 from app.models.user_preferences import UserPreference
 from app.models.favorite import Favorite
+from app.models.route import Route
+from app.schemas.poi import POICorridorRequest
+from app.services.geo import rank_by_distance, top_k
+from app.services import poi_response_cache, poi_versions, redis_geo
+from app.services.autocomplete import autocomplete_index
+from app.services.city_catalogue import resolve_city_key, search_catalogue
+from app.services.distance_matrix import DEFAULT_TRANSPORT_MODE, TRANSPORT_PROFILES
+from app.services.map_clusters import map_clusters, viewport_from_rows
+from app.services.poi_cache import poi_cache
+from app.services.poi_fields import Projection, projection
+from app.services.poi_index import CircleHit, NearbyHit, poi_index
+from app.services.road_network import road_network
+from app.services.route_corridor import pois_along_path
+from app.services.route_geometry import path_from_legs
+from app.services.route_optimizer import load_stops, route_poi_ids
+from app.utils.conditional import is_not_modified, make_etag, not_modified, validator_headers
+from app.utils.polyline import decode_polyline
+from app.utils.pagination import decode_cursor, encode_cursor
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
+settings = get_settings()
+
+# Search near a location: how many radius candidates are ranked, and how much
+# being close counts next to the 0..1 text/rating/popularity score
+SEARCH_RADIUS_CANDIDATES = 1000
+SEARCH_DISTANCE_WEIGHT = 0.5
+MAP_FALLBACK_MAX_ROWS = 20000
+NETWORK_NEARBY_MAX_CANDIDATES = 500
+FIELDS_DESCRIPTION = "compact, list, detail or comma-separated POI field names"
+
+
+def _use_memory_index(fresh_as_of: Optional[datetime] = None) -> bool:
+    """
+    Whether to answer from the in-process index; with fresh_as_of only when
+    it has caught up with the changes up to then (commits of other workers
+    reach it through the periodic refresh)
+    """
+    if settings.NEARBY_BACKEND != "memory" or not poi_index.is_ready:
+        return False
+    return fresh_as_of is None or (poi_index.watermark is not None and poi_index.watermark >= fresh_as_of)
+
+
+async def _nearby_from_redis(
+    lat: float,
+    lon: float,
+    radius_km: float,
+    category: Optional[str] = None,
+    k: Optional[int] = None,
+) -> Optional[List[NearbyHit]]:
+    """Nearby candidates from the shared Redis GEO index, None when Redis is unavailable"""
+    if settings.NEARBY_BACKEND != "redis":
+        return None
+    try:
+        return await redis_geo.query_radius(lat, lon, radius_km, category=category, count=k)
+    except Exception:
+        logger.exception("Redis GEO query failed, falling back to the database")
+        return None
+
+
+def _nearby_from_db(
+    db: Session,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    category: Optional[str] = None,
+    k: Optional[int] = None,
+) -> List[NearbyHit]:
+    """Nearby candidates from the database spatial index, nearest first (at most k)"""
+    # Candidates from the spatial index (R*Tree / GiST, bounding box fallback)
+    query = db.query(POI.id, POI.category, POI.rating, POI.latitude, POI.longitude).filter(
+        within_radius(db.get_bind().dialect.name, lat, lon, radius_km),
+        POI.is_active == 1
+    )
+    
+    if category:
+        query = query.filter(POI.category == category)
+    
+    rows = query.all()
+    if not rows:
+        return []
+    
+    # Exact distance, radius cut and ordering in one vectorized pass
+    lats = np.fromiter((row.latitude for row in rows), dtype=np.float64, count=len(rows))
+    lons = np.fromiter((row.longitude for row in rows), dtype=np.float64, count=len(rows))
+    ranked = rank_by_distance(lat, lon, lats, lons, radius_km=radius_km, k=k)
+    return [
+        NearbyHit(rows[i].id, rows[i].category, rows[i].rating, float(ranked.distances[i]))
+        for i in ranked.order
+    ]
 
 
-def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+async def _network_hits(
+    db: Session,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    hits: List[NearbyHit],
+    transport_mode: str,
+) -> List[NearbyHit]:
     """
-    Calculate distance between two points using Haversine formula
-    İki nokta arası mesafe hesaplama (km)
+    Re-measure straight-line hits along the road network, nearest first
+    The straight line is never longer than the street path, so the radius
+    candidates already contain every POI within radius_km on the network.
+    The hierarchy search is pure Python, so it runs in a worker thread.
     """
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    km = 6371 * c  # Earth radius in km
-    return km
+    hits = hits[:NETWORK_NEARBY_MAX_CANDIDATES]
+    coordinates = dict(
+        (row.id, (row.latitude, row.longitude))
+        for row in db.query(POI.id, POI.latitude, POI.longitude).filter(POI.id.in_([hit.poi_id for hit in hits]))
+    )
+    hits = [hit for hit in hits if hit.poi_id in coordinates]
+    if not hits:
+        return hits
+    distances, _ = await asyncio.to_thread(
+        road_network.one_to_many,
+        lat,
+        lon,
+        [coordinates[hit.poi_id][0] for hit in hits],
+        [coordinates[hit.poi_id][1] for hit in hits],
+        transport_mode,
+        TRANSPORT_PROFILES[transport_mode].speed_kmh,
+    )
+    # Unreachable or unsnapped POIs keep their straight-line distance
+    distances = np.where(np.isnan(distances), [hit.distance_km for hit in hits], distances)
+    order = np.argsort(distances, kind="stable")
+    return [hits[i]._replace(distance_km=float(distances[i])) for i in order if distances[i] <= radius_km]
+
+
+def _projection(fields: Optional[str], default: str = "list") -> Projection:
+    try:
+        return projection(fields, default)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def _load_pois(db: Session, poi_ids: List[str], fields: Projection) -> dict:
+    """Load the projected fields of active POIs by id in one query, keyed by id"""
+    return fields.load(db, poi_ids, active_only=True)
+
+
+def _hydrate_hits(db: Session, hits: List[NearbyHit], fields: Projection, scores: Optional[dict] = None) -> List[dict]:
+    """Load the POIs of the final page and add distance (and score) in hit order"""
+    pois_by_id = _load_pois(db, [hit.poi_id for hit in hits], fields)
+    
+    result = []
+    for hit in hits:
+        poi_dict = pois_by_id.get(hit.poi_id)
+        if poi_dict is None:
+            continue
+        poi_dict['distance_km'] = round(hit.distance_km, 2)
+        if scores is not None:
+            poi_dict['score'] = scores[hit.poi_id]
+        result.append(poi_dict)
+    return result
 
 
-@router.get("/city/{city}", response_model=List[dict])
+@router.get("/city/{city}", response_class=ORJSONResponse)
 async def get_pois_by_city(
+    request: Request,
     city: str,
     category: Optional[str] = None,
     min_rating: Optional[float] = 0.0,
     limit: int = Query(default=50, le=200),
     offset: int = Query(default=0, ge=0),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value of the previous page"),
     user_id: Optional[str] = Query(default="test-user-1"),  # Şimdilik test için
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
     """
@@ -42,15 +192,72 @@ async def get_pois_by_city(
     Belirli bir şehirdeki POI'leri getir
     
     Parameters:
-    - city: Şehir adı (örn: "Istanbul", "Ankara")
+    - city: Şehir adı veya anahtarı (örn: "Istanbul", "istanbul", "Ankara")
     - category: Kategori filtresi (örn: "culture", "nightlife", "shopping")
     - min_rating: Minimum rating (0.0-5.0)
     - limit: Maksimum sonuç sayısı
-    - offset: Sayfalama için offset
+    - offset: Sayfalama için offset (eski istemciler için, cursor tercih edilmeli)
+    - cursor: Önceki sayfanın X-Next-Cursor header değeri
     - user_id: Kullanıcı ID (favori kontrolü için)
+    - fields: Dönen alanlar - compact, list (varsayılan), detail veya alan listesi
+    
+    Results are ordered by rating, popularity_score and id (all descending).
+    When more results exist the next page cursor is returned in the
+    X-Next-Cursor header; cursor pages are an index seek at any depth and do
+    not shift when rows before them change. Pages are shared through the
+    Redis response cache; is_favorite is added per user afterwards.
+    
+    The ETag comes from the city's version (newest updated_at and active
+    count) and the user's favorites; a matching If-None-Match gets 304 before
+    the page is loaded. No Last-Modified: deleted POIs and favorites change
+    the page without a newer updated_at, so If-Modified-Since could not tell.
     """
-    query = db.query(POI).filter(
-        POI.city.ilike(f"%{city}%"),  # Case-insensitive search
+    try:
+        after = decode_cursor(cursor, 3)
+        if after is not None:
+            after = (float(after[0]), float(after[1]), str(after[2]))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    projected = _projection(fields)
+    
+    # Resolve "istanbul" / "İstanbul" / "ist" to the canonical city key once,
+    # then the listing is an index lookup on (city_key, is_active, ...)
+    city_key = resolve_city_key(db, city)
+    if city_key is None:
+        return ORJSONResponse([])
+    
+    cache_key = poi_response_cache.city_listing_key(city_key, category, min_rating, limit, offset, cursor, projected.key)
+    version = await poi_versions.city_version(db, city_key, category)
+    etag = make_etag(cache_key, version, poi_versions.favorites_version(db, user_id))
+    headers = validator_headers(etag, None)
+    if is_not_modified(request, etag):
+        return not_modified(headers)
+    
+    page = await poi_response_cache.get(cache_key)
+    if page is None:
+        page = _city_page(db, city_key, category, min_rating, limit, offset, after, projected)
+        await poi_response_cache.put(cache_key, page, [poi_response_cache.city_tag(city_key)])
+    if page["next_cursor"]:
+        headers["X-Next-Cursor"] = page["next_cursor"]
+    
+    # Add is_favorite field (per user, so after the shared cache)
+    return ORJSONResponse(poi_response_cache.with_favorites(db, user_id, page["items"]), headers=headers)
+
+
+def _city_page(
+    db: Session,
+    city_key: str,
+    category: Optional[str],
+    min_rating: float,
+    limit: int,
+    offset: int,
+    after,
+    fields: Projection,
+) -> dict:
+    """One page of a city listing: {"items": [...], "next_cursor": ...}"""
+    # The keyset columns are selected after the projected ones for the cursor
+    query = db.query(*fields.columns, RATING_RANK.label("cursor_rating"), POPULARITY_RANK.label("cursor_popularity")).filter(
+        POI.city_key == city_key,
         POI.is_active == 1
     )
     
@@ -60,75 +267,132 @@ async def get_pois_by_city(
     if min_rating > 0:
         query = query.filter(POI.rating >= min_rating)
     
-    # Order by rating and popularity
-    query = query.order_by(POI.rating.desc(), POI.popularity_score.desc())
+    # Order by rating and popularity (id keeps the order total for the cursor)
+    query = query.order_by(RATING_RANK.desc(), POPULARITY_RANK.desc(), POI.id.desc())
     
-    pois = query.offset(offset).limit(limit).all()
-    
-    # Get user's favorites
-    favorite_poi_ids = set()
-    if user_id:
-        favorites = db.query(Favorite).filter(Favorite.user_id == user_id).all()
-        favorite_poi_ids = {fav.poi_id for fav in favorites}
+    if after is not None:
+        # Keyset: rows strictly after the last one of the previous page
+        query = query.filter(
+            tuple_(RATING_RANK, POPULARITY_RANK, POI.id) < tuple_(*after)
+        )
+    elif offset:
+        query = query.offset(offset)
     
-    # Add is_favorite field
-    result = []
-    for poi in pois:
-        poi_dict = poi.to_dict()
-        poi_dict['is_favorite'] = poi.id in favorite_poi_ids
-        result.append(poi_dict)
-    
-    return result
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last.cursor_rating, last.cursor_popularity, last.id])
+    return {"items": [fields.to_dict(row) for row in rows], "next_cursor": next_cursor}
 
 
-@router.get("/search", response_model=List[dict])
+@router.get("/search", response_class=ORJSONResponse)
 async def search_pois(
     q: str = Query(..., min_length=2, description="Free text query for POI name or description"),
     lat: Optional[float] = Query(None, description="User latitude"),
     lon: Optional[float] = Query(None, description="User longitude"),
     radius_km: float = Query(10.0, ge=0.1, le=100.0, description="Optional radius filter (km)"),
     limit: int = Query(default=50, le=200),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value of the previous page"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     db: Session = Depends(get_db),
 ):
     """
     Search POIs by keyword and optionally filter by proximity.
     Kullanıcı sorgusuna göre POI araması yapar.
+
+    Uses the full-text index (FTS5 / tsvector) ranked by text relevance,
+    rating and popularity. With lat/lon only POIs inside radius_km are
+    candidates and closer ones rank higher. The next page cursor is
+    returned in the X-Next-Cursor header.
     """
-    search_term = f"%{q}%"
-    query = db.query(POI).filter(
-        POI.is_active == 1,
-        or_(
-            POI.name.ilike(search_term),
-            POI.description.ilike(search_term),
-            POI.city.ilike(search_term),
-        ),
-    ).order_by(POI.rating.desc(), POI.popularity_score.desc())
-
-    results = query.limit(limit).all()
-    pois: List[dict] = []
+    try:
+        after = decode_cursor(cursor, 2)
+        if after is not None:
+            after = (float(after[0]), str(after[1]))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    projected = _projection(fields)
 
     include_distance = lat is not None and lon is not None
+    distances = {}
+    if include_distance:
+        # Radius cut before ranking: prefiltered by the spatial index in SQL
+        candidates = search_candidates(db, q, SEARCH_RADIUS_CANDIDATES, near=(lat, lon, radius_km))
+        page, distances, next_key = _rank_search_near(candidates, lat, lon, radius_km, limit, after)
+    else:
+        candidates = search_candidates(db, q, limit + 1, after=after)
+        page = [candidate.poi_id for candidate in candidates[:limit]]
+        next_key = None
+        if len(candidates) > limit:
+            next_key = [candidates[limit - 1].score, candidates[limit - 1].poi_id]
+
+    headers = {"X-Next-Cursor": encode_cursor(next_key)} if next_key is not None else None
 
-    for poi in results:
-        poi_dict = poi.to_dict()
+    pois_by_id = _load_pois(db, page, projected)
+    pois: List[dict] = []
+    for poi_id in page:
+        poi_dict = pois_by_id.get(poi_id)
+        if poi_dict is None:
+            continue
         if include_distance:
-            distance = calculate_distance(lat, lon, poi.latitude, poi.longitude)
-            poi_dict["distance_km"] = round(distance, 2)
-            if distance > radius_km:
-                continue
+            poi_dict["distance_km"] = round(distances[poi_id], 2)
         pois.append(poi_dict)
 
-    return pois
+    return ORJSONResponse(pois, headers=headers)
+
+
+def _rank_search_near(candidates, lat: float, lon: float, radius_km: float, limit: int, after):
+    """
+    Exact radius cut and combined text/rating/distance ranking of search candidates
+    Returns (page ids, distances by id, next cursor key or None)
+    """
+    if not candidates:
+        return [], {}, None
+    ranked = rank_by_distance(
+        lat,
+        lon,
+        [candidate.latitude for candidate in candidates],
+        [candidate.longitude for candidate in candidates],
+        radius_km=radius_km,
+    )
+    ids = np.array([candidate.poi_id for candidate in candidates])
+    scores = np.array([candidate.score for candidate in candidates], dtype=np.float64)
+    scores += SEARCH_DISTANCE_WEIGHT * (1.0 - np.minimum(ranked.distances / radius_km, 1.0))
+
+    keep = ranked.mask.copy()
+    if after is not None:
+        after_score, after_id = after
+        keep &= (scores < after_score) | ((scores == after_score) & (ids > after_id))
+    selected = np.flatnonzero(keep)
+    # Best score first, ties broken by id so the cursor is stable
+    selected = selected[np.lexsort((ids[selected], -scores[selected]))]
+
+    page = selected[:limit]
+    next_key = None
+    if len(selected) > limit:
+        last = page[-1]
+        next_key = [float(scores[last]), str(ids[last])]
+    return (
+        [str(ids[i]) for i in page],
+        {str(ids[i]): float(ranked.distances[i]) for i in page},
+        next_key,
+    )
 
 
-@router.get("/nearby", response_model=List[dict])
+@router.get("/nearby", response_class=ORJSONResponse)
 async def get_nearby_pois(
+    request: Request,
     lat: float = Query(..., description="User latitude"),
     lon: float = Query(..., description="User longitude"),
     radius_km: float = Query(default=5.0, ge=0.1, le=50.0, description="Search radius in km"),
     category: Optional[str] = None,
     user_id: Optional[str] = None,
     limit: int = Query(default=50, le=200),
+    network: bool = Query(default=False, description="Measure distances along the road network"),
+    transport_mode: str = Query(default=DEFAULT_TRANSPORT_MODE, pattern="^(walking|cycling|transit|driving)$"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
     """
@@ -142,76 +406,406 @@ async def get_nearby_pois(
     - category: Kategori filtresi (opsiyonel)
     - user_id: Kullanıcı ID (tercih bazlı sıralama için)
     - limit: Maksimum sonuç sayısı
-    """
-    # Calculate bounding box
-    lat_range = radius_km / 111.0  # 1 degree ≈ 111km
-    lon_range = radius_km / (111.0 * cos(radians(lat)))
+    - network: Mesafeyi yol ağı üzerinden ölç (ROAD_GRAPH_PATH yüklüyse)
+    - transport_mode: Yol ağı için ulaşım türü (walking, cycling, driving)
+    - fields: Dönen alanlar - compact, list (varsayılan), detail veya alan listesi
     
-    query = db.query(POI).filter(
-        POI.latitude.between(lat - lat_range, lat + lat_range),
-        POI.longitude.between(lon - lon_range, lon + lon_range),
-        POI.is_active == 1
-    )
+    Served from the in-process POI index (NEARBY_BACKEND="memory") or the
+    shared Redis GEO index ("redis"); only the returned page is loaded from
+    the database. With network=true the nearest candidates are re-measured
+    along the road network when it covers the transport mode.
     
-    if category:
-        query = query.filter(POI.category == category)
+    Without user preferences (and network) the POIs are shared through the
+    Redis response cache per ~150 m geohash cell and radius bucket; the
+    distances are measured from the caller's location.
+    
+    The ETag comes from the version (newest updated_at and active count) of
+    the POIs around the point, cached per cell on the shared path, and the
+    user's preferences; a matching If-None-Match gets 304 before any POI is
+    loaded. No Last-Modified, as for city listings.
+    """
+    projected = _projection(fields)
+    user_prefs = db.query(UserPreference).filter_by(user_id=user_id).first() if user_id else None
+    network = network and road_network.supports(transport_mode)
+    source = f"{transport_mode}@net" if network else "line"
+    if user_prefs is None and not network and poi_response_cache.enabled():
+        # POIs shared by everyone in the same ~150 m cell
+        cell, center_lat, center_lon, bucket_km = poi_response_cache.snap_nearby(lat, lon, radius_km)
+        reach_km = poi_response_cache.nearby_reach_km(bucket_km)
+        cache_key = poi_response_cache.nearby_key(cell, bucket_km, category, source, projected.key)
+        version = await poi_versions.cell_version(db, cell, center_lat, center_lon, reach_km, category)
+        etag = make_etag(cache_key, lat, lon, radius_km, limit, version)
+        headers = validator_headers(etag, None)
+        if is_not_modified(request, etag):
+            return not_modified(headers)
+        
+        entry = await poi_response_cache.get(cache_key)
+        if entry is None:
+            entry = await _nearby_entry(db, center_lat, center_lon, reach_km, category, projected, version.last_modified)
+            await poi_response_cache.put(cache_key, entry, poi_response_cache.nearby_tags(center_lat, center_lon, reach_km))
+        items = poi_response_cache.measure_nearby(entry, lat, lon, radius_km, limit)
+        if items is None:
+            # The cached POIs do not reach far enough from this location
+            hits = await _nearby_hits(db, lat, lon, radius_km, category, False, transport_mode, version.last_modified)
+            items = _hydrate_hits(db, hits[:limit], projected)
+        return ORJSONResponse(items, headers=headers)
     
-    pois = query.all()
+    top_categories = user_prefs.get_top_categories(limit=3) if user_prefs else None
+    version = poi_versions.area_version(db, lat, lon, radius_km, category)
+    etag = make_etag("nearby", lat, lon, radius_km, category, limit, source, projected.key, top_categories, version)
+    headers = validator_headers(etag, None)
+    if is_not_modified(request, etag):
+        return not_modified(headers)
     
-    # Calculate exact distance and filter
-    nearby_pois = []
-    for poi in pois:
-        distance = calculate_distance(lat, lon, poi.latitude, poi.longitude)
-        if distance <= radius_km:
-            poi_dict = poi.to_dict()
-            poi_dict['distance_km'] = round(distance, 2)
-            nearby_pois.append(poi_dict)
+    hits = await _nearby_hits(db, lat, lon, radius_km, category, network, transport_mode, version.last_modified)
     
     # Sort by distance or user preference
-    if user_id:
-        # Get user preferences
-        user_prefs = db.query(UserPreference).filter_by(user_id=user_id).first()
-        if user_prefs:
-            top_categories = user_prefs.get_top_categories(limit=3)
-            # Score POIs based on category preference and distance
-            for poi_dict in nearby_pois:
-                category_score = 0
-                if poi_dict['category'] in top_categories:
-                    category_score = (3 - top_categories.index(poi_dict['category'])) * 10
-                poi_dict['score'] = category_score - poi_dict['distance_km']
-            nearby_pois.sort(key=lambda x: x.get('score', 0), reverse=True)
+    scores = None
+    if user_prefs:
+        # Score POIs based on category preference and distance
+        boosts = {category: (3 - rank) * 10 for rank, category in enumerate(top_categories)}
+        distances = np.array([round(hit.distance_km, 2) for hit in hits], dtype=np.float64)
+        category_scores = np.array([boosts.get(hit.category, 0) for hit in hits], dtype=np.float64)
+        order = top_k(distances - category_scores, limit)
+        scores = {hits[i].poi_id: float(category_scores[i] - distances[i]) for i in order}
+        hits = [hits[i] for i in order]
+    
+    return ORJSONResponse(_hydrate_hits(db, hits[:limit], projected, scores), headers=headers)
+
+
+async def _nearby_entry(
+    db: Session,
+    center_lat: float,
+    center_lon: float,
+    reach_km: float,
+    category: Optional[str],
+    fields: Projection,
+    fresh_as_of: Optional[datetime],
+) -> dict:
+    """Response cache entry of a nearby cell: the nearest POIs with their coordinates"""
+    hits = await _nearby_hits(db, center_lat, center_lon, reach_km, category, False, DEFAULT_TRANSPORT_MODE, fresh_as_of)
+    cached = hits[:poi_response_cache.NEARBY_CACHED_ROWS]
+    items = _hydrate_hits(db, cached, fields.including("location"))
+    points = [(item["location"]["latitude"], item["location"]["longitude"]) for item in items]
+    for item in items:
+        del item["distance_km"]
+        if "location" not in fields.fields:
+            del item["location"]
+    # Every POI left out is at least as far from the center as the first one left out
+    if len(hits) > len(cached):
+        reach_km = hits[len(cached)].distance_km
+    return poi_response_cache.nearby_entry(center_lat, center_lon, reach_km, items, points)
+
+
+async def _nearby_hits(
+    db: Session,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    category: Optional[str],
+    network: bool,
+    transport_mode: str,
+    fresh_as_of: Optional[datetime] = None,
+) -> List[NearbyHit]:
+    """
+    Nearby hits from the configured backend, nearest first
+    fresh_as_of: newest change the hits must reflect; the database answers
+    when the in-process index has not caught up with it yet.
+    """
+    if _use_memory_index(fresh_as_of):
+        hits = poi_index.query_radius(lat, lon, radius_km, category=category)
+    else:
+        hits = await _nearby_from_redis(lat, lon, radius_km, category)
+        if hits is None:
+            hits = _nearby_from_db(db, lat, lon, radius_km, category)
+    
+    if network and road_network.supports(transport_mode):
+        hits = await _network_hits(db, lat, lon, radius_km, hits, transport_mode)
+    return hits
+
+
+@router.get("/nearest", response_class=ORJSONResponse)
+async def get_nearest_pois(
+    lat: float = Query(..., description="User latitude"),
+    lon: float = Query(..., description="User longitude"),
+    k: int = Query(default=20, ge=1, le=200, description="Number of POIs to return"),
+    category: Optional[str] = None,
+    max_radius_km: float = Query(default=50.0, gt=0, le=500.0, description="Give up beyond this distance (km)"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the k nearest POIs, e.g. "the 20 closest cafés"
+    En yakın k POI'yi getir
+    
+    Parameters:
+    - lat: Kullanıcının enlem koordinatı
+    - lon: Kullanıcının boylam koordinatı
+    - k: Sonuç sayısı
+    - category: Kategori filtresi (opsiyonel)
+    - max_radius_km: Maksimum arama mesafesi (km)
+    - fields: Dönen alanlar - compact, list (varsayılan), detail veya alan listesi
+    """
+    projected = _projection(fields)
+    hits = None
+    if _use_memory_index():
+        hits = poi_index.query_nearest(lat, lon, k, category=category, max_radius_km=max_radius_km)
+    else:
+        hits = await _nearby_from_redis(lat, lon, max_radius_km, category, k=k)
+    
+    if hits is None:
+        # Grow the radius until k POIs are found
+        radius_km = min(1.0, max_radius_km)
+        while True:
+            hits = _nearby_from_db(db, lat, lon, radius_km, category, k=k)
+            if len(hits) >= k or radius_km >= max_radius_km:
+                break
+            radius_km = min(radius_km * 4, max_radius_km)
+    
+    return ORJSONResponse(_hydrate_hits(db, hits, projected))
+
+
+def _corridor_from_db(db: Session, circles, category: Optional[str] = None) -> List[CircleHit]:
+    """Corridor candidates from the database spatial index, one indexed lookup per circle"""
+    dialect_name = db.get_bind().dialect.name
+    hits = []
+    for circle, (lat, lon, radius_km) in enumerate(circles):
+        query = db.query(POI.id, POI.category, POI.rating, POI.latitude, POI.longitude).filter(
+            within_radius(dialect_name, lat, lon, radius_km),
+            POI.is_active == 1
+        )
+        if category:
+            query = query.filter(POI.category == category)
+        hits.extend(CircleHit(row.id, row.category, row.rating, row.latitude, row.longitude, circle) for row in query)
+    return hits
+
+
+@router.post("/along-route", response_class=ORJSONResponse)
+async def get_pois_along_route(
+    request: POICorridorRequest,
+    user_id: Optional[str] = Query(default="test-user-1"),  # Şimdilik test için
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: Session = Depends(get_db)
+):
+    """
+    Get POIs along a route, e.g. "cafés along my walk"
+    Rota boyunca (koridor içindeki) POI'leri getir
+    
+    Parameters:
+    - polyline: Rota çizgisi (Google encoded polyline) veya
+    - route_id: Kayıtlı rota (kullanıcının kendi rotası ya da herkese açık rota)
+    - width_km: Koridor genişliği - rotaya en fazla uzaklık (km)
+    - category: Kategori filtresi (opsiyonel)
+    - limit: Maksimum sonuç sayısı
+    - fields: Dönen alanlar - compact, list (varsayılan), detail veya alan listesi
+    
+    POIs within width_km of the route, smallest detour (out and back from
+    the closest point of the route) first. Each carries distance_km (to the
+    route), detour_km and along_km (from the start of the route). A saved
+    route uses its leg geometry and leaves out its own stops.
+    """
+    projected = _projection(fields)
+    exclude = set()
+    if request.route_id:
+        route = db.query(Route).filter(Route.id == request.route_id).first()
+        if route is None or (route.user_id != user_id and not route.is_public):
+            raise HTTPException(status_code=404, detail="Route not found")
+        poi_ids = route_poi_ids(route.pois)
+        exclude = set(poi_ids)
+        if route.legs:
+            path = path_from_legs(route.legs)
         else:
-            nearby_pois.sort(key=lambda x: x['distance_km'])
+            path = [(stop.latitude, stop.longitude) for stop in load_stops(db.connection(), poi_ids)]
     else:
-        nearby_pois.sort(key=lambda x: x['distance_km'])
+        try:
+            path = decode_polyline(request.polyline)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid polyline")
+    if not path:
+        raise HTTPException(status_code=400, detail="Route has no points")
     
-    return nearby_pois[:limit]
+    if _use_memory_index():
+        query_circles = lambda circles: poi_index.query_circles(circles, category=request.category)
+    else:
+        query_circles = lambda circles: _corridor_from_db(db, circles, request.category)
+    hits = pois_along_path(path, request.width_km, query_circles, exclude=exclude, limit=request.limit)
+    
+    pois_by_id = _load_pois(db, [hit.poi_id for hit in hits], projected)
+    result = []
+    for hit in hits:
+        poi_dict = pois_by_id.get(hit.poi_id)
+        if poi_dict is None:
+            continue
+        poi_dict['distance_km'] = round(hit.distance_km, 3)
+        poi_dict['detour_km'] = round(hit.detour_km, 3)
+        poi_dict['along_km'] = round(hit.along_km, 3)
+        result.append(poi_dict)
+    return ORJSONResponse(result)
+
+
+@router.get("/autocomplete", response_class=ORJSONResponse)
+async def autocomplete_pois(
+    q: str = Query(..., min_length=1, max_length=100, description="Partially typed query"),
+    lat: Optional[float] = Query(None, description="User latitude (proximity boost)"),
+    lon: Optional[float] = Query(None, description="User longitude (proximity boost)"),
+    limit: int = Query(default=8, ge=1, le=20),
+    db: Session = Depends(get_db)
+):
+    """
+    Lightweight typeahead suggestions for the search box
+    Arama kutusu için hafif otomatik tamamlama önerileri
+    
+    Returns only id, name, city and category (plus distance_km when a
+    location is given), served from the in-memory prefix/trigram index.
+    """
+    if autocomplete_index.is_ready:
+        return ORJSONResponse([
+            {
+                "id": suggestion.poi_id,
+                "name": suggestion.name,
+                "city": suggestion.city,
+                "category": suggestion.category,
+                **({"distance_km": round(suggestion.distance_km, 2)} if suggestion.distance_km is not None else {}),
+            }
+            for suggestion in autocomplete_index.suggest(q, limit=limit, lat=lat, lon=lon)
+        ])
+    
+    # Index not built yet: plain name prefix match
+    rows = db.query(POI.id, POI.name, POI.city, POI.category).filter(
+        POI.is_active == 1,
+        POI.name.ilike(f"{q}%")
+    ).order_by(POI.rating.desc()).limit(limit).all()
+    return ORJSONResponse([{"id": row.id, "name": row.name, "city": row.city, "category": row.category} for row in rows])
 
 
-@router.get("/{poi_id}", response_model=dict)
+@router.get("/map", response_class=ORJSONResponse)
+async def get_map_viewport(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    zoom: int = Query(..., ge=0, le=22, description="Map zoom level (slippy map)"),
+    max_points: int = Query(default=500, ge=1, le=2000),
+    db: Session = Depends(get_db)
+):
+    """
+    Clusters and individual POIs for a map viewport
+    Harita görünümü için kümeler ve tekil POI'ler
+    
+    Clusters (count, centroid, dominant category) come from the precomputed
+    zoom pyramid; cells with a single POI and zoom levels above 16 return
+    the POIs themselves. min_lon > max_lon means the viewport crosses the
+    antimeridian.
+    """
+    if min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="min_lat must not be greater than max_lat")
+    bbox = (min_lat, min_lon, max_lat, max_lon)
+    
+    if map_clusters.is_ready:
+        clusters, points = map_clusters.viewport(bbox, zoom, max_points)
+    else:
+        # Pyramid not built yet: cluster the rows of the viewport on the fly
+        query = db.query(POI.id, POI.latitude, POI.longitude, POI.category).filter(
+            POI.is_active == 1,
+            POI.latitude.between(min_lat, max_lat),
+        )
+        if min_lon <= max_lon:
+            query = query.filter(POI.longitude.between(min_lon, max_lon))
+        else:
+            query = query.filter(or_(POI.longitude >= min_lon, POI.longitude <= max_lon))
+        rows = query.limit(MAP_FALLBACK_MAX_ROWS).all()
+        clusters, points = viewport_from_rows(rows, bbox, zoom, max_points)
+    
+    # Names and ratings for the individual POIs
+    details = {}
+    if points:
+        details = {
+            row.id: row for row in db.query(POI.id, POI.name, POI.rating).filter(
+                POI.id.in_([point.poi_id for point in points])
+            )
+        }
+    
+    return ORJSONResponse({
+        "zoom": zoom,
+        "clusters": [
+            {
+                "count": cluster.count,
+                "latitude": cluster.latitude,
+                "longitude": cluster.longitude,
+                "dominant_category": cluster.dominant_category,
+                "categories": cluster.categories,
+            }
+            for cluster in clusters
+        ],
+        "pois": [
+            {
+                "id": point.poi_id,
+                "name": details[point.poi_id].name,
+                "latitude": point.latitude,
+                "longitude": point.longitude,
+                "category": point.category,
+                "rating": details[point.poi_id].rating,
+            }
+            for point in points
+            if point.poi_id in details
+        ],
+    })
+
+
+@router.get("/cities", response_class=ORJSONResponse)
+async def get_cities(
+    q: Optional[str] = Query(None, max_length=100, description="City name or prefix"),
+    limit: int = Query(default=50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """
+    City catalogue: canonical city keys with display name and POI count
+    Şehir kataloğu - standart şehir anahtarları ve POI sayıları
+    
+    Use the returned key with /pois/city/{city}.
+    """
+    return ORJSONResponse(search_catalogue(db, q, limit=limit))
+
+
+@router.get("/{poi_id}", response_class=ORJSONResponse)
 async def get_poi(
+    request: Request,
     poi_id: str,
     user_id: Optional[str] = Query(default="test-user-1"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
     """
     Get a specific POI by ID
     ID'ye göre POI detaylarını getir
+
+    All fields by default (fields=detail). The ETag follows the POI's
+    updated_at and the favorite flag; matching requests get 304. Last-Modified
+    (updated_at) is only sent without user_id, as (un)favoriting does not
+    move it.
     """
-    poi = db.query(POI).filter(POI.id == poi_id).first()
-    if not poi:
+    projected = _projection(fields, default="detail")
+    payload = await poi_cache.get(db, poi_id)
+    if payload is None:
         raise HTTPException(status_code=404, detail="POI not found")
     
-    poi_dict = poi.to_dict()
-    
     # Check if favorited
+    is_favorite = False
     if user_id:
-        favorite = db.query(Favorite).filter(
+        favorite = db.query(Favorite.id).filter(
             Favorite.user_id == user_id,
             Favorite.poi_id == poi_id
         ).first()
-        poi_dict['is_favorite'] = favorite is not None
-    else:
-        poi_dict['is_favorite'] = False
+        is_favorite = favorite is not None
+    
+    last_modified = None
+    if payload.get("updated_at") and not user_id:
+        last_modified = datetime.fromisoformat(payload["updated_at"])
+    etag = make_etag(poi_id, payload.get("updated_at"), projected.key, is_favorite)
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
     
-    return poi_dict
+    poi_dict = projected.pick(payload)
+    poi_dict['is_favorite'] = is_favorite
+    return ORJSONResponse(poi_dict, headers=headers)
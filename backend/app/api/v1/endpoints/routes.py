@@ -0,0 +1,514 @@
+"""
+Routes API Endpoints
+Kullanıcı rotalarını kaydetme, güncelleme ve optimize etme
+"""
+
+import asyncio
+import logging
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.db.session import get_db
+from app.models.route import Route
+from app.models.user_preferences import UserPreference
+from app.schemas.route import (
+    DistanceMatrixRequest,
+    ItineraryGenerateRequest,
+    RouteCreate,
+    RouteOptimizeBulkRequest,
+    RouteOptimizeRequest,
+    RouteStopAdd,
+    RouteUpdate,
+    ScheduleRequest,
+)
+from app.services.city_catalogue import resolve_city_key
+from app.services.distance_matrix import DEFAULT_TRANSPORT_MODE, distance_matrices
+from app.services.itinerary_generator import generate_itinerary
+from app.services.itinerary_scheduler import MINUTES_PER_DAY, format_clock, parse_clock, plan_itinerary
+from app.services.route_geometry import legs_response
+from app.services.route_jobs import route_jobs
+from app.services.route_edits import RouteEditError, insert_stop, remove_stop
+from app.services.route_optimizer import load_stops, plan_legs, plan_route_async, plan_saved_route, route_poi_ids
+from app.services.shared_routes import CACHE_CONTROL, get_shared_payload, new_share_token, share_link
+from app.utils.conditional import etag_matches
+from app.utils.response_encoding import choose_encoding, prefers_msgpack, weak_etag
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+settings = get_settings()
+
+
+async def _route_response(db: Session, route: Route, geometry: str = "polyline", zoom: Optional[int] = None) -> dict:
+    """Route with the travel distance/duration of its stored order for every transport mode"""
+    stops = load_stops(db.connection(), route_poi_ids(route.pois))
+    route_dict = route.to_dict()
+    plan = await plan_route_async(stops, route.transport_mode, optimize=False)
+    route_dict["travel"] = plan.travel
+    legs = route.legs
+    if legs is None:
+        # Saved before legs were stored
+        legs = await asyncio.to_thread(plan_legs, plan)
+    route_dict["legs"] = legs_response(legs, geometry, zoom)
+    return route_dict
+
+
+async def _plan_and_commit(db: Session, route: Route) -> None:
+    """Plan the route on the job pool, then commit; nothing is saved when planning fails"""
+    try:
+        await plan_saved_route(db, route, route_jobs.executor)
+    except Exception:
+        logger.exception(f"Route {route.id}: planning failed")
+        db.rollback()
+        raise HTTPException(status_code=503, detail="Route could not be planned, please try again")
+    db.commit()
+
+
+def _get_user_route(db: Session, route_id: str, user_id: str) -> Route:
+    route = db.query(Route).filter(Route.id == route_id, Route.user_id == user_id).first()
+    if not route:
+        raise HTTPException(status_code=404, detail="Route not found")
+    return route
+
+
+@router.post("/optimize", response_model=dict)
+async def optimize_stops(
+    request: RouteOptimizeRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Optimize the visiting order of POIs without saving a route
+    Rotayı kaydetmeden durak sırasını optimize et
+
+    Returns the ordered POI ids and the street distance and travel time
+    for every transport mode.
+    """
+    stops = load_stops(db.connection(), request.poi_ids)
+    missing = set(request.poi_ids) - {stop.poi_id for stop in stops}
+    if missing:
+        raise HTTPException(status_code=404, detail=f"POI not found: {sorted(missing)[0]}")
+
+    plan = await plan_route_async(
+        stops, request.transport_mode, optimize=True, fixed_start=request.fixed_start, executor=route_jobs.executor
+    )
+    return plan.to_dict()
+
+
+@router.post("/schedule", response_model=dict)
+async def schedule_day(
+    request: ScheduleRequest,
+    user_id: Optional[str] = Query(default="test-user-1"),  # Şimdilik test için
+    db: Session = Depends(get_db)
+):
+    """
+    Plan a day: visiting order and times within opening hours
+    Günlük plan - açılış saatlerine ve müsait zamanlara göre ziyaret saatleri
+
+    Uses POI.opening_hours, average_visit_duration_minutes and best_visit_time
+    together with the user's available_times. Stops that cannot be visited
+    are listed in "unscheduled" with a reason. Pass the current plan's POI
+    ids as previous_order to re-plan incrementally after an edit.
+    """
+    if (request.start_latitude is None) != (request.start_longitude is None):
+        raise HTTPException(status_code=400, detail="start_latitude and start_longitude go together")
+
+    day = request.date or date.today()
+    day_start, day_end = parse_clock(request.start_time), parse_clock(request.end_time)
+    if day_end <= day_start:
+        day_end += MINUTES_PER_DAY  # plan ends after midnight
+    start_location = None
+    if request.start_latitude is not None:
+        start_location = (request.start_latitude, request.start_longitude)
+    preferences = db.query(UserPreference).filter(UserPreference.user_id == user_id).first() if user_id else None
+
+    schedule = await plan_itinerary(
+        db,
+        request.poi_ids,
+        day,
+        (day_start, day_end),
+        transport_mode=request.transport_mode,
+        start_location=start_location,
+        preferences=preferences,
+        previous_order=request.previous_order,
+        executor=route_jobs.executor,
+    )
+    return {
+        "date": day.isoformat(),
+        "transport_mode": request.transport_mode,
+        "stops": [
+            {
+                "poi_id": visit.poi_id,
+                "order": order,
+                "arrival": format_clock(visit.arrival),
+                "start": format_clock(visit.start),
+                "end": format_clock(visit.end),
+                "travel_minutes": visit.travel_minutes,
+                "wait_minutes": visit.wait_minutes,
+                "preferred_time": visit.preferred_time,
+            }
+            for order, visit in enumerate(schedule.visits, start=1)
+        ],
+        "unscheduled": [{"poi_id": poi_id, "reason": reason} for poi_id, reason in schedule.unscheduled],
+        "total_travel_minutes": schedule.travel_minutes,
+        "total_wait_minutes": schedule.wait_minutes,
+        "end_time": format_clock(schedule.end) if schedule.end is not None else None,
+    }
+
+
+@router.post("/generate", response_model=dict)
+async def generate_route(
+    request: ItineraryGenerateRequest,
+    user_id: Optional[str] = Query(default="test-user-1"),  # Şimdilik test için
+    db: Session = Depends(get_db)
+):
+    """
+    Generate an itinerary in a city from the user's preferences
+    Tercihlere göre otomatik gezi planı oluştur
+
+    Picks and orders POIs to collect the most preference-weighted value
+    (category scores, avoid_categories, budget_level vs price_level, rating)
+    while travel and visit time stay within time_budget_minutes. The
+    returned poi_ids can be saved with POST /routes.
+    """
+    city_key = resolve_city_key(db, request.city)
+    if city_key is None:
+        raise HTTPException(status_code=404, detail="City not found")
+    preferences = db.query(UserPreference).filter(UserPreference.user_id == user_id).first() if user_id else None
+
+    itinerary = await generate_itinerary(
+        city_key,
+        (request.start_latitude, request.start_longitude),
+        request.time_budget_minutes,
+        preferences=preferences,
+        transport_mode=request.transport_mode,
+        max_stops=request.max_stops,
+        executor=route_jobs.executor,
+    )
+    return itinerary.to_dict()
+
+
+@router.post("/jobs/optimize", response_model=dict, status_code=202)
+async def submit_optimize_job(request: RouteOptimizeRequest):
+    """
+    Queue a stop order optimization (POST /optimize as a background job)
+    Optimizasyonu arka planda çalıştır
+
+    Returns a job id to poll at GET /jobs/{job_id}; identical requests share
+    one job and its cached result.
+    """
+    job = await route_jobs.submit("optimize", request.dict())
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.post("/jobs/optimize/bulk", response_model=dict, status_code=202)
+async def submit_optimize_jobs(request: RouteOptimizeBulkRequest):
+    """
+    Queue many stop order optimizations at once
+    Toplu optimizasyon işleri
+    """
+    jobs = await route_jobs.submit_many("optimize", [route.dict() for route in request.routes])
+    return {"jobs": [{"job_id": job.id, "status": job.status} for job in jobs]}
+
+
+@router.post("/jobs/generate", response_model=dict, status_code=202)
+async def submit_generate_job(
+    request: ItineraryGenerateRequest,
+    user_id: Optional[str] = Query(default="test-user-1"),  # Şimdilik test için
+    db: Session = Depends(get_db)
+):
+    """
+    Queue an itinerary generation (POST /generate as a background job)
+    Gezi planı oluşturmayı arka planda çalıştır
+    """
+    city_key = resolve_city_key(db, request.city)
+    if city_key is None:
+        raise HTTPException(status_code=404, detail="City not found")
+    payload = request.dict(exclude={"city"})
+    payload.update(city_key=city_key, user_id=user_id)
+    job = await route_jobs.submit("generate", payload)
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.post("/jobs/reoptimize-public", response_model=dict, status_code=202)
+async def submit_public_route_jobs(db: Session = Depends(get_db)):
+    """
+    Re-optimize every public route, e.g. after the road graph was updated
+    Tüm herkese açık rotaları yeniden optimize et
+    """
+    route_ids = [row.id for row in db.query(Route.id).filter(Route.is_public == 1)]
+    jobs = await route_jobs.submit_many("route", [{"route_id": route_id} for route_id in route_ids])
+    return {"jobs": [{"route_id": route_id, "job_id": job.id} for route_id, job in zip(route_ids, jobs)]}
+
+
+@router.get("/jobs/stats", response_model=dict)
+async def get_job_stats():
+    """
+    Worker count and job counts by status on this worker
+    İş kuyruğu istatistikleri
+    """
+    return route_jobs.stats()
+
+
+@router.get("/jobs/{job_id}", response_model=dict)
+async def get_job(job_id: str):
+    """
+    Status of a job, with its result once done
+    İşin durumu ve sonucu (status: queued, running, done, failed)
+    """
+    job = await route_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@router.post("/distance-matrix", response_model=dict)
+async def get_distance_matrix(
+    request: DistanceMatrixRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Street distance (km) and travel time (minutes) between every pair of POIs
+    POI'ler arası mesafe ve süre matrisi
+
+    Rows and columns follow poi_ids; pairs are served from the shared cache.
+    """
+    stops = load_stops(db.connection(), request.poi_ids)
+    by_id = {stop.poi_id: stop for stop in stops}
+    missing = [poi_id for poi_id in request.poi_ids if poi_id not in by_id]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"POI not found: {missing[0]}")
+
+    points = [by_id[poi_id] for poi_id in request.poi_ids]
+    matrix = await distance_matrices.matrix_async(
+        [stop.latitude for stop in points], [stop.longitude for stop in points], request.transport_mode
+    )
+    return {
+        "poi_ids": request.poi_ids,
+        "transport_mode": request.transport_mode,
+        "distances_km": matrix.distances_km.round(3).tolist(),
+        "durations_minutes": matrix.durations_minutes.round(1).tolist(),
+    }
+
+
+@router.get("/distance-matrix/stats", response_model=dict)
+async def get_distance_matrix_stats():
+    """
+    Distance cache statistics (size, evictions, hit rates) of this worker
+    Mesafe önbelleği istatistikleri
+    """
+    return distance_matrices.stats()
+
+
+@router.post("/", response_model=dict)
+async def create_route(
+    request: RouteCreate,
+    user_id: Optional[str] = Query(default="test-user-1"),  # Şimdilik test için
+    db: Session = Depends(get_db)
+):
+    """
+    Save a new route
+    Yeni rota kaydet
+
+    With optimize_route the stops are reordered on save; total_distance_km
+    and estimated_duration_minutes are always filled in.
+    """
+    route = Route(
+        user_id=user_id,
+        name=request.name,
+        description=request.description,
+        pois=[{"poi_id": poi_id, "order": order} for order, poi_id in enumerate(request.poi_ids, start=1)],
+        transport_mode=request.transport_mode or DEFAULT_TRANSPORT_MODE,
+        optimize_route=int(request.optimize_route),
+        is_public=int(request.is_public),
+    )
+    db.add(route)
+    await _plan_and_commit(db, route)
+    db.refresh(route)
+    return await _route_response(db, route)
+
+
+@router.get("/{route_id}", response_model=dict)
+async def get_route(
+    route_id: str,
+    user_id: Optional[str] = Query(default="test-user-1"),
+    geometry: str = Query(default="polyline", pattern="^(polyline|delta|none)$"),
+    zoom: Optional[int] = Query(default=None, ge=0, le=22, description="Simplify leg geometry for this map zoom"),
+    db: Session = Depends(get_db)
+):
+    """
+    Get a saved route
+    Kayıtlı rotayı getir
+
+    Every leg carries its distance, duration and geometry: an encoded
+    polyline (geometry=polyline), flat delta-encoded integer coordinates in
+    1e-5 degrees (geometry=delta) or nothing (geometry=none). zoom
+    simplifies the geometry to what is visible at that map zoom level.
+    """
+    return await _route_response(db, _get_user_route(db, route_id, user_id), geometry, zoom)
+
+
+@router.put("/{route_id}", response_model=dict)
+async def update_route(
+    route_id: str,
+    request: RouteUpdate,
+    user_id: Optional[str] = Query(default="test-user-1"),
+    db: Session = Depends(get_db)
+):
+    """
+    Update a saved route
+    Kayıtlı rotayı güncelle
+
+    Changing the stops, transport_mode or optimize_route re-optimizes the
+    route (when optimize_route is set) and recalculates its totals.
+    """
+    route = _get_user_route(db, route_id, user_id)
+    data = request.dict(exclude_unset=True)
+    replan = any(data.get(field) is not None for field in ("poi_ids", "transport_mode", "optimize_route"))
+
+    if data.get("poi_ids") is not None:
+        route.pois = [{"poi_id": poi_id, "order": order} for order, poi_id in enumerate(data.pop("poi_ids"), start=1)]
+    for field in ("name", "description", "transport_mode"):
+        if data.get(field) is not None:
+            setattr(route, field, data[field])
+    for field in ("optimize_route", "is_public"):
+        if data.get(field) is not None:
+            setattr(route, field, int(data[field]))
+
+    if replan:
+        await _plan_and_commit(db, route)
+    else:
+        db.commit()
+    db.refresh(route)
+    return await _route_response(db, route)
+
+
+@router.post("/{route_id}/stops", response_model=dict)
+async def add_route_stop(
+    route_id: str,
+    request: RouteStopAdd,
+    user_id: Optional[str] = Query(default="test-user-1"),
+    db: Session = Depends(get_db)
+):
+    """
+    Add one stop to a saved route
+    Kayıtlı rotaya durak ekle
+
+    Without position, optimized routes get the stop where it adds the least
+    distance and only the neighbouring stops are re-ordered; the totals are
+    updated from the affected legs instead of re-optimizing the route.
+    """
+    route = _get_user_route(db, route_id, user_id)
+    try:
+        await insert_stop(db, route, request.poi_id, request.position)
+    except RouteEditError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    db.commit()
+    db.refresh(route)
+    return route.to_dict()
+
+
+@router.delete("/{route_id}/stops/{poi_id}", response_model=dict)
+async def remove_route_stop(
+    route_id: str,
+    poi_id: str,
+    user_id: Optional[str] = Query(default="test-user-1"),
+    db: Session = Depends(get_db)
+):
+    """
+    Remove one stop from a saved route
+    Kayıtlı rotadan durak çıkar
+    """
+    route = _get_user_route(db, route_id, user_id)
+    try:
+        await remove_stop(db, route, poi_id)
+    except RouteEditError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    db.commit()
+    db.refresh(route)
+    return route.to_dict()
+
+
+@router.post("/{route_id}/share", response_model=dict)
+async def share_route(
+    route_id: str,
+    user_id: Optional[str] = Query(default="test-user-1"),  # Şimdilik test için
+    db: Session = Depends(get_db)
+):
+    """
+    Publish a route behind a share link
+    Rotayı paylaşım bağlantısı ile yayınla
+
+    The token stays the same until the route is unshared.
+    """
+    route = _get_user_route(db, route_id, user_id)
+    if not route.share_url:
+        route.share_url = new_share_token()
+    route.is_public = 1
+    db.commit()
+    return {"share_token": route.share_url, "share_url": share_link(route.share_url)}
+
+
+@router.delete("/{route_id}/share", response_model=dict)
+async def unshare_route(
+    route_id: str,
+    user_id: Optional[str] = Query(default="test-user-1"),  # Şimdilik test için
+    db: Session = Depends(get_db)
+):
+    """
+    Revoke the share link of a route
+    Rotanın paylaşım bağlantısını kaldır
+    """
+    route = _get_user_route(db, route_id, user_id)
+    route.share_url = None
+    route.is_public = 0
+    db.commit()
+    return {"message": "Route unshared"}
+
+
+@router.get("/shared/{share_token}")
+async def get_shared_route(
+    share_token: str,
+    if_none_match: Optional[str] = Header(default=None),
+    accept: Optional[str] = Header(default=None),
+    accept_encoding: Optional[str] = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    """
+    Public view of a shared route: the route, its POIs in order and leg geometry
+    Paylaşılan rotanın herkese açık görünümü
+
+    The body is served pre-serialized from cache with a strong ETag; a
+    matching If-None-Match gets 304 Not Modified. Compressed bodies come
+    precompressed from the cache (MessagePack is re-encoded and compressed
+    per request).
+    """
+    payload = await get_shared_payload(db, share_token)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Shared route not found")
+    headers = {"ETag": payload.etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(if_none_match, payload.etag):
+        return Response(status_code=304, headers=headers)
+    encoding = choose_encoding(accept_encoding)
+    if encoding and not prefers_msgpack(accept) and len(payload.body) >= settings.RESPONSE_COMPRESSION_MIN_BYTES:
+        headers.update({"ETag": weak_etag(payload.etag), "Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+        return Response(content=payload.encoded(encoding), media_type="application/json", headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
+
+@router.delete("/{route_id}")
+async def delete_route(
+    route_id: str,
+    user_id: Optional[str] = Query(default="test-user-1"),
+    db: Session = Depends(get_db)
+):
+    """
+    Delete a saved route
+    Kayıtlı rotayı sil
+    """
+    route = _get_user_route(db, route_id, user_id)
+    db.delete(route)
+    db.commit()
+    return {"success": True, "message": "Route deleted"}
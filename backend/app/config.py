@@ -30,6 +30,26 @@ class Settings(BaseSettings):
     FACEBOOK_APP_ID: str = ""
     FACEBOOK_APP_SECRET: str = ""
     
+    # POI nearby search
+    NEARBY_BACKEND: str = "memory"  # memory (in-process index), redis (shared GEO index), database
+    POI_INDEX_REFRESH_SECONDS: int = 30
+    POI_RESPONSE_CACHE_TTL_SECONDS: int = 300  # Redis cache of /pois/city and /pois/nearby; 0 disables
+    POI_ENTITY_CACHE_SIZE: int = 20000  # POI payloads kept in process memory
+    POI_ENTITY_CACHE_TTL_SECONDS: int = 300  # in-process tier
+    POI_ENTITY_REDIS_TTL_SECONDS: int = 24 * 3600  # Redis tier
+    
+    # Route optimization
+    ROUTE_OPTIMIZE_TIME_BUDGET_MS: int = 80  # local search budget per route
+    DISTANCE_CACHE_SIZE: int = 200000  # POI pairs kept in process memory
+    DISTANCE_CACHE_TTL_SECONDS: int = 7 * 24 * 3600  # Redis pair cache
+    ROUTE_JOB_WORKERS: int = 2  # optimization worker processes per application worker
+    ROUTE_JOB_MAX_RUNNING: int = 8  # jobs running at once; keep below the database pool size
+    ROUTE_JOB_RESULT_TTL_SECONDS: int = 3600  # finished jobs and their results
+    ROAD_GRAPH_PATH: str = ""  # directory with nodes.csv/edges.csv and ch/ (python -m app.services.road_network); empty: straight-line estimates
+    
+    # Responses
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024  # smaller bodies are sent uncompressed
+    
     # Frontend
     FRONTEND_URL: str = "http://localhost:8081"
     
@@ -0,0 +1,251 @@
+"""
+Full-text search index for POIs
+POI'ler için tam metin arama indeksi
+
+- SQLite: an FTS5 external-content table (``pois_fts``) over name, description
+  and city, kept in sync with triggers on ``pois``, ranked with BM25. The
+  unicode61 tokenizer folds case and accents; the triggers also fold the
+  dotless ı, which is a letter of its own for it.
+- PostgreSQL: a generated, weighted ``tsvector`` column with a GIN index,
+  ranked with ts_rank_cd. The text is case- and accent-folded like
+  ``app.utils.text.normalize_text`` (``poi_search_fold``).
+
+Queries are split with ``app.utils.text.tokenize``, so "İstanbul çay" looks
+for the prefixes ``istanbul`` and ``cay`` in both.
+
+The text rank is blended with ``rating`` and ``popularity_score``. Other
+dialects (or a database without the index) fall back to ``ilike``.
+"""
+
+import logging
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event, or_, text
+from sqlalchemy.orm import Session
+
+from app.db.spatial import radius_sql
+from app.models.poi import POI
+from app.utils.text import tokenize
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "pois_fts"
+
+# Score = text relevance + rating + popularity, each squashed to 0..1
+TEXT_WEIGHT = 0.6
+RATING_WEIGHT = 0.25
+POPULARITY_WEIGHT = 0.15
+FALLBACK_MAX_ROWS = 1000
+
+
+def _sqlite_fold(column: str) -> str:
+    return f"replace({column}, 'ı', 'i')"
+
+
+def _sqlite_values(prefix: str) -> str:
+    return ", ".join(_sqlite_fold(f"{prefix}.{column}") for column in ("name", "description", "city"))
+
+
+_SQLITE_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description, city,
+        content='pois', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pois_fts_ai AFTER INSERT ON pois
+    BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description, city)
+        VALUES (new.rowid, {_sqlite_values('new')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pois_fts_au AFTER UPDATE OF name, description, city ON pois
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description, city)
+        VALUES ('delete', old.rowid, {_sqlite_values('old')});
+        INSERT INTO {FTS_TABLE}(rowid, name, description, city)
+        VALUES (new.rowid, {_sqlite_values('new')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pois_fts_ad AFTER DELETE ON pois
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description, city)
+        VALUES ('delete', old.rowid, {_sqlite_values('old')});
+    END
+    """,
+]
+
+# Letters folded to ASCII (İ lowercases to i + combining dot above, which is dropped)
+_FOLD_FROM = "çğışöüâêîôûáéíóúàèìòùäëïñø\u0307"
+_FOLD_TO = "cgisouaeiouaeiouaeiouaeino"
+
+_POSTGRES_DDL = [
+    f"""
+    CREATE OR REPLACE FUNCTION poi_search_fold(value text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    AS $$ SELECT translate(lower(coalesce(value, '')), '{_FOLD_FROM}', '{_FOLD_TO}') $$
+    """,
+    """
+    ALTER TABLE pois ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', poi_search_fold(name)), 'A') ||
+        setweight(to_tsvector('simple', poi_search_fold(city)), 'B') ||
+        setweight(to_tsvector('simple', poi_search_fold(description)), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_pois_search_vector ON pois USING GIN (search_vector)",
+]
+
+# Text rank expression per dialect (higher is better)
+_TEXT_RANK = {
+    "sqlite": f"-bm25({FTS_TABLE}, 10.0, 2.0, 5.0)",  # name, description, city weights
+    "postgresql": "ts_rank_cd(pois.search_vector, to_tsquery('simple', :fts_query))",
+}
+
+_MATCH_FROM = {
+    "sqlite": f"FROM {FTS_TABLE} JOIN pois ON pois.rowid = {FTS_TABLE}.rowid WHERE {FTS_TABLE} MATCH :fts_query",
+    "postgresql": "FROM pois WHERE pois.search_vector @@ to_tsquery('simple', :fts_query)",
+}
+
+_SCORE = (
+    f"{TEXT_WEIGHT} * (text_rank / (1.0 + text_rank))"
+    f" + {RATING_WEIGHT} * (rating / 5.0)"
+    f" + {POPULARITY_WEIGHT} * (popularity_score / (1.0 + popularity_score))"
+)
+
+# Dialects whose full-text index has been installed in this process
+_installed_dialects = set()
+
+
+class SearchCandidate(NamedTuple):
+    poi_id: str
+    latitude: float
+    longitude: float
+    score: float
+
+
+def _install(connection) -> None:
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE},
+        ).first()
+        for statement in _SQLITE_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            # Index the rows that were written before the table existed
+            connection.execute(text(
+                f"INSERT INTO {FTS_TABLE}(rowid, name, description, city) SELECT rowid, {_sqlite_values('pois')} FROM pois"
+            ))
+    elif dialect == "postgresql":
+        for statement in _POSTGRES_DDL:
+            connection.execute(text(statement))
+    else:
+        return
+    _installed_dialects.add(dialect)
+
+
+@event.listens_for(POI.__table__, "after_create")
+def _install_after_create(target, connection, **kw):
+    """Create the full-text index together with the pois table"""
+    try:
+        _install(connection)
+    except Exception as exc:
+        logger.warning(f"Full-text index not created: {exc}")
+
+
+def install_fulltext_index(engine) -> bool:
+    """
+    Create the full-text index for an existing pois table (idempotent)
+    Mevcut pois tablosu için tam metin indeksini oluşturur
+    """
+    try:
+        with engine.begin() as connection:
+            _install(connection)
+    except Exception as exc:
+        logger.warning(f"Full-text index not installed: {exc}")
+        return False
+    return engine.dialect.name in _installed_dialects
+
+
+def _fts_query(dialect_name: str, tokens: List[str]) -> str:
+    # Every token must match as a prefix ("kahve dün" -> "Kahve Dünyası")
+    if dialect_name == "sqlite":
+        return " ".join(f'"{token}"*' for token in tokens)
+    return " & ".join(f"{token}:*" for token in tokens)
+
+
+def search_candidates(
+    db: Session,
+    q: str,
+    limit: int,
+    near: Optional[Tuple[float, float, float]] = None,
+    after: Optional[Tuple[float, str]] = None,
+) -> List[SearchCandidate]:
+    """
+    Best matching active POIs for q, ranked by the blended score
+    Sorguya en uygun aktif POI'ler - metin, puan ve popülerlik sıralaması
+
+    near: optional (lat, lon, radius_km); only POIs selected by the spatial
+        index are considered (bounding box on SQLite, exact on PostgreSQL)
+    after: optional (score, id) of the last row of the previous page
+    """
+    tokens = tokenize(q)
+    if not tokens:
+        return []
+
+    dialect = db.get_bind().dialect.name
+    params = {"limit": limit}
+    near_sql = ""
+    if near is not None:
+        sql, near_params = radius_sql(dialect, *near)
+        near_sql = f" AND {sql}"
+        params.update(near_params)
+
+    if dialect in _installed_dialects:
+        after_sql = ""
+        if after is not None:
+            after_sql = " WHERE score < :after_score OR (score = :after_score AND id > :after_id)"
+            params.update(after_score=after[0], after_id=after[1])
+        params["fts_query"] = _fts_query(dialect, tokens)
+        statement = text(
+            "SELECT id, latitude, longitude, score FROM ("
+            " SELECT id, latitude, longitude, " + _SCORE + " AS score FROM ("
+            " SELECT pois.id AS id, pois.latitude AS latitude, pois.longitude AS longitude,"
+            f" {_TEXT_RANK[dialect]} AS text_rank,"
+            " coalesce(pois.rating, 0.0) AS rating,"
+            " coalesce(pois.popularity_score, 0.0) AS popularity_score"
+            f" {_MATCH_FROM[dialect]} AND pois.is_active = 1{near_sql}"
+            ") AS matches) AS candidates"
+            f"{after_sql} ORDER BY score DESC, id LIMIT :limit"
+        )
+        rows = db.execute(statement, params).all()
+        return [SearchCandidate(row.id, row.latitude, row.longitude, float(row.score)) for row in rows]
+
+    # Fallback without an index: substring match, ranked by rating and popularity
+    search_term = f"%{q}%"
+    query = db.query(POI.id, POI.latitude, POI.longitude, POI.rating, POI.popularity_score).filter(
+        POI.is_active == 1,
+        or_(
+            POI.name.ilike(search_term),
+            POI.description.ilike(search_term),
+            POI.city.ilike(search_term),
+        ),
+    )
+    if near is not None:
+        sql, near_params = radius_sql(dialect, *near)
+        query = query.filter(text(sql).bindparams(**near_params))
+    rows = query.order_by(POI.rating.desc(), POI.popularity_score.desc()).limit(FALLBACK_MAX_ROWS).all()
+    candidates = []
+    for row in rows:
+        rating, popularity = row.rating or 0.0, row.popularity_score or 0.0
+        score = TEXT_WEIGHT * 0.5 + RATING_WEIGHT * rating / 5.0 + POPULARITY_WEIGHT * popularity / (1.0 + popularity)
+        if after is None or score < after[0] or (score == after[0] and row.id > after[1]):
+            candidates.append(SearchCandidate(row.id, row.latitude, row.longitude, score))
+    candidates.sort(key=lambda candidate: (-candidate.score, candidate.poi_id))
+    return candidates[:limit]
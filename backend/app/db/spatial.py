@@ -0,0 +1,181 @@
+"""
+Database-side spatial index for POI coordinates
+POI koordinatları için veritabanı tarafı mekansal indeks
+
+- SQLite: an R*Tree virtual table (``pois_rtree``) keyed by ``pois.rowid`` and
+  kept in sync with triggers on ``pois``. ``pois`` has a string primary key,
+  so its rowid is implicit and VACUUM may renumber it; installing the index
+  therefore checks every active row against the tree and rebuilds the tree
+  when they disagree.
+- PostgreSQL: a PostGIS ``geography`` column generated from latitude/longitude
+  with a GiST index.
+
+Other dialects (or a database where the index could not be installed) fall
+back to the plain latitude/longitude bounding box.
+"""
+
+import logging
+from math import cos, radians
+from typing import Dict, Tuple
+
+from sqlalchemy import event, text
+
+from app.models.poi import POI
+
+logger = logging.getLogger(__name__)
+
+KM_PER_DEGREE = 111.0  # 1 degree of latitude ≈ 111km
+RTREE_TABLE = "pois_rtree"
+
+_SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE} "
+    "USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pois_rtree_ai AFTER INSERT ON pois
+    WHEN new.is_active = 1
+    BEGIN
+        INSERT OR REPLACE INTO {RTREE_TABLE}
+        VALUES (new.rowid, new.latitude, new.latitude, new.longitude, new.longitude);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pois_rtree_au AFTER UPDATE OF latitude, longitude, is_active ON pois
+    BEGIN
+        DELETE FROM {RTREE_TABLE} WHERE id = old.rowid;
+        INSERT INTO {RTREE_TABLE}
+        SELECT new.rowid, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE new.is_active = 1;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pois_rtree_ad AFTER DELETE ON pois
+    BEGIN
+        DELETE FROM {RTREE_TABLE} WHERE id = old.rowid;
+    END
+    """,
+]
+
+_SQLITE_BACKFILL = f"""
+    INSERT OR REPLACE INTO {RTREE_TABLE}
+    SELECT rowid, latitude, latitude, longitude, longitude FROM pois WHERE is_active = 1
+"""
+
+# The tree holds one entry per active row, at that row's rowid and coordinates
+# (R*Tree stores 32-bit floats rounded outwards, hence the range checks)
+_SQLITE_IN_SYNC = f"""
+    SELECT (SELECT count(*) FROM {RTREE_TABLE}) = (SELECT count(*) FROM pois WHERE is_active = 1)
+    AND NOT EXISTS (
+        SELECT 1 FROM pois
+        WHERE is_active = 1 AND NOT EXISTS (
+            SELECT 1 FROM {RTREE_TABLE} AS tree
+            WHERE tree.id = pois.rowid
+            AND tree.min_lat <= pois.latitude AND tree.max_lat >= pois.latitude
+            AND tree.min_lon <= pois.longitude AND tree.max_lon >= pois.longitude
+        )
+    )
+"""
+
+_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS postgis",
+    """
+    ALTER TABLE pois ADD COLUMN IF NOT EXISTS geog geography(Point, 4326)
+    GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_pois_geog ON pois USING GIST (geog)",
+]
+
+# Dialects whose spatial index has been installed in this process
+_installed_dialects = set()
+
+
+def _install(connection, rebuild: bool = False) -> None:
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        for statement in _SQLITE_DDL:
+            connection.execute(text(statement))
+        if rebuild or not connection.execute(text(_SQLITE_IN_SYNC)).scalar():
+            logger.info(f"Rebuilding {RTREE_TABLE} from pois")
+            connection.execute(text(f"DELETE FROM {RTREE_TABLE}"))
+            connection.execute(text(_SQLITE_BACKFILL))
+    elif dialect == "postgresql":
+        for statement in _POSTGRES_DDL:
+            connection.execute(text(statement))
+    else:
+        return
+    _installed_dialects.add(dialect)
+
+
+@event.listens_for(POI.__table__, "after_create")
+def _install_after_create(target, connection, **kw):
+    """Create the spatial index together with the pois table"""
+    try:
+        _install(connection)
+    except Exception as exc:
+        logger.warning(f"Spatial index not created: {exc}")
+
+
+def install_spatial_index(engine, rebuild: bool = False) -> bool:
+    """
+    Create the spatial index for an existing pois table (idempotent)
+    Mevcut pois tablosu için mekansal indeksi oluşturur
+
+    Returns False when the dialect is not supported or installation failed
+    (e.g. PostGIS is not available); nearby queries then use the bounding box.
+    """
+    try:
+        with engine.begin() as connection:
+            _install(connection, rebuild=rebuild)
+    except Exception as exc:
+        logger.warning(f"Spatial index not installed: {exc}")
+        return False
+    return engine.dialect.name in _installed_dialects
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """Return (min_lat, max_lat, min_lon, max_lon) enclosing a circle of radius_km"""
+    lat_range = radius_km / KM_PER_DEGREE
+    # Avoid division by zero close to the poles
+    lon_range = radius_km / (KM_PER_DEGREE * max(cos(radians(lat)), 0.01))
+    return lat - lat_range, lat + lat_range, lon - lon_range, lon + lon_range
+
+
+def radius_sql(dialect_name: str, lat: float, lon: float, radius_km: float) -> Tuple[str, Dict[str, float]]:
+    """
+    Raw SQL condition (and its parameters) selecting pois rows around (lat, lon)
+
+    For statements written as text(); see within_radius for the semantics.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+
+    if dialect_name == "sqlite" and "sqlite" in _installed_dialects:
+        return (
+            f"pois.rowid IN (SELECT id FROM {RTREE_TABLE} "
+            "WHERE max_lat >= :sp_min_lat AND min_lat <= :sp_max_lat "
+            "AND max_lon >= :sp_min_lon AND min_lon <= :sp_max_lon)",
+            {"sp_min_lat": min_lat, "sp_max_lat": max_lat, "sp_min_lon": min_lon, "sp_max_lon": max_lon},
+        )
+
+    if dialect_name == "postgresql" and "postgresql" in _installed_dialects:
+        return (
+            "ST_DWithin(pois.geog, ST_SetSRID(ST_MakePoint(:sp_lon, :sp_lat), 4326)::geography, :sp_radius_m)",
+            {"sp_lat": lat, "sp_lon": lon, "sp_radius_m": radius_km * 1000.0},
+        )
+
+    return (
+        "pois.latitude BETWEEN :sp_min_lat AND :sp_max_lat "
+        "AND pois.longitude BETWEEN :sp_min_lon AND :sp_max_lon",
+        {"sp_min_lat": min_lat, "sp_max_lat": max_lat, "sp_min_lon": min_lon, "sp_max_lon": max_lon},
+    )
+
+
+def within_radius(dialect_name: str, lat: float, lon: float, radius_km: float):
+    """
+    SQL clause selecting POIs around (lat, lon) through the spatial index
+    Mekansal indeksi kullanarak yarıçap içindeki POI'leri seçen SQL koşulu
+
+    SQLite returns the R*Tree bounding box candidates, so callers still apply
+    the exact distance cut. PostgreSQL applies the exact radius with ST_DWithin.
+    Without an index the latitude/longitude bounding box is used.
+    """
+    sql, params = radius_sql(dialect_name, lat, lon, radius_km)
+    return text(sql).bindparams(**params)
@@ -1,10 +1,21 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.config import get_settings
 from app.database import Base, engine
+from app.db.session import engine as poi_engine
+from app.db.fulltext import install_fulltext_index
+from app.db.spatial import install_spatial_index
+from app.services import city_catalogue, poi_cache, poi_events, poi_response_cache, redis_geo, shared_routes
+from app.services import road_network, route_geometry, route_jobs
+# Imported for their in-memory views, which register with poi_refresh on import
+from app.services import autocomplete, itinerary_generator, map_clusters, poi_index  # noqa: F401
+from app.services.poi_refresh import run_refresh_loop, start_views
+from app.api.v1.endpoints import pois, routes
 from app.routes import auth
 from app.utils.redis import redis_client
+from app.utils.response_encoding import CompressionMiddleware, MessagePackMiddleware
 
 settings = get_settings()
 
@@ -18,13 +29,46 @@ async def lifespan(app: FastAPI):
     # Create database tables
     Base.metadata.create_all(bind=engine)
     
+    # Spatial and full-text indexes for POI queries
+    install_spatial_index(poi_engine)
+    install_fulltext_index(poi_engine)
+    city_catalogue.backfill_city_keys(poi_engine)
+    route_geometry.add_legs_column(poi_engine)
+    poi_events.bind_loop()
+    poi_events.add_listener(city_catalogue.on_poi_changes)
+    poi_events.add_listener(shared_routes.on_poi_changes)
+    poi_events.add_listener(poi_response_cache.on_poi_changes)
+    
     # Connect to Redis
     await redis_client.connect()
     
+    # POI entity cache: evict on local changes and on changes published by other workers
+    poi_events.add_listener(poi_cache.poi_cache.on_poi_changes)
+    invalidation_task = asyncio.create_task(poi_cache.poi_cache.run_invalidation_listener())
+    
+    # Shared Redis GEO index, written through on every POI change
+    # (built and caught up with the in-memory views below)
+    if settings.NEARBY_BACKEND == "redis":
+        poi_events.add_listener(redis_geo.write_through)
+    
+    # Offline road network (memory-mapped; preprocessed with python -m app.services.road_network)
+    if settings.ROAD_GRAPH_PATH:
+        await asyncio.to_thread(road_network.road_network.load, settings.ROAD_GRAPH_PATH)
+    
+    # Build in-memory POI views and keep them fresh from POI.updated_at
+    await start_views()
+    refresh_task = asyncio.create_task(run_refresh_loop(settings.POI_INDEX_REFRESH_SECONDS))
+    
+    # Worker processes for route optimization jobs
+    route_jobs.route_jobs.start()
+    
     yield
     
     # Shutdown
     print("Shutting down...")
+    refresh_task.cancel()
+    invalidation_task.cancel()
+    route_jobs.route_jobs.shutdown()
     await redis_client.close()
 
 
@@ -35,6 +79,10 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Response encodings: MessagePack on request, then br/gzip compression
+app.add_middleware(MessagePackMiddleware)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -46,6 +94,8 @@ app.add_middleware(
 
 # Include routers
 app.include_router(auth.router, prefix="/api")
+app.include_router(pois.router, prefix="/api/pois", tags=["POIs"])
+app.include_router(routes.router, prefix="/api/routes", tags=["Routes"])
 
 
 @app.get("/")
@@ -3,10 +3,11 @@ Point of Interest (POI) Model
 Stores information about places/locations
 """
 
-from sqlalchemy import Column, String, Float, JSON, DateTime, Integer, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Float, JSON, DateTime, Integer, Text, Index, func, literal_column
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime
 import uuid
+from app.utils.text import normalize_text
 from .base import Base
 
 
@@ -29,10 +30,11 @@ class POI(Base):
     description = Column(Text, nullable=True)
     address = Column(String(512), nullable=True)
     city = Column(String(100), nullable=True, index=True)
+    city_key = Column(String(100), nullable=True)  # normalized city (app.utils.text.normalize_text)
     country = Column(String(100), nullable=True, index=True)
     postal_code = Column(String(20), nullable=True)
     
-    # Geographic Location (using lat/long for now, PostGIS can be added later)
+    # Geographic Location (spatial index: app/db/spatial.py - R*Tree on SQLite, PostGIS GiST on PostgreSQL)
     latitude = Column(Float, nullable=False, index=True)
     longitude = Column(Float, nullable=False, index=True)
     
@@ -79,6 +81,12 @@ class POI(Base):
     favorites = relationship("Favorite", back_populates="poi", cascade="all, delete-orphan")
     interactions = relationship("Interaction", back_populates="poi", cascade="all, delete-orphan")
     
+    @validates("city")
+    def _set_city_key(self, key, value):
+        """Keep city_key in sync so "İstanbul" and "istanbul" share one key"""
+        self.city_key = normalize_text(value) or None
+        return value
+    
     def __repr__(self):
         return f"<POI(id={self.id}, name={self.name}, category={self.category})>"
     
@@ -92,10 +100,10 @@ class POI(Base):
             "description": self.description,
             "address": self.address,
             "city": self.city,
+            "city_key": self.city_key,
             "country": self.country,
             "postal_code": self.postal_code,
             "category": self.category,
-            "subcategory": self.subcategory,
             "types": self.types,
             "rating": self.rating,
             "rating_count": self.rating_count,
@@ -112,7 +120,6 @@ class POI(Base):
             "photos": self.photos,
             "cover_photo_url": self.cover_photo_url,
             "is_active": bool(self.is_active),
-            "is_verified": bool(self.is_verified),
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
@@ -124,3 +131,20 @@ class POI(Base):
             }
         
         return data
+
+
+# Listing order of city pages; NULL rating / popularity_score rank as 0 so
+# keyset comparisons never skip them (literal 0: the expression must read
+# the same in queries and in the indexes)
+RATING_RANK = func.coalesce(POI.rating, literal_column("0"))
+POPULARITY_RANK = func.coalesce(POI.popularity_score, literal_column("0"))
+
+# City listings (WHERE city_key = ? AND is_active = 1 [AND category = ?]
+# ORDER BY RATING_RANK DESC, POPULARITY_RANK DESC, id DESC) walk these
+# indexes in order, so keyset pages cost the same at any depth. updated_at
+# makes them covering for the city version aggregate (app.services.poi_versions)
+Index("ix_pois_city_ranking", POI.city_key, POI.is_active, RATING_RANK, POPULARITY_RANK, POI.id, POI.updated_at)
+Index(
+    "ix_pois_city_category_ranking",
+    POI.city_key, POI.is_active, POI.category, RATING_RANK, POPULARITY_RANK, POI.id, POI.updated_at,
+)
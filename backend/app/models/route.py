@@ -16,6 +16,7 @@ class Route(Base):
     pois = Column(JSON, nullable=False)
     total_distance_km = Column(Float, nullable=True)
     estimated_duration_minutes = Column(Integer, nullable=True)
+    legs = Column(JSON, nullable=True)  # per stop pair: distance, duration, encoded polyline (app.services.route_geometry)
     transport_mode = Column(String(20), default='walking')
     optimize_route = Column(Integer, default=1)
     is_completed = Column(Integer, default=0)
@@ -35,6 +36,7 @@ class Route(Base):
             "pois": self.pois,
             "total_distance_km": self.total_distance_km,
             "estimated_duration_minutes": self.estimated_duration_minutes,
+            "legs": self.legs,
             "transport_mode": self.transport_mode,
             "optimize_route": bool(self.optimize_route),
             "is_completed": bool(self.is_completed),
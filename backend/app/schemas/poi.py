@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from typing import Optional
+
+from pydantic import BaseModel, Field, validator
 
 class POIRead(BaseModel):
     id: int
@@ -9,3 +11,19 @@ class POIRead(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class POICorridorRequest(BaseModel):
+    """Request body for POIs along a route: an encoded polyline or a saved route."""
+
+    polyline: Optional[str] = Field(default=None, min_length=1, max_length=200000)
+    route_id: Optional[str] = Field(default=None, min_length=1, max_length=36)
+    width_km: float = Field(default=0.3, ge=0.01, le=5.0)
+    category: Optional[str] = None
+    limit: int = Field(default=50, ge=1, le=200)
+
+    @validator("route_id", always=True)
+    def _one_route(cls, value, values):
+        if (value is None) == (values.get("polyline") is None):
+            raise ValueError("Give either polyline or route_id")
+        return value
@@ -0,0 +1,103 @@
+"""
+Pydantic schemas for route endpoints.
+"""
+
+from datetime import date as Date
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, validator
+
+TRANSPORT_MODES = {"walking", "cycling", "transit", "driving"}
+CLOCK_PATTERN = r"^([01]?\d|2[0-3]):[0-5]\d$"
+
+
+def _check_transport_mode(value: Optional[str]) -> Optional[str]:
+    if value and value not in TRANSPORT_MODES:
+        raise ValueError("transport_mode must be one of: walking, cycling, transit, driving")
+    return value
+
+
+class RouteCreate(BaseModel):
+    """Request body for saving a new route."""
+
+    name: str = Field(..., min_length=1, max_length=255)
+    description: Optional[str] = None
+    poi_ids: List[str] = Field(..., min_length=1, max_length=100)
+    transport_mode: str = Field(default="walking")
+    optimize_route: bool = True
+    is_public: bool = False
+
+    _transport_mode = validator("transport_mode", allow_reuse=True)(_check_transport_mode)
+
+
+class RouteUpdate(BaseModel):
+    """Request body for updating a route; omitted fields are kept."""
+
+    name: Optional[str] = Field(default=None, min_length=1, max_length=255)
+    description: Optional[str] = None
+    poi_ids: Optional[List[str]] = Field(default=None, min_length=1, max_length=100)
+    transport_mode: Optional[str] = None
+    optimize_route: Optional[bool] = None
+    is_public: Optional[bool] = None
+
+    _transport_mode = validator("transport_mode", allow_reuse=True)(_check_transport_mode)
+
+
+class RouteStopAdd(BaseModel):
+    """Request body for adding one stop to a saved route."""
+
+    poi_id: str = Field(..., min_length=1, max_length=36)
+    position: Optional[int] = Field(default=None, ge=1)  # 1-based; default: cheapest position
+
+
+class RouteOptimizeRequest(BaseModel):
+    """Request body for optimizing stops without saving a route."""
+
+    poi_ids: List[str] = Field(..., min_length=1, max_length=100)
+    transport_mode: str = Field(default="walking")
+    fixed_start: bool = False
+
+    _transport_mode = validator("transport_mode", allow_reuse=True)(_check_transport_mode)
+
+
+class RouteOptimizeBulkRequest(BaseModel):
+    """Request body for queueing many optimizations at once."""
+
+    routes: List[RouteOptimizeRequest] = Field(..., min_length=1, max_length=500)
+
+
+class DistanceMatrixRequest(BaseModel):
+    """Request body for a POI distance/duration matrix."""
+
+    poi_ids: List[str] = Field(..., min_length=1, max_length=200)
+    transport_mode: str = Field(default="walking")
+
+    _transport_mode = validator("transport_mode", allow_reuse=True)(_check_transport_mode)
+
+
+class ScheduleRequest(BaseModel):
+    """Request body for scheduling POIs on a day."""
+
+    poi_ids: List[str] = Field(..., min_length=1, max_length=50)
+    date: Optional[Date] = None  # default: today
+    start_time: str = Field(default="09:00", pattern=CLOCK_PATTERN)
+    end_time: str = Field(default="21:00", pattern=CLOCK_PATTERN)
+    transport_mode: str = Field(default="walking")
+    start_latitude: Optional[float] = Field(default=None, ge=-90, le=90)
+    start_longitude: Optional[float] = Field(default=None, ge=-180, le=180)
+    previous_order: Optional[List[str]] = None  # POI ids of the plan being edited
+
+    _transport_mode = validator("transport_mode", allow_reuse=True)(_check_transport_mode)
+
+
+class ItineraryGenerateRequest(BaseModel):
+    """Request body for generating an itinerary in a city."""
+
+    city: str = Field(..., min_length=1, max_length=100)
+    start_latitude: float = Field(..., ge=-90, le=90)
+    start_longitude: float = Field(..., ge=-180, le=180)
+    time_budget_minutes: int = Field(default=480, ge=30, le=24 * 60)
+    transport_mode: str = Field(default="walking")
+    max_stops: int = Field(default=15, ge=1, le=50)
+
+    _transport_mode = validator("transport_mode", allow_reuse=True)(_check_transport_mode)
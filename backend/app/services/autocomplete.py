@@ -0,0 +1,217 @@
+"""
+Typeahead index over POI names and cities
+POI isim ve şehirleri için otomatik tamamlama indeksi
+
+Words of every active POI name and city are normalized (app.utils.text) and
+kept in a sorted term list, so a prefix is resolved with two bisections.
+Each term has a compact posting array of document numbers. When a prefix
+matches too little (typos, infixes) terms are looked up through a trigram
+index over the distinct terms, which is much smaller than one over POIs.
+"""
+
+from array import array
+from bisect import bisect_left, insort
+from collections import namedtuple
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from app.models.poi import POI
+from app.services.geo import haversine_km, top_k
+from app.services.poi_refresh import IncrementalPOIView, register_view
+from app.utils.text import tokenize
+
+MAX_CANDIDATES = 5000
+MIN_PREFIX_RESULTS = 3
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+_Doc = namedtuple("_Doc", ["poi_id", "name", "city", "category", "latitude", "longitude", "static_score", "words"])
+
+Suggestion = namedtuple("Suggestion", ["poi_id", "name", "city", "category", "distance_km", "score"])
+
+
+def _static_score(rating: float, popularity: float) -> float:
+    return rating / 5.0 + popularity / (1.0 + popularity)
+
+
+def _trigrams(term: str) -> Set[str]:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _State:
+    """Term list, postings and documents (replaced wholesale on rebuild)"""
+
+    def __init__(self):
+        self.docs: List[Optional[_Doc]] = []
+        self.doc_numbers: Dict[str, int] = {}
+        self.terms: List[str] = []
+        self.postings: Dict[str, array] = {}
+        self.trigrams: Dict[str, Set[str]] = {}
+
+    def add(self, row) -> None:
+        words = tuple(dict.fromkeys(tokenize(row.name or "") + tokenize(row.city or "")))
+        doc = _Doc(
+            row.id,
+            row.name,
+            row.city,
+            row.category,
+            row.latitude,
+            row.longitude,
+            _static_score(row.rating or 0.0, row.popularity_score or 0.0),
+            words,
+        )
+        if row.id in self.doc_numbers:
+            self.remove(row.id)
+        number = len(self.docs)
+        self.docs.append(doc)
+        self.doc_numbers[row.id] = number
+        for word in words:
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = array("I")
+                insort(self.terms, word)
+                for trigram in _trigrams(word):
+                    self.trigrams.setdefault(trigram, set()).add(word)
+            posting.append(number)
+
+    def remove(self, poi_id: str) -> None:
+        number = self.doc_numbers.pop(poi_id, None)
+        if number is None:
+            return
+        doc = self.docs[number]
+        self.docs[number] = None
+        for word in doc.words:
+            posting = self.postings.get(word)
+            if posting is not None and number in posting:
+                posting.remove(number)
+
+    def prefix_terms(self, prefix: str) -> List[str]:
+        start = bisect_left(self.terms, prefix)
+        end = bisect_left(self.terms, prefix + "\uffff", start)
+        return self.terms[start:end]
+
+    def similar_terms(self, token: str) -> List[str]:
+        grams = _trigrams(token)
+        counts: Dict[str, int] = {}
+        for gram in grams:
+            for term in self.trigrams.get(gram, ()):
+                counts[term] = counts.get(term, 0) + 1
+        similar = []
+        for term, shared in counts.items():
+            similarity = shared / len(grams | _trigrams(term))
+            if similarity >= MIN_TRIGRAM_SIMILARITY:
+                similar.append((similarity, term))
+        similar.sort(reverse=True)
+        return [term for _, term in similar[:20]]
+
+    def documents_for(self, terms: List[str]) -> Set[int]:
+        found: Set[int] = set()
+        for term in terms:
+            found.update(self.postings.get(term, ()))
+            if len(found) >= MAX_CANDIDATES:
+                break
+        return found
+
+
+class AutocompleteIndex(IncrementalPOIView):
+    """
+    Prefix/trigram index of POI names and cities
+    POI isim/şehir önek ve trigram indeksi
+    """
+
+    name = "autocomplete_index"
+    columns = (
+        POI.id,
+        POI.name,
+        POI.city,
+        POI.category,
+        POI.latitude,
+        POI.longitude,
+        POI.rating,
+        POI.popularity_score,
+        POI.is_active,
+        POI.updated_at,
+    )
+
+    def __init__(self):
+        super().__init__()
+        self._state = _State()
+
+    def build(self, rows) -> None:
+        state = _State()
+        for row in rows:
+            state.add(row)
+        self._state = state
+
+    def apply(self, rows) -> None:
+        state = self._state
+        for row in rows:
+            if row.is_active == 1:
+                state.add(row)
+            else:
+                state.remove(row.id)
+        # Removed documents leave holes behind; compact with a rebuild
+        if len(state.docs) > 2 * max(len(state.doc_numbers), 1000):
+            self.needs_rebuild = True
+
+    def _candidates(self, state: _State, token: str, is_last: bool) -> Set[int]:
+        terms = state.prefix_terms(token) if is_last else ([token] if token in state.postings else [])
+        found = state.documents_for(terms)
+        if len(found) < MIN_PREFIX_RESULTS:
+            found |= state.documents_for(state.similar_terms(token))
+        return found
+
+    def suggest(
+        self,
+        q: str,
+        limit: int = 8,
+        lat: Optional[float] = None,
+        lon: Optional[float] = None,
+    ) -> List[Suggestion]:
+        """
+        Best POIs for a partially typed query, optionally boosted by proximity
+        Yazılmakta olan sorgu için öneriler
+        """
+        tokens = tokenize(q)
+        if not tokens:
+            return []
+        state = self._state
+
+        # Every token has to match (the last one as a prefix, any of them fuzzily)
+        candidate_sets = [
+            self._candidates(state, token, is_last=(i == len(tokens) - 1))
+            for i, token in enumerate(tokens)
+        ]
+        candidates = set.intersection(*candidate_sets)
+        docs = [state.docs[number] for number in candidates if state.docs[number] is not None]
+        if not docs:
+            return []
+
+        # Rating/popularity, +1 when the name starts with the query, + proximity
+        first = tokens[0]
+        scores = np.fromiter(
+            (doc.static_score + (1.0 if doc.words and doc.words[0].startswith(first) else 0.0) for doc in docs),
+            dtype=np.float64,
+            count=len(docs),
+        )
+        distances = None
+        if lat is not None and lon is not None:
+            distances = haversine_km(lat, lon, [doc.latitude for doc in docs], [doc.longitude for doc in docs])
+            scores += 2.0 / (1.0 + distances / 5.0)
+
+        return [
+            Suggestion(
+                docs[i].poi_id,
+                docs[i].name,
+                docs[i].city,
+                docs[i].category,
+                float(distances[i]) if distances is not None else None,
+                float(scores[i]),
+            )
+            for i in top_k(-scores, limit)
+        ]
+
+
+# Global autocomplete index instance
+autocomplete_index = register_view(AutocompleteIndex())
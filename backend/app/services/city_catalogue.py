@@ -0,0 +1,155 @@
+"""
+City catalogue and city key resolution
+Şehir kataloğu - kullanıcı girdisini standart şehir anahtarına çevirir
+
+Listing endpoints filter on the indexed ``POI.city_key`` column. User input
+("istanbul", "İSTANBUL", "Ist") is resolved once against the cached catalogue
+of known keys instead of running ``ilike('%city%')`` over the table.
+"""
+
+import logging
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, inspect, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+from app.models.poi import POI
+from app.services.poi_events import POIChange
+from app.utils.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+CATALOGUE_TTL_SECONDS = 300
+BACKFILL_BATCH_SIZE = 1000
+
+_catalogue: Optional[List[dict]] = None
+_catalogue_by_key: Dict[str, dict] = {}
+_loaded_at = 0.0
+
+
+def _load_catalogue(db: Session) -> List[dict]:
+    rows = db.query(
+        POI.city_key,
+        POI.city,
+        POI.country,
+        func.count(POI.id).label("poi_count"),
+    ).filter(
+        POI.is_active == 1,
+        POI.city_key.isnot(None),
+    ).group_by(POI.city_key, POI.city, POI.country).all()
+
+    cities: Dict[str, dict] = {}
+    for row in rows:
+        entry = cities.get(row.city_key)
+        if entry is None:
+            entry = cities[row.city_key] = {"key": row.city_key, "name": row.city, "country": row.country, "poi_count": 0}
+            entry["_name_count"] = 0
+        entry["poi_count"] += row.poi_count
+        # Show the most common spelling of the city
+        if row.poi_count > entry["_name_count"]:
+            entry.update(name=row.city, country=row.country, _name_count=row.poi_count)
+
+    catalogue = sorted(cities.values(), key=lambda entry: entry["poi_count"], reverse=True)
+    for entry in catalogue:
+        del entry["_name_count"]
+    return catalogue
+
+
+def get_catalogue(db: Session) -> List[dict]:
+    """
+    All cities with active POIs, most POIs first (cached)
+    Aktif POI'si olan şehirler
+    """
+    global _catalogue, _catalogue_by_key, _loaded_at
+    if _catalogue is None or time.monotonic() - _loaded_at > CATALOGUE_TTL_SECONDS:
+        _catalogue = _load_catalogue(db)
+        _catalogue_by_key = {entry["key"]: entry for entry in _catalogue}
+        _loaded_at = time.monotonic()
+    return _catalogue
+
+
+def invalidate_catalogue() -> None:
+    global _catalogue
+    _catalogue = None
+
+
+def on_poi_changes(changes: List[POIChange]) -> None:
+    """POI change listener: reload the catalogue when a city appears or moves"""
+    for change in changes:
+        key = normalize_text(change.city) if change.city else None
+        if change.previous_city is not None or change.deleted or (key and key not in _catalogue_by_key):
+            invalidate_catalogue()
+            return
+
+
+def search_catalogue(db: Session, q: Optional[str] = None, limit: int = 50) -> List[dict]:
+    """Catalogue entries whose key starts with (or contains) the normalized query"""
+    catalogue = get_catalogue(db)
+    query = normalize_text(q or "")
+    if not query:
+        return catalogue[:limit]
+    prefix = [entry for entry in catalogue if entry["key"].startswith(query)]
+    infix = [entry for entry in catalogue if query in entry["key"] and not entry["key"].startswith(query)]
+    return (prefix + infix)[:limit]
+
+
+def resolve_city_key(db: Session, city: str) -> Optional[str]:
+    """
+    Canonical city key for user input, None when no city or several match
+    Kullanıcının yazdığı şehir adını standart anahtara çevirir
+
+    Input that is not a known key must be the prefix of exactly one: "ist"
+    resolves to "istanbul", while "york" (not a prefix) and "new" (both
+    "new york" and "new delhi") do not resolve.
+    """
+    key = normalize_text(city)
+    if not key:
+        return None
+    catalogue = get_catalogue(db)
+    if key in _catalogue_by_key:
+        return key
+    matches = [entry["key"] for entry in catalogue if entry["key"].startswith(key)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def backfill_city_keys(engine) -> int:
+    """
+    Add the city_key column to an existing pois table and fill missing keys
+    Mevcut pois tablosuna city_key kolonunu ekler ve doldurur
+
+    Also creates the city listing indexes. Returns the number of rows whose
+    city_key was filled.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("pois"):
+        return 0
+    columns = {column["name"] for column in inspector.get_columns("pois")}
+    with engine.begin() as connection:
+        if "city_key" not in columns:
+            connection.execute(text("ALTER TABLE pois ADD COLUMN city_key VARCHAR(100)"))
+        # Expression indexes are not reflected, so checkfirst cannot see them
+        for index in POI.__table__.indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+
+    updated, last_id = 0, ""
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                text(
+                    "SELECT id, city FROM pois WHERE city_key IS NULL AND city IS NOT NULL AND id > :last_id "
+                    "ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": BACKFILL_BATCH_SIZE},
+            ).all()
+            batch = [{"id": row.id, "city_key": normalize_text(row.city) or None} for row in rows]
+            if batch:
+                connection.execute(text("UPDATE pois SET city_key = :city_key WHERE id = :id"), batch)
+        updated += len(batch)
+        if len(rows) < BACKFILL_BATCH_SIZE:
+            break
+        last_id = rows[-1].id
+    if updated:
+        logger.info(f"city_key backfilled for {updated} POIs")
+    return updated
@@ -0,0 +1,333 @@
+"""
+Pairwise distance / duration matrices with a two-level pair cache
+Noktalar arası mesafe ve süre matrisi - LRU + Redis önbellekli
+
+Pairs are cached per transport mode under the rounded coordinates of both
+points (about 1 m), so a POI that moves simply stops hitting its old
+entries. Lookups go to an in-process LRU first, then (from async callers)
+to Redis, which is shared by every worker; only the remaining pairs are
+computed, with one vectorized pass over the whole matrix.
+
+Distances come from the offline road network when it is loaded and covers
+the mode (see road_network); otherwise, and for pairs the network cannot
+route, from the great-circle distance times a per-mode detour factor.
+Durations use the mode's average speed. Cache keys carry the source, so
+loading a network does not serve stale straight-line estimates.
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import get_settings
+from app.services.geo import haversine_km, pairwise_haversine_km
+from app.services.road_network import road_network
+from app.utils.redis import redis_client
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+COORDINATE_DECIMALS = 5
+
+
+class TransportProfile(NamedTuple):
+    speed_kmh: float
+    detour_factor: float  # street distance / great-circle distance
+
+
+TRANSPORT_PROFILES: Dict[str, TransportProfile] = {
+    "walking": TransportProfile(4.5, 1.25),
+    "cycling": TransportProfile(14.0, 1.3),
+    "transit": TransportProfile(20.0, 1.35),
+    "driving": TransportProfile(28.0, 1.4),
+}
+DEFAULT_TRANSPORT_MODE = "walking"
+
+
+class DistanceMatrix(NamedTuple):
+    distances_km: np.ndarray  # [i, j]: street distance from point i to point j (1-D for legs)
+    durations_minutes: np.ndarray
+
+
+def _profile(mode: str) -> TransportProfile:
+    return TRANSPORT_PROFILES.get(mode, TRANSPORT_PROFILES[DEFAULT_TRANSPORT_MODE])
+
+
+def _source(mode: str) -> str:
+    """Cache key prefix: the mode, tagged when distances come from the road network"""
+    return f"{mode}@net" if road_network.supports(mode) else mode
+
+
+def compute_matrices(lats: Sequence[float], lons: Sequence[float], modes: Sequence[str]) -> Dict[str, DistanceMatrix]:
+    """
+    Uncached matrices for every pair of points, per mode (road network, else
+    one vectorized pass); each road graph is searched once for all its modes
+    """
+    straight_line = pairwise_haversine_km(lats, lons)
+    routed_modes = [mode for mode in modes if road_network.supports(mode)] if len(lats) > 1 else []
+    network = road_network.matrices(lats, lons, {mode: _profile(mode).speed_kmh for mode in routed_modes})
+    matrices = {}
+    for mode in modes:
+        profile = _profile(mode)
+        distances = straight_line * profile.detour_factor
+        durations = distances / profile.speed_kmh * 60.0
+        if mode in network:
+            network_distances, network_durations = network[mode]
+            routed = ~np.isnan(network_distances)
+            distances[routed] = network_distances[routed]
+            durations[routed] = network_durations[routed]
+        matrices[mode] = DistanceMatrix(distances, durations)
+    return matrices
+
+
+def compute_matrix(lats: Sequence[float], lons: Sequence[float], mode: str) -> DistanceMatrix:
+    """Uncached matrix for every pair of points in one mode"""
+    return compute_matrices(lats, lons, [mode])[mode]
+
+
+def compute_legs(origins: Sequence[Tuple[float, float]], destinations: Sequence[Tuple[float, float]], mode: str) -> DistanceMatrix:
+    """Uncached distance and duration of each origin -> destination pair (1-D arrays)"""
+    profile = _profile(mode)
+    origin_lats, origin_lons = np.array([point[0] for point in origins]), np.array([point[1] for point in origins])
+    distances = haversine_km(
+        origin_lats, origin_lons, [point[0] for point in destinations], [point[1] for point in destinations]
+    ) * profile.detour_factor
+    durations = distances / profile.speed_kmh * 60.0
+    if road_network.supports(mode):
+        for i, (origin, destination) in enumerate(zip(origins, destinations)):
+            network_distances, network_durations = road_network.one_to_many(
+                origin[0], origin[1], [destination[0]], [destination[1]], mode, profile.speed_kmh
+            )
+            if not np.isnan(network_distances[0]):
+                distances[i], durations[i] = network_distances[0], network_durations[0]
+    return DistanceMatrix(distances, durations)
+
+
+class _PairLRU:
+    """Bounded LRU of pair key -> (distance_km, duration_minutes)"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = Lock()  # sync matrix() callers may run in threads
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_many(self, keys: List[str]) -> List[Optional[Tuple[float, float]]]:
+        entries = self._entries
+        found = []
+        with self._lock:
+            for key in keys:
+                value = entries.get(key)
+                if value is not None:
+                    entries.move_to_end(key)
+                found.append(value)
+        return found
+
+    def put_many(self, values: Dict[str, Tuple[float, float]]) -> None:
+        entries = self._entries
+        with self._lock:
+            entries.update(values)
+            for key in values:
+                entries.move_to_end(key)
+            overflow = len(entries) - self.max_size
+            for _ in range(max(overflow, 0)):
+                entries.popitem(last=False)
+            self.evictions += max(overflow, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class DistanceMatrixService:
+    """
+    Cached distance/duration matrices for sets of points
+    Nokta kümeleri için önbellekli mesafe/süre matrisleri
+    """
+
+    def __init__(self, max_size: int, redis_ttl_seconds: int):
+        self._lru = _PairLRU(max_size)
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _point_keys(lats: Sequence[float], lons: Sequence[float]) -> List[str]:
+        return [f"{lat:.{COORDINATE_DECIMALS}f},{lon:.{COORDINATE_DECIMALS}f}" for lat, lon in zip(lats, lons)]
+
+    @staticmethod
+    def _pairs(n: int) -> Tuple[np.ndarray, np.ndarray]:
+        rows, cols = np.nonzero(~np.eye(n, dtype=bool))
+        return rows, cols
+
+    def _lookup(self, keys: List[str]) -> Tuple[np.ndarray, np.ndarray, List[int]]:
+        """Values of the pair keys from the LRU; returns (distances, durations, missing positions)"""
+        distances = np.zeros(len(keys), dtype=np.float64)
+        durations = np.zeros(len(keys), dtype=np.float64)
+        missing = []
+        for position, value in enumerate(self._lru.get_many(keys)):
+            if value is None:
+                missing.append(position)
+            else:
+                distances[position], durations[position] = value
+        self.local_hits += len(keys) - len(missing)
+        return distances, durations, missing
+
+    async def _lookup_redis(self, keys: List[str], distances: np.ndarray, durations: np.ndarray, missing: List[int]) -> List[int]:
+        """Fill missing positions from Redis; returns the positions still missing"""
+        if not missing or redis_client.redis is None:
+            return missing
+        try:
+            cached = await redis_client.distance_get_many([keys[position] for position in missing])
+        except Exception as exc:
+            logger.warning(f"Distance cache unavailable: {exc}")
+            return missing
+        found, still_missing = {}, []
+        for position, value in zip(missing, cached):
+            if value is None:
+                still_missing.append(position)
+                continue
+            distances[position], durations[position] = (float(part) for part in value.split(","))
+            found[keys[position]] = (distances[position], durations[position])
+        self.redis_hits += len(found)
+        self._lru.put_many(found)
+        return still_missing
+
+    def _store(self, keys: List[str], distances: np.ndarray, durations: np.ndarray, positions: List[int]) -> Dict[str, Tuple[float, float]]:
+        """Put computed positions into the LRU; returns them for Redis"""
+        self.misses += len(positions)
+        values = {
+            keys[position]: (float(distances[position]), float(durations[position]))
+            for position in positions
+        }
+        self._lru.put_many(values)
+        return values
+
+    async def _store_redis(self, values: Dict[str, Tuple[float, float]]) -> None:
+        if not values or redis_client.redis is None:
+            return
+        try:
+            await redis_client.distance_set_many(
+                {key: f"{distance:.5f},{duration:.3f}" for key, (distance, duration) in values.items()},
+                self.redis_ttl_seconds,
+            )
+        except Exception as exc:
+            logger.warning(f"Distance cache not written: {exc}")
+
+    def _matrix_keys(self, lats, lons, mode: str) -> Tuple[List[str], Tuple[np.ndarray, np.ndarray]]:
+        points = self._point_keys(lats, lons)
+        rows, cols = self._pairs(len(points))
+        source = _source(mode)
+        return [f"{source}:{points[i]}:{points[j]}" for i, j in zip(rows.tolist(), cols.tolist())], (rows, cols)
+
+    def _fill_matrix(self, n, matrix, keys, pairs, distances, durations, missing) -> Tuple[DistanceMatrix, dict]:
+        """Take the missing pairs from the computed matrix and lay out the result"""
+        computed = {}
+        if missing:
+            rows, cols = pairs[0][missing], pairs[1][missing]
+            distances[missing] = matrix.distances_km[rows, cols]
+            durations[missing] = matrix.durations_minutes[rows, cols]
+            computed = self._store(keys, distances, durations, missing)
+        result = DistanceMatrix(np.zeros((n, n), dtype=np.float64), np.zeros((n, n), dtype=np.float64))
+        result.distances_km[pairs] = distances
+        result.durations_minutes[pairs] = durations
+        return result, computed
+
+    def matrix(self, lats: Sequence[float], lons: Sequence[float], mode: str = DEFAULT_TRANSPORT_MODE) -> DistanceMatrix:
+        """Matrix for the points using the in-process cache only (for sync callers)"""
+        keys, pairs = self._matrix_keys(lats, lons, mode)
+        distances, durations, missing = self._lookup(keys)
+        matrix = compute_matrix(lats, lons, mode) if missing else None
+        return self._fill_matrix(len(lats), matrix, keys, pairs, distances, durations, missing)[0]
+
+    async def matrix_async(
+        self,
+        lats: Sequence[float],
+        lons: Sequence[float],
+        mode: str = DEFAULT_TRANSPORT_MODE,
+    ) -> DistanceMatrix:
+        """Matrix for the points using the in-process cache, then the shared Redis cache"""
+        return (await self.matrices_async(lats, lons, [mode]))[mode]
+
+    async def matrices_async(self, lats: Sequence[float], lons: Sequence[float], modes: Sequence[str]) -> Dict[str, DistanceMatrix]:
+        """
+        matrix_async() for several modes at once; the uncached modes are computed
+        together, off the event loop when the road network routes any of them
+        """
+        lookups = {}
+        for mode in modes:
+            keys, pairs = self._matrix_keys(lats, lons, mode)
+            distances, durations, missing = self._lookup(keys)
+            missing = await self._lookup_redis(keys, distances, durations, missing)
+            lookups[mode] = (keys, pairs, distances, durations, missing)
+
+        uncached = [mode for mode, lookup in lookups.items() if lookup[4]]
+        computed_matrices = {}
+        if any(road_network.supports(mode) for mode in uncached):
+            computed_matrices = await asyncio.to_thread(compute_matrices, lats, lons, uncached)
+        elif uncached:
+            computed_matrices = compute_matrices(lats, lons, uncached)
+
+        matrices = {}
+        for mode, (keys, pairs, distances, durations, missing) in lookups.items():
+            matrices[mode], computed = self._fill_matrix(
+                len(lats), computed_matrices.get(mode), keys, pairs, distances, durations, missing
+            )
+            await self._store_redis(computed)
+        return matrices
+
+    async def legs_async(
+        self,
+        origins: Sequence[Tuple[float, float]],
+        destinations: Sequence[Tuple[float, float]],
+        mode: str = DEFAULT_TRANSPORT_MODE,
+    ) -> DistanceMatrix:
+        """
+        Distance and duration of each origin -> destination pair (1-D arrays)
+        Only the given pairs are looked up, e.g. the consecutive legs of a route.
+        """
+        origin_keys = self._point_keys([point[0] for point in origins], [point[1] for point in origins])
+        destination_keys = self._point_keys([point[0] for point in destinations], [point[1] for point in destinations])
+        source = _source(mode)
+        keys = [f"{source}:{origin}:{destination}" for origin, destination in zip(origin_keys, destination_keys)]
+        distances, durations, missing = self._lookup(keys)
+        missing = await self._lookup_redis(keys, distances, durations, missing)
+        if missing:
+            args = ([origins[i] for i in missing], [destinations[i] for i in missing], mode)
+            if road_network.supports(mode):
+                computed = await asyncio.to_thread(compute_legs, *args)
+            else:
+                computed = compute_legs(*args)
+            distances[missing], durations[missing] = computed.distances_km, computed.durations_minutes
+            await self._store_redis(self._store(keys, distances, durations, missing))
+        return DistanceMatrix(distances, durations)
+
+    def stats(self) -> dict:
+        """Cache size, evictions and hit rates"""
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "size": len(self._lru),
+            "max_size": self._lru.max_size,
+            "evictions": self._lru.evictions,
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.local_hits + self.redis_hits) / lookups, 4) if lookups else None,
+        }
+
+    def clear(self) -> None:
+        self._lru.clear()
+        self.local_hits = self.redis_hits = self.misses = 0
+        self._lru.evictions = 0
+
+
+# Global distance matrix service instance
+distance_matrices = DistanceMatrixService(settings.DISTANCE_CACHE_SIZE, settings.DISTANCE_CACHE_TTL_SECONDS)
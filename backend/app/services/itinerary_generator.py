@@ -0,0 +1,397 @@
+"""
+Automatic itinerary generation (orienteering)
+Otomatik gezi planı - tercihlere ve zaman bütçesine göre POI seçimi ve sıralaması
+
+Given a city, a start point and a time budget, stops are chosen and ordered
+to collect the most preference-weighted value while travel plus visits fit
+the budget. A POI's value combines the user's category score, its rating
+and how its price_level sits with the user's budget_level; avoided
+categories are left out.
+
+Cities hold tens of thousands of POIs, so the search works on a small set:
+
+1. Every city keeps its active POIs as arrays sorted by latitude
+   (``CityCandidates``), holding only request-independent fields.
+2. Per request, the POIs within the distance the transport mode covers in
+   the time budget are cut out (a latitude band, then haversine), valued
+   for the user and the ones with the best value per minute are kept
+   (``SEARCH_CANDIDATES``).
+3. A route is built by greedy ratio insertion and improved by reordering
+   (route_optimizer.solve_order) and dropping/re-filling stops until the
+   time budget runs out.
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from concurrent.futures import Executor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import get_settings
+from app.db.session import SessionLocal
+from app.models.poi import POI
+from app.models.user_preferences import UserPreference
+from app.services.distance_matrix import DEFAULT_TRANSPORT_MODE, TRANSPORT_PROFILES, distance_matrices
+from app.services.geo import EARTH_RADIUS_KM, haversine_km
+from app.services.poi_refresh import IncrementalPOIView, register_view
+from app.services.route_optimizer import DEFAULT_VISIT_MINUTES, solve_order
+
+settings = get_settings()
+
+SEARCH_CANDIDATES = 120
+NEUTRAL_CATEGORY_SCORE = 5  # categories without a preference column (0-10 scale)
+# Highest price_level (0-4) that fits each budget_level; every level above halves the value
+BUDGET_PRICE_LEVELS = {"low": 1, "medium": 2, "high": 4}
+OVER_BUDGET_FACTOR = 0.5
+GREEDY_EXPONENTS = (1.0, 0.5, 2.0)  # starting solutions, see _Orienteering.fill
+PACE_VISIT_FACTORS = {"relaxed": 1.25, "moderate": 1.0, "fast": 0.8}
+PREFERENCE_CATEGORIES = ("culture", "nightlife", "shopping", "nature", "food", "sports", "history", "entertainment")
+
+
+class ItineraryStop(NamedTuple):
+    poi_id: str
+    arrival_minutes: float  # since the start of the itinerary
+    travel_minutes: float  # from the previous stop (or the start point)
+    visit_minutes: int
+    value: float
+
+
+class Itinerary(NamedTuple):
+    city_key: str
+    transport_mode: str
+    time_budget_minutes: int
+    stops: List[ItineraryStop]
+    total_value: float
+    travel_minutes: float
+    visit_minutes: int
+    candidates: int  # POIs considered after pruning
+
+    def to_dict(self) -> dict:
+        return {
+            "city": self.city_key,
+            "transport_mode": self.transport_mode,
+            "poi_ids": [stop.poi_id for stop in self.stops],
+            "stops": [
+                {
+                    "poi_id": stop.poi_id,
+                    "order": order,
+                    "arrival_minutes": int(round(stop.arrival_minutes)),
+                    "travel_minutes": round(stop.travel_minutes, 1),
+                    "visit_minutes": stop.visit_minutes,
+                    "value": round(stop.value, 3),
+                }
+                for order, stop in enumerate(self.stops, start=1)
+            ],
+            "total_value": round(self.total_value, 3),
+            "total_travel_minutes": int(round(self.travel_minutes)),
+            "total_visit_minutes": self.visit_minutes,
+            "time_budget_minutes": self.time_budget_minutes,
+            "candidates_considered": self.candidates,
+        }
+
+
+class _CitySet(NamedTuple):
+    """A city's POIs as parallel arrays, sorted by latitude"""
+    ids: np.ndarray  # object
+    lats: np.ndarray
+    lons: np.ndarray
+    categories: np.ndarray  # object
+    ratings: np.ndarray
+    price_levels: np.ndarray  # -1: unknown
+    visit_minutes: np.ndarray  # 0: unknown
+
+    def within(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices of the POIs within radius_km of a point, and their distances"""
+        lat_margin = np.degrees(radius_km / EARTH_RADIUS_KM)
+        low, high = np.searchsorted(self.lats, (lat - lat_margin, lat + lat_margin))
+        band = np.arange(low, high)
+        distances = haversine_km(lat, lon, self.lats[band], self.lons[band])
+        inside = distances <= radius_km
+        return band[inside], distances[inside]
+
+    def take(self, indices: np.ndarray) -> "_CitySet":
+        return _CitySet(*(column[indices] for column in self))
+
+
+def _city_set(rows: Sequence) -> _CitySet:
+    """Rows as latitude-sorted arrays"""
+    rows = sorted(rows, key=lambda row: row.latitude)
+    return _CitySet(
+        np.array([row.id for row in rows], dtype=object),
+        np.array([row.latitude for row in rows], dtype=np.float64),
+        np.array([row.longitude for row in rows], dtype=np.float64),
+        np.array([row.category for row in rows], dtype=object),
+        np.array([row.rating or 0.0 for row in rows], dtype=np.float64),
+        np.array([-1 if row.price_level is None else row.price_level for row in rows], dtype=np.int64),
+        np.array([row.average_visit_duration_minutes or 0 for row in rows], dtype=np.int64),
+    )
+
+
+class CityCandidates(IncrementalPOIView):
+    """
+    Active POIs per city, as arrays of the request-independent fields
+    Şehir bazında aktif POI'ler
+
+    A refresh only marks the touched cities; their candidate set is rebuilt
+    on the next request for that city.
+    """
+
+    name = "city_candidates"
+    columns = (
+        POI.id,
+        POI.city_key,
+        POI.latitude,
+        POI.longitude,
+        POI.category,
+        POI.rating,
+        POI.price_level,
+        POI.average_visit_duration_minutes,
+        POI.is_active,
+        POI.updated_at,
+    )
+
+    def __init__(self):
+        super().__init__()
+        self._rows: Dict[str, Dict[str, tuple]] = {}
+        self._city_of: Dict[str, str] = {}
+        self._sets: Dict[str, _CitySet] = {}
+
+    def build(self, rows) -> None:
+        by_city: Dict[str, Dict[str, tuple]] = defaultdict(dict)
+        for row in rows:
+            if row.city_key:
+                by_city[row.city_key][row.id] = row
+        self._rows = dict(by_city)
+        self._city_of = {poi_id: city for city, city_rows in by_city.items() for poi_id in city_rows}
+        self._sets = {city: _city_set(list(city_rows.values())) for city, city_rows in by_city.items()}
+
+    def apply(self, rows) -> None:
+        for row in rows:
+            previous = self._city_of.pop(row.id, None)
+            if previous is not None:
+                self._rows[previous].pop(row.id, None)
+                self._sets.pop(previous, None)
+            if row.is_active == 1 and row.city_key:
+                self._rows.setdefault(row.city_key, {})[row.id] = row
+                self._city_of[row.id] = row.city_key
+                self._sets.pop(row.city_key, None)
+
+    def candidates(self, city_key: str) -> _CitySet:
+        city_set = self._sets.get(city_key)
+        if city_set is None:
+            city_set = self._sets[city_key] = _city_set(list(self._rows.get(city_key, {}).values()))
+        return city_set
+
+
+def _load_city_set(city_key: str) -> _CitySet:
+    """City set straight from the database (before the view is built)"""
+    db = SessionLocal()
+    try:
+        rows = db.query(*CityCandidates.columns).filter(POI.city_key == city_key, POI.is_active == 1).all()
+    finally:
+        db.close()
+    return _city_set(rows)
+
+
+def poi_values(city_set: _CitySet, preferences: Optional[UserPreference]) -> np.ndarray:
+    """
+    Preference-weighted value of every candidate, 0 for avoided categories
+    Kullanıcı tercihlerine göre her adayın değeri
+    """
+    scores = {category: NEUTRAL_CATEGORY_SCORE for category in PREFERENCE_CATEGORIES}
+    avoided = set()
+    max_price_level = BUDGET_PRICE_LEVELS["high"]
+    if preferences is not None:
+        scores.update({category: getattr(preferences, category) for category in PREFERENCE_CATEGORIES})
+        avoided = set(preferences.avoid_categories or ())
+        max_price_level = BUDGET_PRICE_LEVELS.get(preferences.budget_level, max_price_level)
+
+    category_scores = np.array(
+        [0.0 if category in avoided else scores.get(category, NEUTRAL_CATEGORY_SCORE) for category in city_set.categories],
+        dtype=np.float64,
+    )
+    over_budget = np.maximum(city_set.price_levels - max_price_level, 0)
+    return (
+        category_scores / 10.0
+        * (0.2 + 0.8 * np.clip(city_set.ratings, 0.0, 5.0) / 5.0)
+        * OVER_BUDGET_FACTOR ** over_budget
+    )
+
+
+class _Orienteering:
+    """Bounded search over a small candidate set; node 0 is the start point"""
+
+    def __init__(self, travel: np.ndarray, visit: np.ndarray, value: np.ndarray, budget: float, max_stops: int):
+        self.travel = travel
+        self.visit = visit  # visit[0] = 0 (start point)
+        self.value = value  # value[0] = 0
+        self.budget = budget
+        self.max_stops = max_stops
+
+    def duration(self, path: List[int]) -> float:
+        route = np.asarray([0] + path, dtype=np.intp)
+        return float(self.travel[route[:-1], route[1:]].sum() + self.visit[route].sum())
+
+    def fill(self, path: List[int], excluded: Sequence[int] = (), exponent: float = 1.0) -> List[int]:
+        """
+        Greedy insertion of the best value / added minutes ** exponent while the budget allows
+        Lower exponents favour valuable stops over close ones.
+        """
+        path = list(path)
+        free = np.ones(len(self.value), dtype=bool)
+        free[0] = False
+        free[path] = False
+        free[list(excluded)] = False
+        used = self.duration(path)
+        while len(path) < self.max_stops:
+            candidates = np.flatnonzero(free)
+            if candidates.size == 0:
+                break
+            route = [0] + path
+            before = np.asarray(route, dtype=np.intp)
+            after = np.asarray(path, dtype=np.intp)
+            # added[c, p]: extra minutes when c goes after route[p]; the last column appends
+            added = self.travel[before][:, candidates].T + self.visit[candidates][:, None]
+            if after.size:
+                added[:, :-1] += self.travel[candidates][:, after] - self.travel[before[:-1], after][None, :]
+            position = np.argmin(added, axis=1)
+            extra = added[np.arange(candidates.size), position]
+            fits = used + extra <= self.budget
+            if not fits.any():
+                break
+            ratio = np.where(fits, self.value[candidates] / np.maximum(extra, 1e-6) ** exponent, -np.inf)
+            best = int(np.argmax(ratio))
+            path.insert(int(position[best]), int(candidates[best]))
+            free[candidates[best]] = False
+            used += float(extra[best])
+        return path
+
+    def reorder(self, path: List[int], time_budget_ms: float) -> List[int]:
+        """Shortest order of the chosen stops, still starting at the start point"""
+        if len(path) < 3:
+            return path
+        route = [0] + path
+        order = solve_order(self.travel[np.ix_(route, route)], time_budget_ms, fixed_start=True)
+        return [route[index] for index in order[1:]]
+
+    def total_value(self, path: List[int]) -> float:
+        return float(self.value[path].sum())
+
+    def solve(self, time_budget_ms: float) -> List[int]:
+        deadline = time.perf_counter() + time_budget_ms / 1000.0
+        starts = [self.fill([], exponent=exponent) for exponent in GREEDY_EXPONENTS]
+        path = max(starts, key=self.total_value)
+        best, best_value = path, self.total_value(path)
+        # Drop the stop that pays least for its time, re-order, re-fill;
+        # keep the result if it collects more value
+        tried = set()
+        while time.perf_counter() < deadline and path:
+            route = [0] + path + [0]
+            saved = np.array([
+                self.travel[route[i], route[i + 1]] + self.travel[route[i + 1], route[i + 2]]
+                - self.travel[route[i], route[i + 2]] + self.visit[route[i + 1]]
+                for i in range(len(path))
+            ])
+            order = np.argsort(self.value[path] / np.maximum(saved, 1e-6))
+            dropped = next((path[i] for i in order if path[i] not in tried), None)
+            if dropped is None:
+                break
+            tried.add(dropped)
+            remaining_ms = max((deadline - time.perf_counter()) * 1000.0, 0.0)
+            candidate = [stop for stop in path if stop != dropped]
+            candidate = self.fill(self.reorder(candidate, min(remaining_ms, 20.0)), excluded=[dropped])
+            candidate = self.fill(candidate)
+            value = self.total_value(candidate)
+            if value > best_value + 1e-9:
+                best, best_value = candidate, value
+                path = candidate
+                tried.clear()
+        return best
+
+
+async def generate_itinerary(
+    city_key: str,
+    start_location: Tuple[float, float],
+    time_budget_minutes: int,
+    preferences: Optional[UserPreference] = None,
+    transport_mode: str = DEFAULT_TRANSPORT_MODE,
+    max_stops: int = 15,
+    time_budget_ms: Optional[float] = None,
+    executor: Optional[Executor] = None,
+) -> Itinerary:
+    """
+    Choose and order POIs of a city to maximize value within the time budget
+    Zaman bütçesi içinde en değerli POI'leri seçip sıralar
+
+    With an executor the search runs there (e.g. the route job process pool).
+    """
+    if city_candidates.is_ready:
+        city_set = city_candidates.candidates(city_key)
+    else:
+        city_set = await asyncio.to_thread(_load_city_set, city_key)
+    if len(city_set.ids) == 0:
+        return Itinerary(city_key, transport_mode, time_budget_minutes, [], 0.0, 0.0, 0, 0)
+
+    # Prune: within reach of the start in the time budget, then valued for this user
+    profile = TRANSPORT_PROFILES.get(transport_mode, TRANSPORT_PROFILES[DEFAULT_TRANSPORT_MODE])
+    reach_km = time_budget_minutes / 60.0 * profile.speed_kmh / profile.detour_factor
+    nearby, distances = city_set.within(start_location[0], start_location[1], reach_km)
+    city_set = city_set.take(nearby)
+    reach_minutes = distances * profile.detour_factor / profile.speed_kmh * 60.0
+
+    default_visit = (preferences.preferred_visit_duration_minutes if preferences else None) or DEFAULT_VISIT_MINUTES
+    pace = PACE_VISIT_FACTORS.get(preferences.pace if preferences else None, 1.0)
+    visit = np.rint(np.where(city_set.visit_minutes > 0, city_set.visit_minutes, default_visit) * pace)
+    value = poi_values(city_set, preferences)
+
+    # Best value per minute (there and visit within the budget)
+    usable = np.flatnonzero((value > 0) & (reach_minutes + visit <= time_budget_minutes))
+    ratio = value[usable] / (visit[usable] + reach_minutes[usable])
+    chosen = usable[np.argsort(-ratio, kind="stable")[:SEARCH_CANDIDATES]]
+    if chosen.size == 0:
+        return Itinerary(city_key, transport_mode, time_budget_minutes, [], 0.0, 0.0, 0, 0)
+
+    matrix = await distance_matrices.matrix_async(
+        [start_location[0]] + city_set.lats[chosen].tolist(),
+        [start_location[1]] + city_set.lons[chosen].tolist(),
+        transport_mode,
+    )
+    travel = matrix.durations_minutes
+    search = _Orienteering(
+        travel,
+        np.concatenate(([0.0], visit[chosen])),
+        np.concatenate(([0.0], value[chosen])),
+        float(time_budget_minutes),
+        max_stops,
+    )
+    budget_ms = settings.ROUTE_OPTIMIZE_TIME_BUDGET_MS if time_budget_ms is None else time_budget_ms
+    if executor is None:
+        path = search.solve(budget_ms)
+    else:
+        path = await asyncio.get_running_loop().run_in_executor(executor, search.solve, budget_ms)
+
+    stops: List[ItineraryStop] = []
+    clock, previous = 0.0, 0
+    for node in path:
+        leg = float(travel[previous, node])
+        clock += leg
+        index = chosen[node - 1]
+        stops.append(ItineraryStop(city_set.ids[index], clock, leg, int(visit[index]), float(value[index])))
+        clock += visit[index]
+        previous = node
+    return Itinerary(
+        city_key,
+        transport_mode,
+        time_budget_minutes,
+        stops,
+        search.total_value(path),
+        sum(stop.travel_minutes for stop in stops),
+        sum(stop.visit_minutes for stop in stops),
+        int(chosen.size),
+    )
+
+
+# Global city candidate view
+city_candidates = register_view(CityCandidates())
@@ -0,0 +1,465 @@
+"""
+Time-window aware itinerary scheduling
+Zaman pencereli gezi planlama - açılış saatleri, ziyaret süreleri ve müsaitlik
+
+A stop can only be visited inside one of its time windows: the POI's
+opening hours for the day, intersected with the user's available periods
+(``UserPreference.available_times``) and the day's start/end time. A visit
+has to start and finish inside the same window; arriving early means
+waiting for the opening.
+
+Schedules are built with cheapest feasible insertion and improved with
+relocate/swap moves and re-insertion of left-out stops until the time
+budget runs out. Inserting a stop only re-times the stops after it until
+their start times stop changing. A previous order can be passed in so a
+re-plan starts from it instead of from scratch.
+
+Times are minutes from midnight of the planned day.
+"""
+
+import asyncio
+import time
+from concurrent.futures import Executor
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models.poi import POI
+from app.models.user_preferences import UserPreference
+from app.services.distance_matrix import DEFAULT_TRANSPORT_MODE, distance_matrices
+from app.services.route_optimizer import DEFAULT_VISIT_MINUTES
+
+settings = get_settings()
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+# Periods used by best_visit_time and available_times
+PERIODS: Dict[str, Tuple[int, int]] = {
+    "morning": (8 * 60, 12 * 60),
+    "afternoon": (12 * 60, 17 * 60),
+    "evening": (17 * 60, 22 * 60),
+}
+PREFERRED_TIME_PENALTY = 20  # minutes added to the objective per stop outside best_visit_time
+MINUTES_PER_DAY = 24 * 60
+
+Window = Tuple[int, int]
+
+
+class ScheduleStop(NamedTuple):
+    poi_id: str
+    visit_minutes: int
+    windows: List[Window]  # sorted, non-overlapping
+    preferred: List[Window]  # best_visit_time periods (empty: no preference)
+
+
+class Visit(NamedTuple):
+    poi_id: str
+    arrival: int
+    start: int
+    end: int
+    travel_minutes: int
+    wait_minutes: int
+    preferred_time: bool
+
+
+class Schedule(NamedTuple):
+    visits: List[Visit]
+    unscheduled: List[Tuple[str, str]]  # (poi_id, reason)
+    travel_minutes: int
+    wait_minutes: int
+    end: Optional[int]
+
+
+def parse_clock(value) -> Optional[int]:
+    """'09:30' -> 570 (None when malformed)"""
+    try:
+        hours, minutes = str(value).split(":")[:2]
+        return int(hours) * 60 + int(minutes)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_clock(minutes: int) -> str:
+    days, minutes = divmod(int(minutes), MINUTES_PER_DAY)
+    text = f"{minutes // 60:02d}:{minutes % 60:02d}"
+    return f"{text}+{days}" if days else text
+
+
+def _intersect(first: List[Window], second: List[Window]) -> List[Window]:
+    result = []
+    i = j = 0
+    while i < len(first) and j < len(second):
+        start, end = max(first[i][0], second[j][0]), min(first[i][1], second[j][1])
+        if start < end:
+            result.append((start, end))
+        if first[i][1] < second[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def _merge(windows: List[Window]) -> List[Window]:
+    merged: List[Window] = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def opening_windows(opening_hours, day: date) -> Optional[List[Window]]:
+    """
+    Opening windows of a POI on a day from POI.opening_hours
+    ({monday: {open: "09:00", close: "18:00"}, ...}; a day may also hold a
+    list of such intervals). None when the hours are unknown (always open),
+    [] when the POI is closed that day.
+    """
+    if not opening_hours or not isinstance(opening_hours, dict):
+        return None
+    hours = opening_hours.get(WEEKDAYS[day.weekday()])
+    if not hours:
+        return []
+    windows = []
+    for interval in hours if isinstance(hours, list) else [hours]:
+        if not isinstance(interval, dict):
+            continue
+        opens, closes = parse_clock(interval.get("open")), parse_clock(interval.get("close"))
+        if opens is None or closes is None:
+            continue
+        if closes <= opens:
+            closes += MINUTES_PER_DAY  # closes after midnight
+        windows.append((opens, closes))
+    return _merge(windows)
+
+
+def period_windows(periods: Optional[Sequence[str]]) -> List[Window]:
+    """Windows of named periods ("morning", ...); unknown names are ignored"""
+    return _merge([PERIODS[period] for period in periods or () if period in PERIODS])
+
+
+def available_windows(available_times, day: date) -> Optional[List[Window]]:
+    """Windows of UserPreference.available_times on a day, None when not restricted"""
+    if not available_times or not isinstance(available_times, dict):
+        return None
+    periods = available_times.get(WEEKDAYS[day.weekday()])
+    if not isinstance(periods, dict):
+        return None
+    return period_windows([period for period, available in periods.items() if available])
+
+
+def build_stop(
+    poi_id: str,
+    visit_minutes: int,
+    opening_hours,
+    best_visit_time,
+    day: date,
+    day_window: Window,
+    available: Optional[List[Window]],
+) -> Tuple[ScheduleStop, Optional[str]]:
+    """ScheduleStop for a POI and the reason it can never be visited that day (or None)"""
+    windows = [day_window]
+    opening = opening_windows(opening_hours, day)
+    if opening is not None:
+        windows = _intersect(windows, opening)
+        if not windows:
+            return ScheduleStop(poi_id, visit_minutes, [], []), "closed"
+    if available is not None:
+        windows = _intersect(windows, available)
+        if not windows:
+            return ScheduleStop(poi_id, visit_minutes, [], []), "outside_available_times"
+    windows = [window for window in windows if window[1] - window[0] >= visit_minutes]
+    if not windows:
+        return ScheduleStop(poi_id, visit_minutes, [], []), "visit_does_not_fit_opening_hours"
+    preferred = period_windows(best_visit_time if isinstance(best_visit_time, list) else None)
+    return ScheduleStop(poi_id, visit_minutes, windows, preferred), None
+
+
+class _Scheduler:
+    """
+    Nodes are 0 (start location) and 1..n (stops); travel[i, j] in minutes.
+    An order is a list of stop nodes.
+    """
+
+    def __init__(self, stops: List[ScheduleStop], travel: np.ndarray, day_start: int):
+        self.stops = stops
+        self.travel = travel.tolist()
+        self.day_start = day_start
+
+    def fit(self, node: int, arrival: float) -> Optional[float]:
+        """Earliest start at or after arrival that finishes inside a window"""
+        stop = self.stops[node - 1]
+        for opens, closes in stop.windows:
+            start = max(arrival, opens)
+            if start + stop.visit_minutes <= closes:
+                return start
+        return None
+
+    def penalty(self, node: int, start: float) -> float:
+        preferred = self.stops[node - 1].preferred
+        if not preferred or any(opens <= start < closes for opens, closes in preferred):
+            return 0.0
+        return PREFERRED_TIME_PENALTY
+
+    def timing(self, order: List[int]) -> Optional[Tuple[List[float], float]]:
+        """Start time of each stop and the objective, None when infeasible"""
+        starts = []
+        previous, t, cost = 0, float(self.day_start), 0.0
+        for node in order:
+            start = self.fit(node, t + self.travel[previous][node])
+            if start is None:
+                return None
+            starts.append(start)
+            cost += self.penalty(node, start)
+            t = start + self.stops[node - 1].visit_minutes
+            previous = node
+        return starts, t + cost
+
+    def insertion_cost(self, order: List[int], starts: List[float], node: int, position: int) -> Optional[float]:
+        """Finish time + penalties after inserting node at position (None if infeasible)"""
+        if position == 0:
+            previous, t = 0, float(self.day_start)
+        else:
+            previous = order[position - 1]
+            t = starts[position - 1] + self.stops[previous - 1].visit_minutes
+        start = self.fit(node, t + self.travel[previous][node])
+        if start is None:
+            return None
+        delta = self.penalty(node, start)
+        previous, t = node, start + self.stops[node - 1].visit_minutes
+        for k in range(position, len(order)):
+            current = order[k]
+            start = self.fit(current, t + self.travel[previous][current])
+            if start is None:
+                return None
+            if start == starts[k]:
+                # Unchanged from here on: reuse the old finish time
+                return self._finish(order, starts) + delta + self._penalties(order, starts, position, k)
+            delta += self.penalty(current, start)
+            previous, t = current, start + self.stops[current - 1].visit_minutes
+        return t + delta + self._penalties(order, starts, position, len(order))
+
+    def _finish(self, order: List[int], starts: List[float]) -> float:
+        if not order:
+            return float(self.day_start)
+        return starts[-1] + self.stops[order[-1] - 1].visit_minutes
+
+    def _penalties(self, order, starts, changed_from: int, changed_to: int) -> float:
+        """Penalties of the stops whose start time is unchanged"""
+        return sum(
+            self.penalty(order[k], starts[k])
+            for k in list(range(changed_from)) + list(range(changed_to, len(order)))
+        )
+
+    def best_insertion(self, order: List[int], starts: List[float], candidates: Sequence[int]):
+        best = None
+        for node in candidates:
+            for position in range(len(order) + 1):
+                cost = self.insertion_cost(order, starts, node, position)
+                if cost is not None and (best is None or cost < best[0]):
+                    best = (cost, node, position)
+        return best
+
+    def insert_all(self, order: List[int], pending: List[int], deadline: float) -> List[int]:
+        """Cheapest feasible insertion of pending nodes; returns the ones that did not fit"""
+        pending = list(pending)
+        timing = self.timing(order)
+        while pending and timing is not None:
+            best = self.best_insertion(order, timing[0], pending)
+            if best is None:
+                break
+            _, node, position = best
+            order.insert(position, node)
+            pending.remove(node)
+            timing = self.timing(order)
+            if time.perf_counter() > deadline:
+                break
+        return pending
+
+    def improve(self, order: List[int], pending: List[int], deadline: float) -> Tuple[List[int], List[int]]:
+        """Relocate/swap moves, then re-try left-out stops, until no gain or out of time"""
+        best_cost = self.timing(order)[1]
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            n = len(order)
+            for i in range(n):
+                for j in range(n):
+                    if i == j or time.perf_counter() > deadline:
+                        continue
+                    relocated = order[:i] + order[i + 1:]
+                    relocated.insert(j, order[i])
+                    candidates = [relocated]
+                    if i < j:
+                        swapped = list(order)
+                        swapped[i], swapped[j] = swapped[j], swapped[i]
+                        candidates.append(swapped)
+                    for candidate in candidates:
+                        timing = self.timing(candidate)
+                        if timing is not None and timing[1] < best_cost - 1e-9:
+                            order, best_cost, improved = candidate, timing[1], True
+                            break
+                    if improved:
+                        break
+                if improved:
+                    break
+            if pending:
+                # A shorter schedule may leave room for a stop that did not fit
+                before = len(pending)
+                pending = self.insert_all(order, pending, deadline)
+                if len(pending) < before:
+                    best_cost, improved = self.timing(order)[1], True
+        return order, pending
+
+
+def schedule_stops(
+    stops: List[ScheduleStop],
+    travel_minutes: np.ndarray,
+    day_start: int,
+    initial_order: Optional[Sequence[int]] = None,
+    time_budget_ms: Optional[float] = None,
+) -> Tuple[List[int], List[int]]:
+    """
+    Visiting order (stop indices) and the stops that could not be scheduled
+    Ziyaret sırası ve planlanamayan duraklar
+
+    travel_minutes is an (n + 1) x (n + 1) matrix where index 0 is the
+    start location and index i + 1 is stops[i]. initial_order (stop indices,
+    e.g. the previous plan) is kept where still feasible and improved from.
+    """
+    budget = settings.ROUTE_OPTIMIZE_TIME_BUDGET_MS if time_budget_ms is None else time_budget_ms
+    deadline = time.perf_counter() + budget / 1000.0
+    scheduler = _Scheduler(stops, travel_minutes, day_start)
+    candidates = [i + 1 for i, stop in enumerate(stops) if stop.windows]
+
+    order: List[int] = []
+    for index in initial_order or ():
+        node = index + 1
+        if node in candidates and node not in order and scheduler.timing(order + [node]) is not None:
+            order.append(node)
+    pending = [node for node in candidates if node not in order]
+
+    # Tightest windows first, so flexible stops fill the gaps around them
+    pending.sort(key=lambda node: sum(closes - opens for opens, closes in stops[node - 1].windows))
+    pending = scheduler.insert_all(order, pending, deadline)
+    order, pending = scheduler.improve(order, pending, deadline)
+    return [node - 1 for node in order], [node - 1 for node in pending]
+
+
+def build_schedule(
+    stops: List[ScheduleStop],
+    travel_minutes: np.ndarray,
+    day_start: int,
+    order: List[int],
+    unscheduled: List[Tuple[str, str]],
+) -> Schedule:
+    """Visit times for an order produced by schedule_stops"""
+    scheduler = _Scheduler(stops, travel_minutes, day_start)
+    visits = []
+    previous, t = 0, float(day_start)
+    total_travel = total_wait = 0.0
+    for index in order:
+        node = index + 1
+        travel = scheduler.travel[previous][node]
+        arrival = t + travel
+        start = scheduler.fit(node, arrival)
+        stop = stops[index]
+        visits.append(Visit(
+            stop.poi_id,
+            int(round(arrival)),
+            int(round(start)),
+            int(round(start + stop.visit_minutes)),
+            int(round(travel)),
+            int(round(start - arrival)),
+            scheduler.penalty(node, start) == 0.0,
+        ))
+        total_travel += travel
+        total_wait += start - arrival
+        previous, t = node, start + stop.visit_minutes
+    return Schedule(
+        visits,
+        unscheduled,
+        int(round(total_travel)),
+        int(round(total_wait)),
+        int(round(t)) if visits else None,
+    )
+
+
+async def plan_itinerary(
+    db: Session,
+    poi_ids: List[str],
+    day: date,
+    day_window: Window,
+    transport_mode: str = DEFAULT_TRANSPORT_MODE,
+    start_location: Optional[Tuple[float, float]] = None,
+    preferences: Optional[UserPreference] = None,
+    previous_order: Optional[List[str]] = None,
+    time_budget_ms: Optional[float] = None,
+    executor: Optional[Executor] = None,
+) -> Schedule:
+    """
+    Schedule POIs on a day within their opening hours and the user's available times
+    POI'leri açılış saatleri ve kullanıcının müsait olduğu saatlere göre planlar
+
+    previous_order (POI ids of an earlier plan) makes re-planning incremental.
+    Unknown POI ids are reported as unscheduled with reason "not_found".
+    With an executor the search runs there (e.g. the route job process pool).
+    """
+    rows = db.query(
+        POI.id,
+        POI.latitude,
+        POI.longitude,
+        POI.average_visit_duration_minutes,
+        POI.opening_hours,
+        POI.best_visit_time,
+    ).filter(POI.id.in_(set(poi_ids))).all()
+    by_id = {row.id: row for row in rows}
+
+    available = available_windows(preferences.available_times, day) if preferences else None
+    default_visit = (preferences.preferred_visit_duration_minutes if preferences else None) or DEFAULT_VISIT_MINUTES
+
+    stops: List[ScheduleStop] = []
+    points: List[Tuple[float, float]] = []
+    unscheduled: List[Tuple[str, str]] = []
+    for poi_id in dict.fromkeys(poi_ids):
+        row = by_id.get(poi_id)
+        if row is None:
+            unscheduled.append((poi_id, "not_found"))
+            continue
+        stop, reason = build_stop(
+            row.id,
+            row.average_visit_duration_minutes or default_visit,
+            row.opening_hours,
+            row.best_visit_time,
+            day,
+            day_window,
+            available,
+        )
+        stops.append(stop)
+        points.append((row.latitude, row.longitude))
+        if reason is not None:
+            unscheduled.append((poi_id, reason))
+
+    if start_location is not None:
+        points = [start_location] + points
+    matrix = await distance_matrices.matrix_async(
+        [point[0] for point in points], [point[1] for point in points], transport_mode
+    )
+    travel = matrix.durations_minutes
+    if start_location is None:
+        # No start location: the day starts at whichever stop comes first
+        travel = np.pad(travel, ((1, 0), (1, 0)))
+
+    position = {stop.poi_id: index for index, stop in enumerate(stops)}
+    initial = [position[poi_id] for poi_id in previous_order or () if poi_id in position]
+    if executor is None:
+        order, left_out = schedule_stops(stops, travel, day_window[0], initial, time_budget_ms)
+    else:
+        order, left_out = await asyncio.get_running_loop().run_in_executor(
+            executor, schedule_stops, stops, travel, day_window[0], initial, time_budget_ms
+        )
+    unscheduled.extend((stops[index].poi_id, "does_not_fit_schedule") for index in left_out)
+    return build_schedule(stops, travel, day_window[0], order, unscheduled)
@@ -0,0 +1,299 @@
+"""
+Precomputed map cluster pyramid
+Harita kümeleme piramidi - her zoom seviyesi için önceden hesaplanmış hücreler
+
+Active POIs are projected to Web Mercator and counted into a square grid per
+zoom level (``2 ** (zoom + GRID_SHIFT)`` cells per side, i.e. 64px cells on
+256px tiles). Every cell keeps its POI count, coordinate sums for the
+centroid and per-category counts, so a viewport request only reads the cells
+inside its bounding box. The finest level also keeps the POI ids, which
+serves single-POI cells and zoom levels above ``MAX_CLUSTER_ZOOM``.
+
+Full builds are vectorized; refreshed rows are moved between cells in place.
+"""
+
+from collections import namedtuple
+from math import log, pi, radians, sin
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.poi_refresh import IncrementalPOIView, register_view
+
+GRID_SHIFT = 2
+MAX_CLUSTER_ZOOM = 16
+MAX_MERCATOR_LAT = 85.05112878
+
+Cluster = namedtuple("Cluster", ["count", "latitude", "longitude", "dominant_category", "categories"])
+MapPoint = namedtuple("MapPoint", ["poi_id", "latitude", "longitude", "category"])
+
+
+def _mercator(lat: float, lon: float) -> Tuple[float, float]:
+    """(x, y) in [0, 1) with y growing southwards, as in slippy map tiles"""
+    lat = min(max(lat, -MAX_MERCATOR_LAT), MAX_MERCATOR_LAT)
+    s = sin(radians(lat))
+    x = (lon + 180.0) / 360.0
+    y = 0.5 - log((1.0 + s) / (1.0 - s)) / (4.0 * pi)
+    return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+
+def _grid_size(zoom: int) -> int:
+    return 1 << (zoom + GRID_SHIFT)
+
+
+class _Cell:
+    __slots__ = ("count", "lat_sum", "lon_sum", "categories", "ids")
+
+    def __init__(self):
+        self.count = 0
+        self.lat_sum = 0.0
+        self.lon_sum = 0.0
+        self.categories: Dict[str, int] = {}
+        self.ids = None  # set of POI ids, finest level only
+
+    def cluster(self) -> Cluster:
+        dominant = max(self.categories.items(), key=lambda item: item[1])[0] if self.categories else None
+        return Cluster(
+            self.count,
+            self.lat_sum / self.count,
+            self.lon_sum / self.count,
+            dominant,
+            dict(self.categories),
+        )
+
+
+class _Pyramid:
+    """Cells per zoom level (0..MAX_CLUSTER_ZOOM) plus the POI positions"""
+
+    def __init__(self):
+        self.levels: List[Dict[Tuple[int, int], _Cell]] = [{} for _ in range(MAX_CLUSTER_ZOOM + 1)]
+        # poi_id -> (lat, lon, category, finest cell)
+        self.points: Dict[str, tuple] = {}
+
+    @classmethod
+    def from_rows(cls, rows: List) -> "_Pyramid":
+        pyramid = cls()
+        if not rows:
+            return pyramid
+        ids = [row.id for row in rows]
+        lats = np.array([row.latitude for row in rows], dtype=np.float64)
+        lons = np.array([row.longitude for row in rows], dtype=np.float64)
+        category_names, category_codes = np.unique(
+            np.array([row.category for row in rows], dtype=object).astype(str), return_inverse=True
+        )
+
+        sin_lat = np.sin(np.radians(np.clip(lats, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)))
+        xs = np.clip((lons + 180.0) / 360.0, 0.0, 1.0 - 1e-12)
+        ys = np.clip(0.5 - np.log((1.0 + sin_lat) / (1.0 - sin_lat)) / (4.0 * pi), 0.0, 1.0 - 1e-12)
+        finest = _grid_size(MAX_CLUSTER_ZOOM)
+        cxs = (xs * finest).astype(np.int64)
+        cys = (ys * finest).astype(np.int64)
+
+        for i, poi_id in enumerate(ids):
+            pyramid.points[poi_id] = (
+                float(lats[i]), float(lons[i]), str(category_names[category_codes[i]]), (int(cxs[i]), int(cys[i]))
+            )
+
+        n_categories = len(category_names)
+        for zoom in range(MAX_CLUSTER_ZOOM, -1, -1):
+            shift = MAX_CLUSTER_ZOOM - zoom
+            keys = ((cxs >> shift) << 32) | (cys >> shift)
+            cells, inverse = np.unique(keys, return_inverse=True)
+            counts = np.bincount(inverse)
+            lat_sums = np.bincount(inverse, weights=lats)
+            lon_sums = np.bincount(inverse, weights=lons)
+            per_category = np.bincount(inverse * n_categories + category_codes, minlength=len(cells) * n_categories)
+            per_category = per_category.reshape(len(cells), n_categories)
+
+            level = pyramid.levels[zoom]
+            for j, key in enumerate(cells.tolist()):
+                cell = _Cell()
+                cell.count = int(counts[j])
+                cell.lat_sum = float(lat_sums[j])
+                cell.lon_sum = float(lon_sums[j])
+                cell.categories = {
+                    str(category_names[c]): int(per_category[j, c]) for c in np.flatnonzero(per_category[j])
+                }
+                level[(key >> 32, key & 0xFFFFFFFF)] = cell
+
+        finest_level = pyramid.levels[MAX_CLUSTER_ZOOM]
+        for poi_id, (_, _, _, cell_key) in pyramid.points.items():
+            cell = finest_level[cell_key]
+            if cell.ids is None:
+                cell.ids = set()
+            cell.ids.add(poi_id)
+        return pyramid
+
+    def add(self, poi_id: str, lat: float, lon: float, category: str) -> None:
+        x, y = _mercator(lat, lon)
+        finest = _grid_size(MAX_CLUSTER_ZOOM)
+        cx, cy = int(x * finest), int(y * finest)
+        self.points[poi_id] = (lat, lon, category, (cx, cy))
+        for zoom in range(MAX_CLUSTER_ZOOM, -1, -1):
+            shift = MAX_CLUSTER_ZOOM - zoom
+            key = (cx >> shift, cy >> shift)
+            cell = self.levels[zoom].get(key)
+            if cell is None:
+                cell = self.levels[zoom][key] = _Cell()
+            cell.count += 1
+            cell.lat_sum += lat
+            cell.lon_sum += lon
+            cell.categories[category] = cell.categories.get(category, 0) + 1
+            if zoom == MAX_CLUSTER_ZOOM:
+                if cell.ids is None:
+                    cell.ids = set()
+                cell.ids.add(poi_id)
+
+    def remove(self, poi_id: str) -> None:
+        point = self.points.pop(poi_id, None)
+        if point is None:
+            return
+        lat, lon, category, (cx, cy) = point
+        for zoom in range(MAX_CLUSTER_ZOOM, -1, -1):
+            shift = MAX_CLUSTER_ZOOM - zoom
+            key = (cx >> shift, cy >> shift)
+            level = self.levels[zoom]
+            cell = level[key]
+            cell.count -= 1
+            if cell.count == 0:
+                del level[key]
+                continue
+            cell.lat_sum -= lat
+            cell.lon_sum -= lon
+            remaining = cell.categories[category] - 1
+            if remaining:
+                cell.categories[category] = remaining
+            else:
+                del cell.categories[category]
+            if cell.ids is not None:
+                cell.ids.discard(poi_id)
+
+    def single_id(self, zoom: int, key: Tuple[int, int]) -> Optional[str]:
+        """Id of the only POI in a cell, found by walking down to the finest level"""
+        cx, cy = key
+        for child_zoom in range(zoom + 1, MAX_CLUSTER_ZOOM + 1):
+            level = self.levels[child_zoom]
+            for dx in (0, 1):
+                for dy in (0, 1):
+                    if (2 * cx + dx, 2 * cy + dy) in level:
+                        cx, cy = 2 * cx + dx, 2 * cy + dy
+                        break
+                else:
+                    continue
+                break
+        cell = self.levels[MAX_CLUSTER_ZOOM].get((cx, cy))
+        return next(iter(cell.ids)) if cell is not None and cell.ids else None
+
+    def cells_in(self, zoom: int, bbox: Tuple[float, float, float, float]) -> Iterable[Tuple[Tuple[int, int], _Cell]]:
+        """(key, cell) pairs of a level intersecting (min_lat, min_lon, max_lat, max_lon)"""
+        min_lat, min_lon, max_lat, max_lon = bbox
+        n = _grid_size(zoom)
+        level = self.levels[zoom]
+        min_x, max_y = _mercator(min_lat, min_lon)
+        max_x, min_y = _mercator(max_lat, max_lon)
+        y_range = (int(min_y * n), int(max_y * n))
+        # A viewport across the antimeridian has min_lon > max_lon
+        if min_lon <= max_lon:
+            x_ranges = [(int(min_x * n), int(max_x * n))]
+        else:
+            x_ranges = [(int(min_x * n), n - 1), (0, int(max_x * n))]
+
+        area = sum(hi - lo + 1 for lo, hi in x_ranges) * (y_range[1] - y_range[0] + 1)
+        if area > len(level):
+            # Sparse level (or a huge viewport): filter the populated cells instead
+            for key, cell in level.items():
+                if y_range[0] <= key[1] <= y_range[1] and any(lo <= key[0] <= hi for lo, hi in x_ranges):
+                    yield key, cell
+            return
+        for lo, hi in x_ranges:
+            for cx in range(lo, hi + 1):
+                for cy in range(y_range[0], y_range[1] + 1):
+                    cell = level.get((cx, cy))
+                    if cell is not None:
+                        yield (cx, cy), cell
+
+
+def _in_bbox(lat: float, lon: float, bbox: Tuple[float, float, float, float]) -> bool:
+    min_lat, min_lon, max_lat, max_lon = bbox
+    if not min_lat <= lat <= max_lat:
+        return False
+    if min_lon <= max_lon:
+        return min_lon <= lon <= max_lon
+    return lon >= min_lon or lon <= max_lon
+
+
+class MapClusterIndex(IncrementalPOIView):
+    """
+    Per-zoom cluster pyramid of active POIs
+    Aktif POI'lerin zoom seviyelerine göre kümeleri
+    """
+
+    name = "map_clusters"
+
+    def __init__(self):
+        super().__init__()
+        self._pyramid = _Pyramid()
+
+    def __len__(self):
+        return len(self._pyramid.points)
+
+    def build(self, rows) -> None:
+        self._pyramid = _Pyramid.from_rows(rows)
+
+    def apply(self, rows) -> None:
+        pyramid = self._pyramid
+        for row in rows:
+            pyramid.remove(row.id)
+            if row.is_active == 1:
+                pyramid.add(row.id, row.latitude, row.longitude, row.category)
+
+    def viewport(
+        self,
+        bbox: Tuple[float, float, float, float],
+        zoom: int,
+        max_points: int = 500,
+    ) -> Tuple[List[Cluster], List[MapPoint]]:
+        """
+        Clusters and individual POIs inside (min_lat, min_lon, max_lat, max_lon)
+        Görünür alandaki kümeler ve tekil POI'ler
+        """
+        return _viewport(self._pyramid, bbox, zoom, max_points)
+
+
+def _viewport(pyramid: _Pyramid, bbox, zoom: int, max_points: int) -> Tuple[List[Cluster], List[MapPoint]]:
+    """
+    Above MAX_CLUSTER_ZOOM every POI in the viewport is returned (up to
+    max_points); below it cells holding a single POI are returned as points,
+    and as clusters of one once max_points is reached.
+    """
+    clusters: List[Cluster] = []
+    points: List[MapPoint] = []
+
+    if zoom > MAX_CLUSTER_ZOOM:
+        for _, cell in pyramid.cells_in(MAX_CLUSTER_ZOOM, bbox):
+            for poi_id in cell.ids or ():
+                lat, lon, category, _ = pyramid.points[poi_id]
+                if _in_bbox(lat, lon, bbox):
+                    points.append(MapPoint(poi_id, lat, lon, category))
+                    if len(points) >= max_points:
+                        return clusters, points
+        return clusters, points
+
+    for key, cell in pyramid.cells_in(zoom, bbox):
+        if cell.count == 1 and len(points) < max_points:
+            poi_id = pyramid.single_id(zoom, key)
+            if poi_id is not None:
+                lat, lon, category, _ = pyramid.points[poi_id]
+                points.append(MapPoint(poi_id, lat, lon, category))
+                continue
+        clusters.append(cell.cluster())
+    return clusters, points
+
+
+def viewport_from_rows(rows: List, bbox, zoom: int, max_points: int = 500) -> Tuple[List[Cluster], List[MapPoint]]:
+    """Same as MapClusterIndex.viewport over the given rows (used before the pyramid is built)"""
+    return _viewport(_Pyramid.from_rows(rows), bbox, zoom, max_points)
+
+
+# Global map cluster pyramid instance
+map_clusters = register_view(MapClusterIndex())
@@ -0,0 +1,197 @@
+"""
+Read-through cache of POIs by id
+ID ile POI önbelleği - süreç içi LRU + Redis
+
+Detail pages and favorites load POIs by id. Lookups go through two tiers
+before the database:
+
+- an in-process LRU (``POI_ENTITY_CACHE_SIZE`` entries, each kept for
+  ``POI_ENTITY_CACHE_TTL_SECONDS``), no I/O at all;
+- Redis, shared by every worker, holding the detail payload (the fields of
+  ``POI.to_dict()``) as JSON.
+
+Misses of both are loaded in one ``IN`` query and written to both tiers.
+Committed POI changes delete the Redis entries and are published on a
+pub/sub channel; every worker's subscriber evicts the ids from its LRU, so
+no worker serves an old payload once the change is committed. A lookup that
+raced with an invalidation in this worker is not cached. Callers get copies
+and may add their own fields.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.services.poi_events import POIChange
+from app.services.poi_fields import DETAIL
+from app.utils.redis import redis_client
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+RESUBSCRIBE_DELAY_SECONDS = 1.0
+
+
+class POIEntityCache:
+    """
+    Two-tier (process LRU + Redis) cache of POI payloads by id
+    POI verilerinin iki katmanlı önbelleği
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, redis_ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # poi_id -> (expires_at, payload)
+        self._generation = 0  # bumped by every invalidation
+        self.hits = {"local": 0, "redis": 0, "database": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get_local(self, poi_id: str) -> Optional[dict]:
+        entry = self._entries.get(poi_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[poi_id]
+            return None
+        self._entries.move_to_end(poi_id)
+        return entry[1]
+
+    def _put_local(self, payloads: Dict[str, dict]) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds
+        for poi_id, payload in payloads.items():
+            self._entries[poi_id] = (expires_at, payload)
+            self._entries.move_to_end(poi_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def evict_local(self, poi_ids: Iterable[str]) -> None:
+        self._generation += 1
+        for poi_id in poi_ids:
+            self._entries.pop(poi_id, None)
+
+    def clear_local(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+
+    async def _get_redis(self, poi_ids: List[str]) -> Dict[str, dict]:
+        if redis_client.redis is None or not poi_ids:
+            return {}
+        try:
+            values = await redis_client.poi_entity_get_many(poi_ids)
+        except Exception as exc:
+            logger.warning(f"POI cache unavailable: {exc}")
+            return {}
+        return {poi_id: json.loads(value) for poi_id, value in zip(poi_ids, values) if value is not None}
+
+    async def _put_redis(self, payloads: Dict[str, dict]) -> None:
+        if redis_client.redis is None or not payloads:
+            return
+        try:
+            await redis_client.poi_entity_set_many(
+                {poi_id: json.dumps(payload, default=str) for poi_id, payload in payloads.items()},
+                self.redis_ttl_seconds,
+            )
+        except Exception as exc:
+            logger.warning(f"POIs not cached: {exc}")
+
+    async def get_many(self, db: Session, poi_ids: Iterable[str]) -> Dict[str, dict]:
+        """
+        Payloads of the POIs that exist, keyed by id
+        Var olan POI'lerin verileri (id -> dict)
+        """
+        found: Dict[str, dict] = {}
+        missing = []
+        for poi_id in dict.fromkeys(poi_ids):
+            payload = self._get_local(poi_id)
+            if payload is not None:
+                found[poi_id] = payload
+            else:
+                missing.append(poi_id)
+        self.hits["local"] += len(found)
+        if not missing:
+            return {poi_id: dict(payload) for poi_id, payload in found.items()}
+
+        generation = self._generation
+        from_redis = await self._get_redis(missing)
+        self.hits["redis"] += len(from_redis)
+        missing = [poi_id for poi_id in missing if poi_id not in from_redis]
+
+        from_db = {}
+        if missing:
+            from_db = DETAIL.load(db, missing)
+            self.hits["database"] += len(from_db)
+
+        # Not cached when a POI was invalidated while it was being loaded
+        if generation == self._generation:
+            await self._put_redis(from_db)
+            self._put_local({**from_redis, **from_db})
+        found.update(from_redis)
+        found.update(from_db)
+        return {poi_id: dict(payload) for poi_id, payload in found.items()}
+
+    async def get(self, db: Session, poi_id: str) -> Optional[dict]:
+        """Payload of one POI, None if it does not exist"""
+        return (await self.get_many(db, [poi_id])).get(poi_id)
+
+    async def invalidate(self, poi_ids: Iterable[str]) -> None:
+        """Evict POIs here, in Redis and (over pub/sub) in every other worker"""
+        poi_ids = list(dict.fromkeys(poi_ids))
+        self.evict_local(poi_ids)
+        if redis_client.redis is None:
+            return
+        try:
+            await redis_client.poi_entity_invalidate(poi_ids)
+        except Exception:
+            logger.exception("POI cache invalidation failed")
+
+    async def on_poi_changes(self, changes: List[POIChange]) -> None:
+        """POI change listener"""
+        await self.invalidate(change.poi_id for change in changes)
+
+    async def run_invalidation_listener(self) -> None:
+        """
+        Evict POIs published by any worker (runs for the application lifetime)
+        Diğer worker'ların yayınladığı POI değişikliklerini dinler
+        """
+        while True:
+            if redis_client.redis is None:
+                await asyncio.sleep(RESUBSCRIBE_DELAY_SECONDS)
+                continue
+            pubsub = redis_client.poi_entity_subscription()
+            try:
+                await pubsub.subscribe(redis_client.POI_ENTITY_CHANNEL)
+                # Anything published while unsubscribed was missed
+                self.clear_local()
+                async for message in pubsub.listen():
+                    if message.get("type") == "message" and message.get("data"):
+                        self.evict_local(message["data"].split(","))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning(f"POI invalidation channel lost, resubscribing: {exc}")
+                await asyncio.sleep(RESUBSCRIBE_DELAY_SECONDS)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": dict(self.hits)}
+
+
+# Global POI entity cache instance
+poi_cache = POIEntityCache(
+    settings.POI_ENTITY_CACHE_SIZE,
+    settings.POI_ENTITY_CACHE_TTL_SECONDS,
+    settings.POI_ENTITY_REDIS_TTL_SECONDS,
+)
@@ -0,0 +1,197 @@
+"""
+POI change notifications
+POI değişikliklerini dinleyicilere bildirir
+
+SQLAlchemy session hooks collect every inserted, updated or deleted POI during
+a flush and hand them to the registered listeners once the transaction
+commits (nothing is published for rolled back transactions). Listeners may be
+plain functions or coroutines; coroutines are scheduled (``schedule``) on the
+application's event loop, captured at startup with ``bind_loop``, so request
+handlers are not delayed. Commits from sync endpoints run in the threadpool
+and hand their coroutines over to that loop.
+
+Bulk ``query.update()`` / ``query.delete()`` statements bypass the ORM and are
+not seen here; the periodic refresh of the in-memory views covers those.
+"""
+
+import asyncio
+import inspect
+import logging
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from app.models.poi import POI
+
+logger = logging.getLogger(__name__)
+
+_SESSION_KEY = "poi_changes"
+
+
+class POIChange(NamedTuple):
+    """A committed change to one POI (previous_* are None when unchanged)"""
+
+    poi_id: str
+    deleted: bool
+    is_active: bool
+    latitude: float
+    longitude: float
+    category: Optional[str]
+    city: Optional[str]
+    previous_latitude: Optional[float] = None
+    previous_longitude: Optional[float] = None
+    previous_category: Optional[str] = None
+    previous_city: Optional[str] = None
+
+
+_listeners: List[Callable] = []
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_pending: Set = set()  # scheduled coroutines, referenced until they finish
+
+
+def add_listener(listener: Callable) -> Callable:
+    """Register a callable(changes: List[POIChange]) run after each commit"""
+    if listener not in _listeners:
+        _listeners.append(listener)
+    return listener
+
+
+def remove_listener(listener: Callable) -> None:
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def _previous(state, key: str):
+    history = state.attrs[key].history
+    return history.deleted[0] if history.deleted else None
+
+
+def _snapshot(poi: POI, deleted: bool) -> POIChange:
+    state = sa_inspect(poi)
+    return POIChange(
+        poi_id=poi.id,
+        deleted=deleted,
+        is_active=not deleted and poi.is_active == 1,
+        latitude=poi.latitude,
+        longitude=poi.longitude,
+        category=poi.category,
+        city=poi.city,
+        previous_latitude=_previous(state, "latitude"),
+        previous_longitude=_previous(state, "longitude"),
+        previous_category=_previous(state, "category"),
+        previous_city=_previous(state, "city"),
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_changes(session, flush_context, instances):
+    if not _listeners:
+        return
+    pending = session.info.setdefault(_SESSION_KEY, {})
+    for obj in session.new:
+        if isinstance(obj, POI):
+            pending[id(obj)] = obj
+    for obj in session.dirty:
+        if isinstance(obj, POI) and session.is_modified(obj):
+            _merge(pending, _snapshot(obj, deleted=False))
+    for obj in session.deleted:
+        if isinstance(obj, POI):
+            _merge(pending, _snapshot(obj, deleted=True))
+
+
+def _merge(pending: dict, change: POIChange) -> None:
+    # Several flushes in one transaction: keep the values from before the first one
+    earlier = pending.get(change.poi_id)
+    if isinstance(earlier, POIChange):
+        change = change._replace(
+            previous_latitude=_first(earlier.previous_latitude, change.previous_latitude),
+            previous_longitude=_first(earlier.previous_longitude, change.previous_longitude),
+            previous_category=_first(earlier.previous_category, change.previous_category),
+            previous_city=_first(earlier.previous_city, change.previous_city),
+        )
+    pending[change.poi_id] = change
+
+
+def _first(*values):
+    return next((value for value in values if value is not None), None)
+
+
+@event.listens_for(Session, "after_flush")
+def _resolve_new(session, flush_context):
+    # New POIs only get their primary key during the flush
+    pending = session.info.get(_SESSION_KEY)
+    if not pending:
+        return
+    for key, value in list(pending.items()):
+        if isinstance(value, POI):
+            del pending[key]
+            pending[value.id] = _snapshot(value, deleted=False)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changes(session):
+    pending = session.info.pop(_SESSION_KEY, None)
+    if pending:
+        publish(list(pending.values()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def bind_loop(loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+    """
+    Remember the application's event loop (call once at startup)
+    Uygulamanın olay döngüsünü kaydeder
+    """
+    global _loop
+    _loop = loop or asyncio.get_running_loop()
+
+
+def schedule(awaitable: Awaitable) -> bool:
+    """
+    Run a coroutine in the background on the application's loop
+    Coroutine'i arka planda çalıştırır
+
+    From the loop itself it becomes a task, from other threads (sync
+    endpoints) it is submitted thread-safely. False (and the coroutine is
+    closed) when there is no loop to run it on.
+    """
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+
+    if running is not None and (_loop is None or running is _loop):
+        future = running.create_task(awaitable)
+    elif _loop is not None and _loop.is_running():
+        future = asyncio.run_coroutine_threadsafe(awaitable, _loop)
+    else:
+        if inspect.iscoroutine(awaitable):
+            awaitable.close()
+        return False
+
+    _pending.add(future)
+    future.add_done_callback(_finished)
+    if future.done():
+        _pending.discard(future)
+    return True
+
+
+def _finished(future) -> None:
+    _pending.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Background POI change handler failed", exc_info=future.exception())
+
+
+def publish(changes: List[POIChange]) -> None:
+    """Deliver changes to every listener (also usable by bulk import scripts)"""
+    for listener in list(_listeners):
+        try:
+            result = listener(changes)
+            if inspect.isawaitable(result) and not schedule(result):
+                logger.warning(f"POI change listener {listener!r} skipped: no event loop to run it on")
+        except Exception:
+            logger.exception(f"POI change listener {listener!r} failed")
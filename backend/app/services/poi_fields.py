@@ -0,0 +1,146 @@
+"""
+POI field projections
+POI alan seçimleri - sadece gereken kolonları okur
+
+List views show a handful of fields, so loading whole ``POI`` entities and
+building the full ``to_dict()`` per row wastes most of the work. A
+``Projection`` selects only the columns behind the requested fields (as rows,
+no ORM identity map) and builds each dict with precomputed getters.
+
+Endpoints accept ``fields=``: a projection name (``compact``, ``list``,
+``detail``) or comma-separated field names; ``id`` is always included. The
+keys and values are the ones of ``POI.to_dict()``.
+"""
+
+from functools import lru_cache
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.poi import POI
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+# Output field -> (columns, converter of their values); None: copied as is
+FIELDS: Dict[str, Tuple[Tuple[str, ...], Optional[Callable]]] = {
+    "id": (("id",), None),
+    "google_place_id": (("google_place_id",), None),
+    "foursquare_id": (("foursquare_id",), None),
+    "name": (("name",), None),
+    "description": (("description",), None),
+    "address": (("address",), None),
+    "city": (("city",), None),
+    "city_key": (("city_key",), None),
+    "country": (("country",), None),
+    "postal_code": (("postal_code",), None),
+    "category": (("category",), None),
+    "types": (("types",), None),
+    "rating": (("rating",), None),
+    "rating_count": (("rating_count",), None),
+    "popularity_score": (("popularity_score",), None),
+    "phone_number": (("phone_number",), None),
+    "website": (("website",), None),
+    "opening_hours": (("opening_hours",), None),
+    "price_level": (("price_level",), None),
+    "estimated_cost_per_person": (("estimated_cost_per_person",), None),
+    "average_visit_duration_minutes": (("average_visit_duration_minutes",), None),
+    "best_visit_time": (("best_visit_time",), None),
+    "features": (("features",), None),
+    "tags": (("tags",), None),
+    "photos": (("photos",), None),
+    "cover_photo_url": (("cover_photo_url",), None),
+    "is_active": (("is_active",), bool),
+    "created_at": (("created_at",), _iso),
+    "updated_at": (("updated_at",), _iso),
+    "location": (("latitude", "longitude"), lambda lat, lon: {"latitude": lat, "longitude": lon}),
+}
+
+PROJECTIONS: Dict[str, Tuple[str, ...]] = {
+    # Map markers
+    "compact": ("id", "name", "category", "rating", "location"),
+    # List rows / cards
+    "list": ("id", "name", "category", "city", "rating", "rating_count", "price_level", "cover_photo_url", "location"),
+    # Everything POI.to_dict() returns
+    "detail": tuple(FIELDS),
+}
+
+
+class Projection:
+    """
+    The columns behind a set of POI fields and the dict built from each row
+    """
+
+    def __init__(self, fields: Tuple[str, ...], key: str):
+        self.fields = fields
+        self.key = key  # stable name, e.g. for cache keys
+        names: List[str] = []
+        for field in fields:
+            for column in FIELDS[field][0]:
+                if column not in names:
+                    names.append(column)
+        self.columns = [getattr(POI, name) for name in names]
+        position = {name: i for i, name in enumerate(names)}
+        self._builders = []
+        for field in fields:
+            columns, convert = FIELDS[field]
+            if convert is None:
+                self._builders.append((field, itemgetter(position[columns[0]]), None))
+            elif len(columns) == 1:
+                self._builders.append((field, itemgetter(position[columns[0]]), convert))
+            else:
+                getter = itemgetter(*(position[column] for column in columns))
+                self._builders.append((field, getter, lambda values, convert=convert: convert(*values)))
+
+    def to_dict(self, row) -> dict:
+        data = {}
+        for field, getter, convert in self._builders:
+            value = getter(row)
+            data[field] = value if convert is None else convert(value)
+        return data
+
+    def query(self, db: Session):
+        """Query selecting the projected columns"""
+        return db.query(*self.columns)
+
+    def load(self, db: Session, poi_ids: Iterable[str], active_only: bool = False) -> Dict[str, dict]:
+        """Projected POIs by id, in one query"""
+        poi_ids = list(poi_ids)
+        if not poi_ids:
+            return {}
+        query = self.query(db).filter(POI.id.in_(poi_ids))
+        if active_only:
+            query = query.filter(POI.is_active == 1)
+        rows = query.all()
+        return {data["id"]: data for data in map(self.to_dict, rows)}
+
+    def including(self, field: str) -> "Projection":
+        """This projection with one more field"""
+        return self if field in self.fields else projection(",".join([*self.fields, field]))
+
+    def pick(self, payload: dict) -> dict:
+        """The projected fields of a full (detail) POI dict"""
+        return {field: payload.get(field) for field in self.fields}
+
+
+@lru_cache(maxsize=256)
+def projection(fields: Optional[str] = None, default: str = "list") -> Projection:
+    """
+    Projection for a fields= value: a projection name or comma-separated field names
+    Raises ValueError for unknown names.
+    """
+    requested = (fields or default).strip()
+    if requested in PROJECTIONS:
+        return Projection(PROJECTIONS[requested], requested)
+    names = [name.strip() for name in requested.split(",") if name.strip()]
+    unknown = [name for name in names if name not in FIELDS]
+    if unknown or not names:
+        raise ValueError(f"Unknown field: {unknown[0] if unknown else requested}")
+    selected = tuple(dict.fromkeys(["id", *names]))
+    return Projection(selected, ",".join(sorted(selected)))
+
+
+DETAIL = projection("detail")
@@ -0,0 +1,343 @@
+"""
+In-process spatial index of active POIs
+Aktif POI'lerin bellek içi mekansal indeksi (KD-tree)
+
+Points are stored as unit vectors on the sphere, so the straight-line (chord)
+distance between two points grows monotonically with their great-circle
+distance and a plain 3-d KD-tree answers radius and k-nearest-neighbour
+queries exactly. One tree is built over every POI plus one per category,
+all sharing the same coordinate arrays.
+
+Trees are built with NumPy (a partition around the median per node); the
+queries walk plain Python arrays, which are faster to index one element at
+a time.
+
+Changes seen by the incremental refresh go into a small overlay that is
+scanned linearly and shadows stale tree entries; once the overlay grows past
+a threshold the view asks for a full rebuild.
+"""
+
+import heapq
+from array import array
+from collections import namedtuple
+from math import asin, cos, radians, sin
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.services.poi_refresh import IncrementalPOIView, register_view
+
+EARTH_RADIUS_KM = 6371.0
+LEAF_SIZE = 16
+MIN_OVERLAY_REBUILD = 1000
+OVERLAY_REBUILD_RATIO = 0.05
+
+NearbyHit = namedtuple("NearbyHit", ["poi_id", "category", "rating", "distance_km"])
+CircleHit = namedtuple("CircleHit", ["poi_id", "category", "rating", "latitude", "longitude", "circle"])
+
+
+def _to_unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    lat, lon = radians(lat), radians(lon)
+    cos_lat = cos(lat)
+    return cos_lat * cos(lon), cos_lat * sin(lon), sin(lat)
+
+
+def _chord_to_km(chord_sq: float) -> float:
+    return 2.0 * EARTH_RADIUS_KM * asin(min(1.0, chord_sq ** 0.5 / 2.0))
+
+
+def _km_to_chord_sq(distance_km: float) -> float:
+    angle = min(distance_km / EARTH_RADIUS_KM, 3.141592653589793)
+    return (2.0 * sin(angle / 2.0)) ** 2
+
+
+class _KDTree:
+    """Static implicit KD-tree over a permutation of point indices"""
+
+    def __init__(self, coords: Tuple[array, array, array], points: np.ndarray, indices: np.ndarray):
+        self.coords = coords
+        perm, axes = self._build(points[indices], indices.copy())
+        self.perm = perm.tolist()
+        self.axes = array("b", axes.tobytes())
+
+    def __len__(self):
+        return len(self.perm)
+
+    @staticmethod
+    def _build(points: np.ndarray, perm: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Reorder points (n x 3) and perm in place into the implicit tree and
+        return (perm, split axis per node)
+        """
+        axes = np.zeros(len(perm), dtype=np.int8)
+        stack = [(0, len(perm))]
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo <= LEAF_SIZE:
+                continue
+            block = points[lo:hi]
+            # Split on the axis with the largest spread, at the median
+            axis = int(np.argmax(block.max(axis=0) - block.min(axis=0)))
+            mid = (lo + hi) // 2
+            order = np.argpartition(block[:, axis], mid - lo)
+            points[lo:hi] = block[order]
+            perm[lo:hi] = perm[lo:hi][order]
+            axes[mid] = axis
+            stack.append((lo, mid))
+            stack.append((mid + 1, hi))
+        return perm, axes
+
+    def _dist_sq(self, point: int, q: Tuple[float, float, float]) -> float:
+        xs, ys, zs = self.coords
+        dx, dy, dz = xs[point] - q[0], ys[point] - q[1], zs[point] - q[2]
+        return dx * dx + dy * dy + dz * dz
+
+    def within(self, q, radius_sq: float, accept) -> List[Tuple[float, int]]:
+        """All (chord_sq, point) pairs with chord_sq <= radius_sq"""
+        perm, axes, coords = self.perm, self.axes, self.coords
+        radius = radius_sq ** 0.5
+        found = []
+        stack = [(0, len(perm))]
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo <= LEAF_SIZE:
+                for i in range(lo, hi):
+                    point = perm[i]
+                    d = self._dist_sq(point, q)
+                    if d <= radius_sq and accept(point):
+                        found.append((d, point))
+                continue
+            mid = (lo + hi) // 2
+            point = perm[mid]
+            d = self._dist_sq(point, q)
+            if d <= radius_sq and accept(point):
+                found.append((d, point))
+            axis = axes[mid]
+            diff = q[axis] - coords[axis][point]
+            if diff <= radius:
+                stack.append((lo, mid))
+            if diff >= -radius:
+                stack.append((mid + 1, hi))
+        return found
+
+    def nearest(self, q, k: int, radius_sq: float, accept) -> List[Tuple[float, int]]:
+        """Up to k (chord_sq, point) pairs closest to q, nearest first"""
+        perm, axes, coords = self.perm, self.axes, self.coords
+        heap: List[Tuple[float, int]] = []  # max-heap on -chord_sq
+
+        def consider(point):
+            d = self._dist_sq(point, q)
+            if d > radius_sq or not accept(point):
+                return
+            if len(heap) < k:
+                heapq.heappush(heap, (-d, point))
+            elif d < -heap[0][0]:
+                heapq.heapreplace(heap, (-d, point))
+
+        def bound():
+            return -heap[0][0] if len(heap) >= k else radius_sq
+
+        def search(lo, hi):
+            if hi - lo <= LEAF_SIZE:
+                for i in range(lo, hi):
+                    consider(perm[i])
+                return
+            mid = (lo + hi) // 2
+            point = perm[mid]
+            consider(point)
+            diff = q[axes[mid]] - coords[axes[mid]][point]
+            if diff <= 0:
+                near, far = (lo, mid), (mid + 1, hi)
+            else:
+                near, far = (mid + 1, hi), (lo, mid)
+            search(*near)
+            if diff * diff <= bound():
+                search(*far)
+
+        if perm:
+            search(0, len(perm))
+        return sorted((-neg_d, point) for neg_d, point in heap)
+
+
+class _Snapshot:
+    """Immutable point arrays and trees produced by a full build"""
+
+    def __init__(self, rows):
+        self.ids: List[str] = [row.id for row in rows]
+        self.category_names: List[str] = []
+        category_codes: Dict[str, int] = {}
+        codes = []
+        for row in rows:
+            code = category_codes.get(row.category)
+            if code is None:
+                code = category_codes[row.category] = len(self.category_names)
+                self.category_names.append(row.category)
+            codes.append(code)
+        self.categories = array("H", codes)
+        self.ratings = array("f", [row.rating or 0.0 for row in rows])
+        self.lats = array("d", [row.latitude for row in rows])
+        self.lons = array("d", [row.longitude for row in rows])
+
+        lats, lons = np.radians(np.asarray(self.lats)), np.radians(np.asarray(self.lons))
+        points = np.column_stack((np.cos(lats) * np.cos(lons), np.cos(lats) * np.sin(lons), np.sin(lats)))
+        self.coords = tuple(array("d", points[:, axis].tobytes()) for axis in range(3))
+        self.category_codes = category_codes
+        self.tree = _KDTree(self.coords, points, np.arange(len(self.ids)))
+        codes = np.asarray(self.categories, dtype=np.int64)
+        self.category_trees = {
+            code: _KDTree(self.coords, points, np.flatnonzero(codes == code)) for code in category_codes.values()
+        }
+
+    def tree_for(self, category: Optional[str]) -> Optional[_KDTree]:
+        if category is None:
+            return self.tree
+        code = self.category_codes.get(category)
+        return self.category_trees.get(code) if code is not None else None
+
+    def hit(self, point: int, chord_sq: float) -> NearbyHit:
+        return NearbyHit(
+            self.ids[point],
+            self.category_names[self.categories[point]],
+            self.ratings[point],
+            _chord_to_km(chord_sq),
+        )
+
+
+class POIIndex(IncrementalPOIView):
+    """
+    KD-tree index of active POIs (id, lat/lon, category, rating)
+    Aktif POI'lerin KD-tree indeksi
+    """
+
+    name = "poi_index"
+
+    def __init__(self):
+        super().__init__()
+        self._snapshot = _Snapshot([])
+        # poi_id -> (lat, lon, category, rating, unit vector) or None when removed
+        self._overlay: Dict[str, Optional[tuple]] = {}
+
+    def __len__(self):
+        live = sum(1 for poi_id in self._snapshot.ids if poi_id not in self._overlay)
+        return live + sum(1 for entry in self._overlay.values() if entry is not None)
+
+    def build(self, rows) -> None:
+        snapshot = _Snapshot(rows)
+        self._snapshot, self._overlay = snapshot, {}
+
+    def indexed_ids(self) -> Set[str]:
+        overlay = self._overlay
+        ids = {poi_id for poi_id in self._snapshot.ids if poi_id not in overlay}
+        ids.update(poi_id for poi_id, entry in overlay.items() if entry is not None)
+        return ids
+
+    def apply(self, rows) -> None:
+        overlay = dict(self._overlay)
+        for row in rows:
+            if row.is_active == 1:
+                overlay[row.id] = (
+                    row.latitude,
+                    row.longitude,
+                    row.category,
+                    row.rating or 0.0,
+                    _to_unit_vector(row.latitude, row.longitude),
+                )
+            else:
+                overlay[row.id] = None
+        self._overlay = overlay
+        threshold = max(MIN_OVERLAY_REBUILD, OVERLAY_REBUILD_RATIO * len(self._snapshot.ids))
+        if len(overlay) > threshold:
+            self.needs_rebuild = True
+
+    def _overlay_hits(self, overlay, q, radius_sq: float, category: Optional[str]) -> List[NearbyHit]:
+        hits = []
+        for poi_id, entry in overlay.items():
+            if entry is None or (category is not None and entry[2] != category):
+                continue
+            x, y, z = entry[4]
+            d = (x - q[0]) ** 2 + (y - q[1]) ** 2 + (z - q[2]) ** 2
+            if d <= radius_sq:
+                hits.append(NearbyHit(poi_id, entry[2], entry[3], _chord_to_km(d)))
+        return hits
+
+    def query_radius(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        category: Optional[str] = None,
+    ) -> List[NearbyHit]:
+        """
+        POIs within radius_km of (lat, lon), nearest first
+        Yarıçap içindeki POI'ler - en yakından uzağa
+        """
+        snapshot, overlay = self._snapshot, self._overlay
+        q = _to_unit_vector(lat, lon)
+        radius_sq = _km_to_chord_sq(radius_km)
+        ids = snapshot.ids
+
+        hits = []
+        tree = snapshot.tree_for(category)
+        if tree is not None:
+            accept = (lambda point: ids[point] not in overlay) if overlay else (lambda point: True)
+            hits = [snapshot.hit(point, d) for d, point in tree.within(q, radius_sq, accept)]
+        hits.extend(self._overlay_hits(overlay, q, radius_sq, category))
+        hits.sort(key=lambda hit: hit.distance_km)
+        return hits
+
+    def query_nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        category: Optional[str] = None,
+        max_radius_km: Optional[float] = None,
+    ) -> List[NearbyHit]:
+        """
+        The k POIs closest to (lat, lon), optionally within max_radius_km
+        (lat, lon) noktasına en yakın k POI
+        """
+        snapshot, overlay = self._snapshot, self._overlay
+        q = _to_unit_vector(lat, lon)
+        radius_sq = _km_to_chord_sq(max_radius_km) if max_radius_km else 4.0
+        ids = snapshot.ids
+
+        hits = []
+        tree = snapshot.tree_for(category)
+        if tree is not None:
+            accept = (lambda point: ids[point] not in overlay) if overlay else (lambda point: True)
+            hits = [snapshot.hit(point, d) for d, point in tree.nearest(q, k, radius_sq, accept)]
+        hits.extend(self._overlay_hits(overlay, q, radius_sq, category))
+        hits.sort(key=lambda hit: hit.distance_km)
+        return hits[:k]
+
+    def query_circles(
+        self,
+        circles: List[Tuple[float, float, float]],
+        category: Optional[str] = None,
+    ) -> List[CircleHit]:
+        """
+        POIs inside (lat, lon, radius_km) circles, once for every circle containing them
+        Birden çok dairenin içindeki POI'ler (rota koridoru aramaları için)
+        """
+        snapshot, overlay = self._snapshot, self._overlay
+        ids, lats, lons = snapshot.ids, snapshot.lats, snapshot.lons
+        tree = snapshot.tree_for(category)
+        accept = (lambda point: ids[point] not in overlay) if overlay else (lambda point: True)
+
+        hits = []
+        for circle, (lat, lon, radius_km) in enumerate(circles):
+            q = _to_unit_vector(lat, lon)
+            radius_sq = _km_to_chord_sq(radius_km)
+            if tree is not None:
+                for _, point in tree.within(q, radius_sq, accept):
+                    hit = snapshot.hit(point, 0.0)
+                    hits.append(CircleHit(hit.poi_id, hit.category, hit.rating, lats[point], lons[point], circle))
+            for hit in self._overlay_hits(overlay, q, radius_sq, category):
+                entry = overlay[hit.poi_id]
+                hits.append(CircleHit(hit.poi_id, hit.category, hit.rating, entry[0], entry[1], circle))
+        return hits
+
+
+# Global POI index instance
+poi_index = register_view(POIIndex())
@@ -0,0 +1,158 @@
+"""
+Incremental in-memory views over the pois table
+pois tablosunun bellek içi görünümleri - POI.updated_at ile artımlı güncellenir
+
+A view is fully built at startup and then refreshed from the rows whose
+``updated_at`` moved past its watermark. Loading and full builds run in a
+worker thread; incremental changes are applied on the event loop so request
+handlers never observe a half-applied batch.
+
+Deleted rows leave nothing behind for ``updated_at`` to find, so views that
+can list their POI ids are also reconciled against the ids of the active
+rows every ``reconcile_interval``.
+"""
+
+import asyncio
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Set
+
+from app.db.session import SessionLocal
+from app.models.poi import POI
+
+logger = logging.getLogger(__name__)
+
+# Stands in for a row that no longer exists: views drop inactive rows in apply()
+RemovedRow = namedtuple("RemovedRow", ["id", "is_active"], defaults=[0])
+
+
+class IncrementalPOIView:
+    """Base class for in-memory POI views refreshed from POI.updated_at"""
+
+    name = "poi_view"
+    columns = (
+        POI.id,
+        POI.latitude,
+        POI.longitude,
+        POI.category,
+        POI.rating,
+        POI.is_active,
+        POI.updated_at,
+    )
+    # Re-read a short window before the watermark so rows committed late
+    # with an older updated_at are not missed (applying a row twice is harmless)
+    overlap = timedelta(seconds=60)
+    reconcile_interval = timedelta(minutes=10)
+
+    def __init__(self):
+        self.watermark: Optional[datetime] = None
+        self.is_ready = False
+        self.needs_rebuild = False
+        self.reconciled_at: Optional[datetime] = None
+
+    def load_rows(self, since: Optional[datetime] = None) -> List:
+        """Load active rows (full build) or every row changed since the watermark"""
+        db = SessionLocal()
+        try:
+            query = db.query(*self.columns)
+            if since is None:
+                query = query.filter(POI.is_active == 1)
+            else:
+                query = query.filter(POI.updated_at >= since - self.overlap)
+            return query.all()
+        finally:
+            db.close()
+
+    def build(self, rows: List) -> None:
+        """Replace the view from a full set of active rows (runs in a worker thread)"""
+        raise NotImplementedError
+
+    def apply(self, rows: List) -> None:
+        """Apply changed rows, including deactivated ones (runs on the event loop)"""
+        raise NotImplementedError
+
+    def indexed_ids(self) -> Optional[Set[str]]:
+        """Ids of the POIs in the view, for reconciliation; None when not supported"""
+        return None
+
+    def forget(self, poi_ids: Iterable[str]) -> None:
+        """Drop POIs that were deleted from the table (runs on the event loop)"""
+        rows = [RemovedRow(poi_id) for poi_id in poi_ids]
+        if rows:
+            self.apply(rows)
+
+    @staticmethod
+    def load_active_ids() -> Set[str]:
+        db = SessionLocal()
+        try:
+            return {poi_id for poi_id, in db.query(POI.id).filter(POI.is_active == 1)}
+        finally:
+            db.close()
+
+    async def reconcile(self) -> None:
+        """Forget POIs the view still has but the table no longer lists as active"""
+        self.reconciled_at = datetime.utcnow()
+        # Read before the table: rows added to the view later are not judged
+        indexed = self.indexed_ids()
+        if indexed is None:
+            return
+        active = await asyncio.to_thread(self.load_active_ids)
+        gone = indexed - active
+        self.forget(gone)
+        if gone:
+            logger.info(f"{self.name}: forgot {len(gone)} deleted POIs")
+
+    @staticmethod
+    def _max_updated_at(rows: List, default: datetime) -> datetime:
+        return max((row.updated_at for row in rows if row.updated_at), default=default)
+
+    async def rebuild(self) -> None:
+        started_at = datetime.utcnow()
+        rows = await asyncio.to_thread(self.load_rows)
+        await asyncio.to_thread(self.build, rows)
+        self.watermark = self._max_updated_at(rows, default=started_at)
+        self.needs_rebuild = False
+        self.is_ready = True
+        self.reconciled_at = started_at
+        logger.info(f"{self.name}: built from {len(rows)} POIs")
+
+    async def refresh(self) -> None:
+        if not self.is_ready or self.needs_rebuild:
+            await self.rebuild()
+            return
+        if datetime.utcnow() - self.reconciled_at >= self.reconcile_interval:
+            await self.reconcile()
+        rows = await asyncio.to_thread(self.load_rows, self.watermark)
+        if rows:
+            self.apply(rows)
+            self.watermark = self._max_updated_at(rows, default=self.watermark)
+
+
+_views: List[IncrementalPOIView] = []
+
+
+def register_view(view: IncrementalPOIView) -> IncrementalPOIView:
+    """Register a view to be built at startup and refreshed periodically"""
+    _views.append(view)
+    return view
+
+
+async def start_views() -> None:
+    """Build every registered view (called from the application lifespan)"""
+    for view in _views:
+        try:
+            await view.rebuild()
+        except Exception:
+            logger.exception(f"{view.name}: initial build failed")
+
+
+async def run_refresh_loop(interval_seconds: float) -> None:
+    """Refresh every registered view forever; cancel the task to stop"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        for view in _views:
+            try:
+                await view.refresh()
+            except Exception:
+                logger.exception(f"{view.name}: refresh failed")
@@ -0,0 +1,209 @@
+"""
+Shared response cache for POI listings
+POI listeleri için ortak yanıt önbelleği (Redis)
+
+``/pois/city/{city}`` and ``/pois/nearby`` give the same answer to everyone
+asking about the same place, so their bodies are cached in Redis under
+normalized keys:
+
+- nearby: the location is snapped to the center of its geohash cell
+  (``NEARBY_CELL_PRECISION``, about 150 m) and the radius rounded up to a
+  bucket. The entry holds the nearest ``NEARBY_CACHED_ROWS`` POIs within the
+  bucket plus ``NEARBY_CELL_MARGIN_KM`` of the cell center, with their
+  coordinates; per request they are re-measured from the caller's location
+  and cut to the requested radius and limit (``measure_nearby``).
+- city: the canonical city key plus the listing parameters.
+
+Bodies hold no per-user data; ``is_favorite`` is added after the lookup.
+Every entry is tagged with what it depends on: geohash cells (at a precision
+where the circle covers a handful of cells) for nearby, the city key for
+city listings. A committed POI change drops the entries tagged with its
+cells or city, old and new; the TTL bounds anything missed (bulk updates).
+"""
+
+import hashlib
+import json
+import logging
+from typing import Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models.favorite import Favorite
+from app.services.geo import haversine_km
+from app.services.poi_events import POIChange
+from app.utils import geohash
+from app.utils.redis import redis_client
+from app.utils.text import normalize_text
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+NEARBY_CELL_PRECISION = 7
+RADIUS_BUCKETS_KM = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0)
+NEARBY_CACHED_ROWS = 200
+TAG_PRECISIONS = (3, 4, 5, 6)
+MAX_TAG_CELLS = 16
+
+
+def _cell_margin_km(precision: int) -> float:
+    """Farthest a location can be from its cell center (half the diagonal of an equator cell)"""
+    lat_extent, lon_extent = geohash.cell_size(precision)
+    return float(haversine_km(0.0, 0.0, [lat_extent / 2], [lon_extent / 2])[0])
+
+
+NEARBY_CELL_MARGIN_KM = _cell_margin_km(NEARBY_CELL_PRECISION)
+
+
+def enabled() -> bool:
+    return redis_client.redis is not None and settings.POI_RESPONSE_CACHE_TTL_SECONDS > 0
+
+
+def radius_bucket(radius_km: float) -> float:
+    for bucket in RADIUS_BUCKETS_KM:
+        if radius_km <= bucket:
+            return bucket
+    return radius_km
+
+
+def snap_nearby(lat: float, lon: float, radius_km: float) -> Tuple[str, float, float, float]:
+    """(cell, cell center lat, cell center lon, bucketed radius) of a nearby query"""
+    cell = geohash.encode(lat, lon, NEARBY_CELL_PRECISION)
+    center_lat, center_lon = geohash.center(cell)
+    return cell, center_lat, center_lon, radius_bucket(radius_km)
+
+
+def nearby_reach_km(bucket_km: float) -> float:
+    """Radius around the cell center that holds the bucket's circle for any location in the cell"""
+    return bucket_km + NEARBY_CELL_MARGIN_KM
+
+
+def nearby_entry(center_lat: float, center_lon: float, reach_km: float, items: List[dict], points: List[Tuple[float, float]]) -> dict:
+    """
+    Cached nearby entry; reach_km: every POI missing from items is at least
+    this far from the cell center
+    """
+    return {"center": [center_lat, center_lon], "reach_km": reach_km, "items": items, "points": points}
+
+
+def measure_nearby(entry: dict, lat: float, lon: float, radius_km: float, limit: int) -> Optional[List[dict]]:
+    """
+    Items of a nearby entry within radius_km of (lat, lon), nearest first, at
+    most limit, with distance_km from (lat, lon). None when a POI missing
+    from the entry could belong in the answer.
+    """
+    center_lat, center_lon = entry["center"]
+    # POIs outside the entry are at least this far from (lat, lon)
+    exact_km = entry["reach_km"] - float(haversine_km(lat, lon, [center_lat], [center_lon])[0])
+    points = np.asarray(entry["points"], dtype=np.float64).reshape(-1, 2)
+    distances = haversine_km(lat, lon, points[:, 0], points[:, 1])
+    result = []
+    for i in np.argsort(distances, kind="stable"):
+        distance = float(distances[i])
+        if distance > radius_km or len(result) == limit:
+            break
+        if distance > exact_km:
+            return None
+        result.append({**entry["items"][i], "distance_km": round(distance, 2)})
+    if len(result) < limit and radius_km > exact_km:
+        return None
+    return result
+
+
+def nearby_key(cell: str, radius_km: float, category: Optional[str], source: str, fields: str) -> str:
+    return f"nearby:{cell}:{radius_km:g}:{category or '*'}:{source}:{fields}"
+
+
+def nearby_tags(lat: float, lon: float, radius_km: float) -> List[str]:
+    """Cells covering the circle, at the finest precision that needs few of them"""
+    for precision in reversed(TAG_PRECISIONS):
+        cells = geohash.covering(lat, lon, radius_km, precision)
+        if len(cells) <= MAX_TAG_CELLS or precision == TAG_PRECISIONS[0]:
+            return [f"gh:{cell}" for cell in cells]
+    return []
+
+
+def city_listing_key(
+    city_key: str,
+    category: Optional[str],
+    min_rating: float,
+    limit: int,
+    offset: int,
+    cursor: Optional[str],
+    fields: str,
+) -> str:
+    page = hashlib.sha1(cursor.encode("utf-8")).hexdigest()[:16] if cursor else f"o{offset}"
+    return f"city:{city_key}:{category or '*'}:{min_rating:g}:{limit}:{page}:{fields}"
+
+
+def city_tag(city_key: str) -> str:
+    return f"city:{city_key}"
+
+
+async def get(key: str):
+    """Cached body, None on a miss or when Redis is unavailable"""
+    if not enabled():
+        return None
+    try:
+        body = await redis_client.response_cache_get(key)
+    except Exception as exc:
+        logger.warning(f"POI response cache unavailable: {exc}")
+        return None
+    return json.loads(body) if body is not None else None
+
+
+async def put(key: str, value, tags: Iterable[str]) -> None:
+    if not enabled():
+        return
+    try:
+        body = json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+        await redis_client.response_cache_set(key, body, tags, settings.POI_RESPONSE_CACHE_TTL_SECONDS)
+    except Exception as exc:
+        logger.warning(f"POI response not cached: {exc}")
+
+
+def with_favorites(db: Session, user_id: Optional[str], items: List[dict]) -> List[dict]:
+    """Copies of POI dicts with the user's is_favorite flag"""
+    favorite_poi_ids = set()
+    if user_id and items:
+        favorites = db.query(Favorite.poi_id).filter(
+            Favorite.user_id == user_id,
+            Favorite.poi_id.in_([item["id"] for item in items])
+        ).all()
+        favorite_poi_ids = {fav.poi_id for fav in favorites}
+    return [{**item, "is_favorite": item["id"] in favorite_poi_ids} for item in items]
+
+
+def _change_tags(change: POIChange) -> Set[str]:
+    tags = set()
+    locations = [(change.latitude, change.longitude)]
+    if change.previous_latitude is not None or change.previous_longitude is not None:
+        locations.append((
+            change.previous_latitude if change.previous_latitude is not None else change.latitude,
+            change.previous_longitude if change.previous_longitude is not None else change.longitude,
+        ))
+    for lat, lon in locations:
+        if lat is None or lon is None:
+            continue
+        cell = geohash.encode(lat, lon, max(TAG_PRECISIONS))
+        tags.update(f"gh:{cell[:precision]}" for precision in TAG_PRECISIONS)
+    for city in (change.city, change.previous_city):
+        key = normalize_text(city) if city else None
+        if key:
+            tags.add(city_tag(key))
+    return tags
+
+
+async def on_poi_changes(changes: List[POIChange]) -> None:
+    """POI change listener dropping the cached listings that may contain the POIs"""
+    if not enabled():
+        return
+    tags = set()
+    for change in changes:
+        tags |= _change_tags(change)
+    try:
+        await redis_client.response_cache_invalidate(tags)
+    except Exception:
+        logger.exception("POI response cache invalidation failed")
@@ -0,0 +1,95 @@
+"""
+Data versions behind POI responses, for conditional GET
+POI yanıtlarının veri sürümleri - ETag / Last-Modified için
+
+A listing's version is the newest ``updated_at`` of the POIs it is drawn
+from (a city, optionally one category; or the POIs around a point) and how
+many of them are active. Both come from one aggregate query, far cheaper
+than loading and serializing the page; for cities it only reads the city
+ranking indexes, which carry updated_at for this. Inactive rows count for the newest
+change, so deactivating a POI moves the version forward; the count catches
+rows that were deleted or moved out. Versions
+are kept in the Redis response cache under the same city / cell tags as the
+bodies, so the POI change listener drops them together.
+
+A user's favorites version (count and newest change) is part of the ETag of
+responses carrying ``is_favorite``.
+"""
+
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.db.spatial import within_radius
+from app.models.favorite import Favorite
+from app.models.poi import POI
+from app.services import poi_response_cache
+
+
+class Version(NamedTuple):
+    last_modified: Optional[datetime]
+    count: int
+
+    def __str__(self):
+        return f"{self.last_modified.isoformat() if self.last_modified else '-'}/{self.count}"
+
+
+def _aggregate(db: Session, *criteria) -> Version:
+    last_modified, count = db.query(
+        func.max(POI.updated_at),
+        func.count(case((POI.is_active == 1, 1)))
+    ).filter(*criteria).one()
+    return Version(last_modified, count or 0)
+
+
+async def _cached(key: str, tags: List[str], compute) -> Version:
+    cached = await poi_response_cache.get(key)
+    if cached is not None:
+        return Version(datetime.fromisoformat(cached[0]) if cached[0] else None, cached[1])
+    version = compute()
+    await poi_response_cache.put(key, [version.last_modified.isoformat() if version.last_modified else None, version.count], tags)
+    return version
+
+
+async def city_version(db: Session, city_key: str, category: Optional[str] = None) -> Version:
+    """
+    Version of the POIs of a city (and category)
+    Şehrin POI'lerinin sürümü
+    """
+    criteria = [POI.city_key == city_key]
+    if category:
+        criteria.append(POI.category == category)
+    return await _cached(
+        f"version:city:{city_key}:{category or '*'}",
+        [poi_response_cache.city_tag(city_key)],
+        lambda: _aggregate(db, *criteria),
+    )
+
+
+def area_version(db: Session, lat: float, lon: float, radius_km: float, category: Optional[str] = None) -> Version:
+    """Version of the POIs around a point (spatial index candidates)"""
+    criteria = [within_radius(db.get_bind().dialect.name, lat, lon, radius_km)]
+    if category:
+        criteria.append(POI.category == category)
+    return _aggregate(db, *criteria)
+
+
+async def cell_version(db: Session, cell: str, lat: float, lon: float, radius_km: float, category: Optional[str] = None) -> Version:
+    """Version of a snapped nearby query (cell center and bucketed radius)"""
+    return await _cached(
+        f"version:nearby:{cell}:{radius_km:g}:{category or '*'}",
+        poi_response_cache.nearby_tags(lat, lon, radius_km),
+        lambda: area_version(db, lat, lon, radius_km, category),
+    )
+
+
+def favorites_version(db: Session, user_id: Optional[str]) -> Optional[str]:
+    """Changes whenever the user adds or removes a favorite"""
+    if not user_id:
+        return None
+    last_changed, count = db.query(func.max(Favorite.updated_at), func.count(Favorite.id)).filter(
+        Favorite.user_id == user_id
+    ).one()
+    return f"{last_changed.isoformat() if last_changed else '-'}/{count}"
@@ -0,0 +1,135 @@
+"""
+Redis GEO backed nearby index shared by all workers
+Tüm worker'lar tarafından paylaşılan Redis GEO yakınlık indeksi
+
+Active POIs live in one GEO set plus one set per category (see RedisClient).
+The sets are populated when missing and written through from committed POI
+changes (app.services.poi_events). Changes committed elsewhere (another
+process, a bulk import) or whose write-through failed are caught up by the
+``redis_geo`` view on the POI refresh loop: it re-applies the rows whose
+``updated_at`` passed the watermark stored next to the sets, and reconciles
+the indexed ids against the active rows to drop deleted POIs.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional, Set
+
+from app.config import get_settings
+from app.db.session import SessionLocal
+from app.models.poi import POI
+from app.services.poi_events import POIChange
+from app.services.poi_index import NearbyHit
+from app.services.poi_refresh import IncrementalPOIView, register_view
+from app.utils.redis import redis_client
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def _load_active_pois() -> List:
+    db = SessionLocal()
+    try:
+        return db.query(
+            POI.id, POI.latitude, POI.longitude, POI.category, POI.updated_at
+        ).filter(POI.is_active == 1).all()
+    finally:
+        db.close()
+
+
+async def ensure_geo_index(force: bool = False) -> None:
+    """Populate the GEO sets from the database when they (or their watermark) do not exist yet"""
+    if not force and await redis_client.geo_index_exists() and await redis_client.geo_get_watermark():
+        return
+    started_at = datetime.utcnow()
+    rows = await asyncio.to_thread(_load_active_pois)
+    await redis_client.geo_replace_pois((row.id, row.latitude, row.longitude, row.category) for row in rows)
+    watermark = IncrementalPOIView._max_updated_at(rows, default=started_at)
+    await redis_client.geo_set_watermark(watermark.isoformat())
+    logger.info(f"Redis GEO index built from {len(rows)} POIs")
+
+
+async def _write(poi_id: str, is_active: bool, latitude: float, longitude: float, category: str) -> None:
+    if is_active:
+        await redis_client.geo_upsert_poi(poi_id, latitude, longitude, category)
+    else:
+        await redis_client.geo_remove_poi(poi_id)
+
+
+async def write_through(changes: List[POIChange]) -> None:
+    """POI change listener keeping the GEO sets in sync"""
+    for change in changes:
+        try:
+            await _write(change.poi_id, change.is_active, change.latitude, change.longitude, change.category)
+        except Exception:
+            logger.exception(f"Redis GEO write-through failed for POI {change.poi_id}")
+
+
+class RedisGeoCatchUp(IncrementalPOIView):
+    """
+    Catch-up of the shared GEO sets from POI.updated_at (NEARBY_BACKEND="redis")
+    Redis GEO indeksini POI.updated_at ile yakalar
+    """
+
+    name = "redis_geo"
+
+    @staticmethod
+    def _enabled() -> bool:
+        return settings.NEARBY_BACKEND == "redis" and redis_client.redis is not None
+
+    async def rebuild(self) -> None:
+        if not self._enabled():
+            return
+        await ensure_geo_index(force=self.needs_rebuild)
+        self.needs_rebuild = False
+        self.is_ready = True
+        self.reconciled_at = datetime.utcnow()
+
+    async def refresh(self) -> None:
+        if not self._enabled():
+            return
+        watermark = await redis_client.geo_get_watermark()
+        if not self.is_ready or watermark is None:
+            await self.rebuild()
+            return
+        if datetime.utcnow() - self.reconciled_at >= self.reconcile_interval:
+            await self.reconcile()
+        watermark = datetime.fromisoformat(watermark)
+        rows = await asyncio.to_thread(self.load_rows, watermark)
+        for row in rows:
+            await _write(row.id, row.is_active == 1, row.latitude, row.longitude, row.category)
+        newest = self._max_updated_at(rows, default=watermark)
+        if newest > watermark:
+            # Workers may race here; a watermark set back a little only re-reads rows
+            await redis_client.geo_set_watermark(newest.isoformat())
+
+    async def reconcile(self) -> None:
+        self.reconciled_at = datetime.utcnow()
+        # Read before the table, as in IncrementalPOIView.reconcile
+        indexed: Set[str] = await redis_client.geo_poi_ids()
+        active = await asyncio.to_thread(self.load_active_ids)
+        gone = indexed - active
+        for poi_id in gone:
+            await redis_client.geo_remove_poi(poi_id)
+        if gone:
+            logger.info(f"{self.name}: removed {len(gone)} deleted POIs")
+
+
+async def query_radius(
+    lat: float,
+    lon: float,
+    radius_km: float,
+    category: Optional[str] = None,
+    count: Optional[int] = None,
+) -> List[NearbyHit]:
+    """
+    POIs within radius_km of (lat, lon), nearest first (at most count)
+    Yarıçap içindeki POI'ler (GEOSEARCH)
+    """
+    results = await redis_client.geo_search_pois(lat, lon, radius_km, category=category, count=count)
+    return [NearbyHit(poi_id, poi_category, None, distance) for poi_id, poi_category, distance in results]
+
+
+# Global GEO catch-up view (idle unless NEARBY_BACKEND is "redis")
+redis_geo_catch_up = register_view(RedisGeoCatchUp())
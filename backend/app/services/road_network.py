@@ -0,0 +1,587 @@
+"""
+Offline road-network routing with contraction hierarchies
+Yol ağı üzerinde çevrimdışı rota hesaplama (contraction hierarchies)
+
+The road graph is read from a local CSV extract (ROAD_GRAPH_PATH):
+
+- ``nodes.csv``: ``id,lat,lon``
+- ``edges.csv``: ``source,target,length_m[,oneway,foot,car,maxspeed_kmh]``
+  (defaults: two-way, open to pedestrians and cars, 30 km/h)
+
+Two graphs are derived from it: ``foot`` (every foot edge in both directions,
+weighted by length) and ``car`` (car edges honouring ``oneway``, weighted by
+travel time). Contraction is an offline step, run once per extract:
+
+    python -m app.services.road_network <ROAD_GRAPH_PATH>
+
+It writes the hierarchies as ``.npy`` files into a temporary directory and
+renames it to ``<ROAD_GRAPH_PATH>/ch`` when complete. Workers only
+memory-map those files (sharing the pages); when they are missing or older
+than the CSV extract, network routing stays off and straight-line
+estimates are used.
+
+Queries run a Dijkstra search over the upward edges from both ends:
+point-to-point meets in the middle, many-to-many combines the backward
+search spaces of all targets (buckets) with the forward search of each
+source. Walking and cycling use the foot graph; driving uses the car graph.
+Points are snapped to the nearest graph node; the gap is added as a straight
+line.
+"""
+
+import csv
+import heapq
+import json
+import logging
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+from math import floor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.geo import haversine_km
+
+logger = logging.getLogger(__name__)
+
+CH_DIRECTORY = "ch"
+DEFAULT_MAXSPEED_KMH = 30.0
+WITNESS_SETTLE_LIMIT = 60
+SNAP_CELL_DEGREES = 0.01
+SNAP_MAX_KM = 0.5
+# Transport mode -> graph
+MODE_GRAPHS = {"walking": "foot", "cycling": "foot", "driving": "car"}
+
+_ARRAYS = (
+    "rank",
+    "fwd_offsets", "fwd_targets", "fwd_weights", "fwd_lengths", "fwd_middles",
+    "bwd_offsets", "bwd_targets", "bwd_weights", "bwd_lengths", "bwd_middles",
+)
+CH_FORMAT = 2  # bump when the stored arrays change
+
+
+class _Hierarchy:
+    """
+    Upward CSR graphs of a contracted graph
+    fwd: u -> v with rank[v] > rank[u]; bwd: v <- u with rank[u] > rank[v]
+    middles: the contracted node a shortcut bypasses, -1 for road edges
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def load(cls, directory: str, graph: str) -> "_Hierarchy":
+        return cls({
+            name: np.load(os.path.join(directory, f"{graph}_{name}.npy"), mmap_mode="r") for name in _ARRAYS
+        })
+
+    def save(self, directory: str, graph: str) -> None:
+        for name in _ARRAYS:
+            np.save(os.path.join(directory, f"{graph}_{name}.npy"), getattr(self, name))
+
+    def _search(self, start: int, forward: bool, parents: Optional[Dict[int, int]] = None) -> Dict[int, Tuple[float, float]]:
+        """
+        Every node reachable over upward edges: node -> (weight, length)
+        parents, when given, receives the predecessor of every settled node.
+        """
+        if forward:
+            offsets, targets, weights, lengths = self.fwd_offsets, self.fwd_targets, self.fwd_weights, self.fwd_lengths
+        else:
+            offsets, targets, weights, lengths = self.bwd_offsets, self.bwd_targets, self.bwd_weights, self.bwd_lengths
+        settled: Dict[int, Tuple[float, float]] = {}
+        heap = [(0.0, 0.0, start, -1)]
+        while heap:
+            weight, length, node, parent = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled[node] = (weight, length)
+            if parents is not None:
+                parents[node] = parent
+            lo, hi = int(offsets[node]), int(offsets[node + 1])
+            if lo == hi:
+                continue
+            for target, edge_weight, edge_length in zip(
+                targets[lo:hi].tolist(), weights[lo:hi].tolist(), lengths[lo:hi].tolist()
+            ):
+                if target not in settled:
+                    heapq.heappush(heap, (weight + edge_weight, length + edge_length, target, node))
+        return settled
+
+    def query(self, source: int, target: int) -> Optional[Tuple[float, float]]:
+        """(weight, length) of the shortest path, None when unreachable"""
+        return self.many_to_many([source], [target])[0][0]
+
+    def _middle(self, u: int, v: int) -> int:
+        """Node bypassed by the edge u -> v (stored at its lower end), -1 for a road edge"""
+        if self.rank[u] < self.rank[v]:
+            offsets, targets, weights, middles, lower, other = self.fwd_offsets, self.fwd_targets, self.fwd_weights, self.fwd_middles, u, v
+        else:
+            offsets, targets, weights, middles, lower, other = self.bwd_offsets, self.bwd_targets, self.bwd_weights, self.bwd_middles, v, u
+        lo, hi = int(offsets[lower]), int(offsets[lower + 1])
+        best, best_weight = -1, float("inf")
+        for position, target in enumerate(targets[lo:hi].tolist()):
+            if target == other and weights[lo + position] < best_weight:
+                best, best_weight = int(middles[lo + position]), float(weights[lo + position])
+        return best
+
+    def _unpack(self, u: int, v: int) -> List[int]:
+        """Road nodes of the edge u -> v after u, shortcuts expanded"""
+        nodes: List[int] = []
+        stack = [(u, v)]
+        while stack:
+            a, b = stack.pop()
+            middle = self._middle(a, b)
+            if middle < 0:
+                nodes.append(b)
+            else:
+                stack.append((middle, b))
+                stack.append((a, middle))
+        return nodes
+
+    def path(self, source: int, target: int) -> Optional[List[int]]:
+        """Road nodes of the shortest path from source to target, None when unreachable"""
+        forward_parents: Dict[int, int] = {}
+        backward_parents: Dict[int, int] = {}
+        forward = self._search(source, forward=True, parents=forward_parents)
+        backward = self._search(target, forward=False, parents=backward_parents)
+        meeting = min(
+            (node for node in forward if node in backward),
+            key=lambda node: forward[node][0] + backward[node][0],
+            default=None,
+        )
+        if meeting is None:
+            return None
+        up = [meeting]
+        while forward_parents[up[-1]] != -1:
+            up.append(forward_parents[up[-1]])
+        up.reverse()
+        down = [meeting]
+        while backward_parents[down[-1]] != -1:
+            down.append(backward_parents[down[-1]])
+        chain = up + down[1:]
+        nodes = [source]
+        for a, b in zip(chain[:-1], chain[1:]):
+            nodes.extend(self._unpack(a, b))
+        return nodes
+
+    def one_to_many(self, source: int, targets: List[int]) -> List[Optional[Tuple[float, float]]]:
+        """
+        Shortest (weight, length) from one source to many targets
+        The nodes above the targets are swept once in falling rank order
+        instead of searching from every target.
+        """
+        selected = set(targets)
+        stack = list(selected)
+        while stack:
+            node = stack.pop()
+            for upper in self.bwd_targets[int(self.bwd_offsets[node]):int(self.bwd_offsets[node + 1])].tolist():
+                if upper not in selected:
+                    selected.add(upper)
+                    stack.append(upper)
+
+        best = self._search(source, forward=True)
+        rank = self.rank
+        for node in sorted(selected, key=lambda node: rank[node], reverse=True):
+            lo, hi = int(self.bwd_offsets[node]), int(self.bwd_offsets[node + 1])
+            current = best.get(node)
+            for upper, edge_weight, edge_length in zip(
+                self.bwd_targets[lo:hi].tolist(), self.bwd_weights[lo:hi].tolist(), self.bwd_lengths[lo:hi].tolist()
+            ):
+                reached = best.get(upper)
+                if reached is not None and (current is None or reached[0] + edge_weight < current[0]):
+                    current = (reached[0] + edge_weight, reached[1] + edge_length)
+            if current is not None:
+                best[node] = current
+        return [best.get(target) for target in targets]
+
+    def many_to_many(self, sources: List[int], targets: List[int]) -> List[List[Optional[Tuple[float, float]]]]:
+        """Shortest (weight, length) from every source to every target"""
+        buckets: Dict[int, List[Tuple[int, float, float]]] = defaultdict(list)
+        for column, target in enumerate(targets):
+            for node, (weight, length) in self._search(target, forward=False).items():
+                buckets[node].append((column, weight, length))
+
+        result: List[List[Optional[Tuple[float, float]]]] = []
+        for source in sources:
+            row: List[Optional[Tuple[float, float]]] = [None] * len(targets)
+            for node, (weight, length) in self._search(source, forward=True).items():
+                for column, bucket_weight, bucket_length in buckets.get(node, ()):
+                    total = weight + bucket_weight
+                    best = row[column]
+                    if best is None or total < best[0]:
+                        row[column] = (total, length + bucket_length)
+            result.append(row)
+        return result
+
+
+def contract(n: int, sources, targets, weights, lengths) -> _Hierarchy:
+    """
+    Contract a directed graph (parallel edges keep the lightest)
+    Node order: edge difference plus contracted neighbours, updated lazily.
+    """
+    # node -> neighbour -> (weight, length, bypassed node or -1)
+    out_adj: List[Dict[int, Tuple[float, float, int]]] = [{} for _ in range(n)]
+    in_adj: List[Dict[int, Tuple[float, float, int]]] = [{} for _ in range(n)]
+    for u, v, w, length in zip(sources, targets, weights, lengths):
+        if u == v:
+            continue
+        if v not in out_adj[u] or w < out_adj[u][v][0]:
+            out_adj[u][v] = (w, length, -1)
+            in_adj[v][u] = (w, length, -1)
+
+    contracted = [False] * n
+    deleted_neighbours = [0] * n
+
+    def witness_distances(u: int, skip: int, limit: float) -> Dict[int, float]:
+        distances = {u: 0.0}
+        heap = [(0.0, u)]
+        settled = 0
+        while heap and settled < WITNESS_SETTLE_LIMIT:
+            d, node = heapq.heappop(heap)
+            if d > distances.get(node, float("inf")) or d > limit:
+                if d > limit:
+                    break
+                continue
+            settled += 1
+            for x, (w, _, _) in out_adj[node].items():
+                if x == skip or contracted[x]:
+                    continue
+                nd = d + w
+                if nd < distances.get(x, float("inf")):
+                    distances[x] = nd
+                    heapq.heappush(heap, (nd, x))
+        return distances
+
+    def shortcuts(v: int) -> List[Tuple[int, int, float, float]]:
+        incoming = [(u, wl) for u, wl in in_adj[v].items() if not contracted[u]]
+        outgoing = [(x, wl) for x, wl in out_adj[v].items() if not contracted[x]]
+        needed = []
+        if not outgoing:
+            return needed
+        max_out = max(w for _, (w, _, _) in outgoing)
+        for u, (w_uv, l_uv, _) in incoming:
+            distances = witness_distances(u, v, w_uv + max_out)
+            for x, (w_vx, l_vx, _) in outgoing:
+                if x == u:
+                    continue
+                if distances.get(x, float("inf")) > w_uv + w_vx:
+                    needed.append((u, x, w_uv + w_vx, l_uv + l_vx))
+        return needed
+
+    def priority(v: int) -> int:
+        degree = sum(1 for u in in_adj[v] if not contracted[u]) + sum(1 for x in out_adj[v] if not contracted[x])
+        return len(shortcuts(v)) - degree + deleted_neighbours[v]
+
+    heap = [(priority(v), v) for v in range(n)]
+    heapq.heapify(heap)
+    rank = np.zeros(n, dtype=np.int64)
+    fwd: List[List[Tuple[int, float, float, int]]] = [[] for _ in range(n)]
+    bwd: List[List[Tuple[int, float, float, int]]] = [[] for _ in range(n)]
+    level = 0
+    while heap:
+        _, v = heapq.heappop(heap)
+        if contracted[v]:
+            continue
+        # Lazy update: re-evaluate, contract only if still the cheapest
+        current = priority(v)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, v))
+            continue
+        for u, x, w, length in shortcuts(v):
+            if x not in out_adj[u] or w < out_adj[u][x][0]:
+                out_adj[u][x] = (w, length, v)
+                in_adj[x][u] = (w, length, v)
+        # The edges still left at v all lead upwards
+        fwd[v] = [(x, *edge) for x, edge in out_adj[v].items() if not contracted[x]]
+        bwd[v] = [(u, *edge) for u, edge in in_adj[v].items() if not contracted[u]]
+        for neighbour, _, _, _ in fwd[v] + bwd[v]:
+            deleted_neighbours[neighbour] += 1
+        contracted[v] = True
+        rank[v] = level
+        level += 1
+
+    arrays = {"rank": rank}
+    for prefix, adjacency in (("fwd", fwd), ("bwd", bwd)):
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(edges) for edges in adjacency])
+        flat = [edge for edges in adjacency for edge in edges]
+        arrays[f"{prefix}_offsets"] = offsets
+        arrays[f"{prefix}_targets"] = np.array([edge[0] for edge in flat], dtype=np.int64)
+        arrays[f"{prefix}_weights"] = np.array([edge[1] for edge in flat], dtype=np.float64)
+        arrays[f"{prefix}_lengths"] = np.array([edge[2] for edge in flat], dtype=np.float64)
+        arrays[f"{prefix}_middles"] = np.array([edge[3] for edge in flat], dtype=np.int64)
+    return _Hierarchy(arrays)
+
+
+def _source_signature(directory: str) -> dict:
+    signature = {}
+    for name in ("nodes.csv", "edges.csv"):
+        stat = os.stat(os.path.join(directory, name))
+        signature[name] = [stat.st_size, int(stat.st_mtime)]
+    return signature
+
+
+def _read_graph(directory: str):
+    """Node coordinates and per-graph edge lists from the CSV extract"""
+    node_ids, lats, lons = [], [], []
+    with open(os.path.join(directory, "nodes.csv"), newline="") as handle:
+        for row in csv.DictReader(handle):
+            node_ids.append(int(row["id"]))
+            lats.append(float(row["lat"]))
+            lons.append(float(row["lon"]))
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    graphs = {"foot": ([], [], [], []), "car": ([], [], [], [])}
+    with open(os.path.join(directory, "edges.csv"), newline="") as handle:
+        for row in csv.DictReader(handle):
+            u, v = index.get(int(row["source"])), index.get(int(row["target"]))
+            if u is None or v is None:
+                continue
+            length = float(row["length_m"])
+            if (row.get("foot") or "1") != "0":
+                for a, b in ((u, v), (v, u)):
+                    graphs["foot"][0].append(a)
+                    graphs["foot"][1].append(b)
+                    graphs["foot"][2].append(length)
+                    graphs["foot"][3].append(length)
+            if (row.get("car") or "1") != "0":
+                speed = float(row.get("maxspeed_kmh") or DEFAULT_MAXSPEED_KMH)
+                seconds = length / (speed / 3.6)
+                directions = ((u, v),) if (row.get("oneway") or "0") == "1" else ((u, v), (v, u))
+                for a, b in directions:
+                    graphs["car"][0].append(a)
+                    graphs["car"][1].append(b)
+                    graphs["car"][2].append(seconds)
+                    graphs["car"][3].append(length)
+    return np.array(lats), np.array(lons), graphs
+
+
+def preprocess(directory: str) -> None:
+    """
+    Contract the foot and car graphs of a CSV extract into <directory>/ch
+    Yol ağını önceden işler (bir kez, çevrimdışı)
+
+    The files are written to a temporary directory that replaces ch/ only
+    once complete, so running workers never see half-written arrays (those
+    that mapped the previous files keep them until they reload).
+    """
+    signature = _source_signature(directory)
+    lats, lons, graphs = _read_graph(directory)
+    staging = tempfile.mkdtemp(prefix=f".{CH_DIRECTORY}-", dir=directory)
+    try:
+        np.save(os.path.join(staging, "node_lats.npy"), lats)
+        np.save(os.path.join(staging, "node_lons.npy"), lons)
+        for graph, (sources, targets, weights, lengths) in graphs.items():
+            hierarchy = contract(len(lats), sources, targets, weights, lengths)
+            hierarchy.save(staging, graph)
+            logger.info(f"Road network: {graph} graph contracted ({len(sources)} edges)")
+        with open(os.path.join(staging, "meta.json"), "w") as handle:
+            json.dump({"format": CH_FORMAT, "source": signature}, handle)
+
+        output = os.path.join(directory, CH_DIRECTORY)
+        previous = None
+        if os.path.exists(output):
+            previous = tempfile.mkdtemp(prefix=f".{CH_DIRECTORY}-old-", dir=directory)
+            os.rename(output, os.path.join(previous, CH_DIRECTORY))
+        os.rename(staging, output)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    if previous is not None:
+        shutil.rmtree(previous, ignore_errors=True)
+
+
+class _SnapGrid:
+    """Nearest graph node lookup on a lat/lon grid"""
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray, nodes: np.ndarray):
+        self.lats, self.lons = lats, lons
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for node, lat, lon in zip(nodes.tolist(), lats[nodes].tolist(), lons[nodes].tolist()):
+            self.cells[(floor(lat / SNAP_CELL_DEGREES), floor(lon / SNAP_CELL_DEGREES))].append(node)
+
+    def nearest(self, lat: float, lon: float) -> Optional[Tuple[int, float]]:
+        """(node, distance_km) of the closest node within SNAP_MAX_KM"""
+        row, column = floor(lat / SNAP_CELL_DEGREES), floor(lon / SNAP_CELL_DEGREES)
+        candidates = [
+            node
+            for d_row in (-1, 0, 1)
+            for d_column in (-1, 0, 1)
+            for node in self.cells.get((row + d_row, column + d_column), ())
+        ]
+        if not candidates:
+            return None
+        distances = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+        best = int(np.argmin(distances))
+        if distances[best] > SNAP_MAX_KM:
+            return None
+        return candidates[best], float(distances[best])
+
+
+class RoadNetwork:
+    """
+    Contracted foot/car road graphs loaded from ROAD_GRAPH_PATH
+    Yol ağı - yürüyüş ve araç grafları
+    """
+
+    def __init__(self):
+        self._hierarchies: Dict[str, _Hierarchy] = {}
+        self._snap: Dict[str, _SnapGrid] = {}
+        self._lats = self._lons = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return bool(self._hierarchies)
+
+    def supports(self, mode: str) -> bool:
+        return MODE_GRAPHS.get(mode) in self._hierarchies
+
+    def load(self, directory: str) -> bool:
+        """
+        Memory-map the preprocessed hierarchies; False (network routing off)
+        when they are missing or stale
+        """
+        output = os.path.join(directory, CH_DIRECTORY)
+        meta_path = os.path.join(output, "meta.json")
+        try:
+            if not os.path.exists(meta_path):
+                logger.warning(
+                    f"Road network not loaded: {output} is missing, run python -m app.services.road_network {directory}"
+                )
+                return False
+            with open(meta_path) as handle:
+                meta = json.load(handle)
+            if meta.get("source") != _source_signature(directory) or meta.get("format") != CH_FORMAT:
+                logger.warning(
+                    f"Road network not loaded: {output} is older than the extract, "
+                    f"run python -m app.services.road_network {directory}"
+                )
+                return False
+            lats = np.load(os.path.join(output, "node_lats.npy"), mmap_mode="r")
+            lons = np.load(os.path.join(output, "node_lons.npy"), mmap_mode="r")
+            hierarchies, snap = {}, {}
+            for graph in ("foot", "car"):
+                hierarchy = _Hierarchy.load(output, graph)
+                has_edges = (np.diff(hierarchy.fwd_offsets) + np.diff(hierarchy.bwd_offsets)) > 0
+                hierarchies[graph] = hierarchy
+                snap[graph] = _SnapGrid(np.asarray(lats), np.asarray(lons), np.flatnonzero(has_edges))
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning(f"Road network not loaded: {exc}")
+            return False
+        self._hierarchies, self._snap = hierarchies, snap
+        self._lats, self._lons = lats, lons
+        logger.info(f"Road network: loaded {len(lats)} nodes from {directory}")
+        return True
+
+    def _search(self, origins, destinations, graph: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        One table search on a graph: network distance (km, snapping included),
+        network weight (minutes, car graph) and snapping distance (km) per pair
+        """
+        shape = (len(origins), len(destinations))
+        distances, weights, access = np.full(shape, np.nan), np.full(shape, np.nan), np.full(shape, np.nan)
+        hierarchy = self._hierarchies.get(graph)
+        if hierarchy is None:
+            return distances, weights, access
+
+        snap = self._snap[graph]
+        from_points = [snap.nearest(lat, lon) for lat, lon in origins]
+        to_points = [snap.nearest(lat, lon) for lat, lon in destinations]
+        sources = list(dict.fromkeys(hit[0] for hit in from_points if hit is not None))
+        targets = list(dict.fromkeys(hit[0] for hit in to_points if hit is not None))
+        if len(sources) == 1:
+            table = [hierarchy.one_to_many(sources[0], targets)]
+        else:
+            table = hierarchy.many_to_many(sources, targets)
+        source_row = {node: i for i, node in enumerate(sources)}
+        target_column = {node: i for i, node in enumerate(targets)}
+
+        for i, origin in enumerate(from_points):
+            if origin is None:
+                continue
+            row = table[source_row[origin[0]]]
+            for j, destination in enumerate(to_points):
+                if destination is None:
+                    continue
+                path = row[target_column[destination[0]]]
+                if path is None:
+                    continue
+                weight, length_m = path
+                access[i, j] = origin[1] + destination[1]
+                distances[i, j] = length_m / 1000.0 + access[i, j]
+                weights[i, j] = weight / 60.0
+        return distances, weights, access
+
+    @staticmethod
+    def _durations(graph: str, distances: np.ndarray, weights: np.ndarray, access: np.ndarray, speed_kmh: float) -> np.ndarray:
+        """Travel minutes for one mode from a graph search"""
+        if graph == "car":
+            return weights + access / speed_kmh * 60.0
+        return distances / speed_kmh * 60.0
+
+    def _table(self, origins, destinations, mode: str, speed_kmh: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Network distance (km) and duration (minutes) from every origin to every destination"""
+        graph = MODE_GRAPHS.get(mode)
+        distances, weights, access = self._search(origins, destinations, graph)
+        return distances, self._durations(graph, distances, weights, access, speed_kmh)
+
+    def matrix(self, lats, lons, mode: str, speed_kmh: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Network distance (km) and duration (minutes) between all points
+        NaN where a point could not be snapped or no path exists
+        """
+        return self.matrices(lats, lons, {mode: speed_kmh})[mode]
+
+    def matrices(self, lats, lons, speeds: Dict[str, float]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        matrix() for several modes, searching each graph once
+        (walking and cycling share the foot graph)
+        """
+        points = list(zip(lats, lons))
+        searches: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        results = {}
+        for mode, speed_kmh in speeds.items():
+            graph = MODE_GRAPHS.get(mode)
+            if graph not in searches:
+                searches[graph] = self._search(points, points, graph)
+            distances, weights, access = searches[graph]
+            durations = self._durations(graph, distances, weights, access, speed_kmh)
+            distances = distances.copy()
+            np.fill_diagonal(distances, 0.0)
+            np.fill_diagonal(durations, 0.0)
+            results[mode] = (distances, durations)
+        return results
+
+    def geometry(self, origin: Tuple[float, float], destination: Tuple[float, float], mode: str) -> Optional[List[Tuple[float, float]]]:
+        """Points along the network path between two points, None when it cannot be routed"""
+        graph = MODE_GRAPHS.get(mode)
+        hierarchy = self._hierarchies.get(graph)
+        if hierarchy is None:
+            return None
+        start, end = self._snap[graph].nearest(*origin), self._snap[graph].nearest(*destination)
+        if start is None or end is None:
+            return None
+        nodes = hierarchy.path(start[0], end[0])
+        if nodes is None:
+            return None
+        return [origin] + [(float(self._lats[node]), float(self._lons[node])) for node in nodes] + [destination]
+
+    def one_to_many(self, lat: float, lon: float, lats, lons, mode: str, speed_kmh: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Network distance (km) and duration (minutes) from one point to many (NaN if unknown)"""
+        distances, durations = self._table([(lat, lon)], list(zip(lats, lons)), mode, speed_kmh)
+        return distances[0], durations[0]
+
+
+# Global road network instance (loaded at startup when ROAD_GRAPH_PATH is set)
+road_network = RoadNetwork()
+
+
+if __name__ == "__main__":
+    # python -m app.services.road_network <directory with nodes.csv and edges.csv>
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    preprocess(sys.argv[1])
@@ -0,0 +1,164 @@
+"""
+POIs along a route corridor
+Rota koridoru boyunca POI'ler - "yürüyüşümün üzerindeki kafeler"
+
+The route path (lat/lon points) is buffered by ``width_km`` and the POIs
+inside are ranked by detour cost: leaving the route at its closest point,
+visiting the POI and coming back, i.e. twice the distance to the route.
+
+Candidates come from the spatial index, not one nearby query per waypoint:
+the path is cut into pieces of ``step`` km of its length and every piece is
+one circle around its midpoint with radius ``step / 2 + width_km``, which
+covers the buffer of that piece. Exact distances are then measured only
+against the segments of the pieces whose circle returned the POI, on a local
+flat projection (accurate to well under a metre at corridor widths).
+"""
+
+from typing import Callable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.services.geo import EARTH_RADIUS_KM
+from app.services.poi_index import CircleHit
+
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180.0
+MAX_CORRIDOR_CIRCLES = 2000
+
+Point = Tuple[float, float]
+Circle = Tuple[float, float, float]
+
+
+class CorridorHit(NamedTuple):
+    poi_id: str
+    category: str
+    rating: Optional[float]
+    distance_km: float  # to the route
+    detour_km: float  # out to the POI and back
+    along_km: float  # from the route start to its closest point
+
+
+class CorridorPieces(NamedTuple):
+    circles: List[Circle]
+    first_segment: np.ndarray  # per circle, segments overlapping its piece
+    last_segment: np.ndarray
+
+
+def _path_arrays(path: Sequence[Point]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Latitudes, longitudes and segment lengths (km) of a path (a single point is a zero-length segment)"""
+    coordinates = np.asarray(path, dtype=np.float64).reshape(-1, 2)
+    if len(coordinates) == 1:
+        coordinates = np.vstack([coordinates, coordinates])
+    lats, lons = coordinates[:, 0], coordinates[:, 1]
+    lat_rad = np.radians(lats)
+    half_dlat = np.diff(lat_rad) / 2.0
+    half_dlon = np.radians(np.diff(lons)) / 2.0
+    a = np.sin(half_dlat) ** 2 + np.cos(lat_rad[:-1]) * np.cos(lat_rad[1:]) * np.sin(half_dlon) ** 2
+    return lats, lons, 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def corridor_pieces(path: Sequence[Point], width_km: float) -> CorridorPieces:
+    """
+    Search circles covering the buffer of the path
+    Rota tamponunu kaplayan arama daireleri
+    """
+    lats, lons, lengths = _path_arrays(path)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    total = float(ends[-1])
+    count = max(1, int(np.ceil(total / max(2.0 * width_km, total / MAX_CORRIDOR_CIRCLES, 1e-9))))
+    step = total / count
+
+    # Midpoint of every piece, interpolated on its segment
+    piece_starts = np.arange(count) * step
+    middles = piece_starts + step / 2.0
+    segments = np.minimum(np.searchsorted(ends, middles), len(lengths) - 1)
+    fractions = np.clip(np.divide(
+        middles - starts[segments], lengths[segments], out=np.zeros(count), where=lengths[segments] > 0
+    ), 0.0, 1.0)
+    center_lats = lats[segments] + fractions * (lats[segments + 1] - lats[segments])
+    center_lons = lons[segments] + fractions * (lons[segments + 1] - lons[segments])
+
+    first = np.minimum(np.searchsorted(ends, piece_starts, side="left"), len(lengths) - 1)
+    last = np.searchsorted(starts, piece_starts + step, side="right") - 1
+    radius = step / 2.0 + width_km
+    circles = [(float(lat), float(lon), radius) for lat, lon in zip(center_lats, center_lons)]
+    return CorridorPieces(circles, first, np.maximum(last, first))
+
+
+def rank_corridor_hits(
+    path: Sequence[Point],
+    width_km: float,
+    pieces: CorridorPieces,
+    candidates: List[CircleHit],
+    exclude: Optional[Set[str]] = None,
+    limit: Optional[int] = None,
+) -> List[CorridorHit]:
+    """
+    POIs within width_km of the path, smallest detour first (then along the route)
+    Koridor içindeki POI'ler - en az sapmadan başlayarak
+    """
+    exclude = exclude or set()
+    candidates = [hit for hit in candidates if hit.poi_id not in exclude]
+    if not candidates:
+        return []
+
+    lats, lons, lengths = _path_arrays(path)
+    starts = np.cumsum(lengths) - lengths
+
+    # Unique POIs and one (POI, segment) pair per segment of every circle that returned it
+    unique = {}
+    for hit in candidates:
+        unique.setdefault(hit.poi_id, (len(unique), hit))
+    pois = [hit for _, hit in unique.values()]
+    poi_of_hit = np.array([unique[hit.poi_id][0] for hit in candidates])
+    circle_of_hit = np.array([hit.circle for hit in candidates])
+    first = pieces.first_segment[circle_of_hit]
+    spans = pieces.last_segment[circle_of_hit] - first + 1
+    pair_poi = np.repeat(poi_of_hit, spans)
+    pair_segment = np.repeat(first, spans) + (np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans))
+
+    poi_lats = np.array([hit.latitude for hit in pois])[pair_poi]
+    poi_lons = np.array([hit.longitude for hit in pois])[pair_poi]
+    a_lat, a_lon = lats[pair_segment], lons[pair_segment]
+    b_lat, b_lon = lats[pair_segment + 1], lons[pair_segment + 1]
+    scale = np.cos(np.radians((a_lat + b_lat) / 2.0)) * KM_PER_DEGREE
+    bx, by = (b_lon - a_lon) * scale, (b_lat - a_lat) * KM_PER_DEGREE
+    px, py = (poi_lons - a_lon) * scale, (poi_lats - a_lat) * KM_PER_DEGREE
+    squared = bx * bx + by * by
+    t = np.clip(np.divide(px * bx + py * by, squared, out=np.zeros_like(squared), where=squared > 0), 0.0, 1.0)
+    distances = np.hypot(px - t * bx, py - t * by)
+    along = starts[pair_segment] + t * lengths[pair_segment]
+
+    # Closest segment per POI
+    order = np.lexsort((distances, pair_poi))
+    first_pair = order[np.r_[True, pair_poi[order][1:] != pair_poi[order][:-1]]]
+    first_pair = first_pair[distances[first_pair] <= width_km]
+    ranked = first_pair[np.lexsort((along[first_pair], distances[first_pair]))]
+    if limit is not None:
+        ranked = ranked[:limit]
+    return [
+        CorridorHit(
+            pois[pair_poi[i]].poi_id,
+            pois[pair_poi[i]].category,
+            pois[pair_poi[i]].rating,
+            float(distances[i]),
+            float(2.0 * distances[i]),
+            float(along[i]),
+        )
+        for i in ranked
+    ]
+
+
+def pois_along_path(
+    path: Sequence[Point],
+    width_km: float,
+    query_circles: Callable[[List[Circle]], List[CircleHit]],
+    exclude: Optional[Set[str]] = None,
+    limit: Optional[int] = None,
+) -> List[CorridorHit]:
+    """
+    POIs along a path with query_circles as the spatial index
+    (e.g. poi_index.query_circles or a database lookup)
+    """
+    pieces = corridor_pieces(path, width_km)
+    return rank_corridor_hits(path, width_km, pieces, query_circles(pieces.circles), exclude, limit)
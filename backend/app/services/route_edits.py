@@ -0,0 +1,165 @@
+"""
+Incremental route edits
+Rotaya tek durak ekleme / çıkarma - tüm rotayı yeniden optimize etmeden
+
+Adding a stop puts it where it lengthens the route least (cheapest
+insertion over the stored order); removing one closes the gap. Then only
+the stops around the change are re-ordered (``REPAIR_RADIUS`` on each side,
+with the neighbours outside the window kept fixed). Only the legs that the
+edit touches and the consecutive legs of the new order are looked up, all
+through the pair cache, so an edit costs O(n) lookups instead of a full
+matrix and optimization.
+"""
+
+from itertools import permutations
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.route import Route
+from app.services.distance_matrix import DEFAULT_TRANSPORT_MODE, TRANSPORT_PROFILES, distance_matrices
+from app.services.route_geometry import build_legs
+from app.services.route_optimizer import Stop, load_stops, route_poi_ids
+
+REPAIR_RADIUS = 2  # stops re-ordered on each side of an edit
+
+
+class RouteEditError(ValueError):
+    """The edit cannot be applied to the route"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _point(stop: Stop) -> Tuple[float, float]:
+    return stop.latitude, stop.longitude
+
+
+async def _cheapest_position(stops: List[Stop], new: Stop, mode: str) -> int:
+    """Index at which inserting new adds the least distance"""
+    if not stops:
+        return 0
+    points = [_point(stop) for stop in stops]
+    n = len(points)
+    # Legs stop[i] -> new, new -> stop[i] and the existing stop[i] -> stop[i + 1]
+    legs = await distance_matrices.legs_async(
+        points + [_point(new)] * n + points[:-1],
+        [_point(new)] * n + points + points[1:],
+        mode,
+    )
+    to_new, from_new, existing = legs.distances_km[:n], legs.distances_km[n:2 * n], legs.distances_km[2 * n:]
+    added = np.empty(n + 1)
+    added[0] = from_new[0]  # in front of the first stop
+    added[n] = to_new[n - 1]  # after the last stop
+    added[1:n] = to_new[:-1] + from_new[1:] - existing
+    return int(np.argmin(added))
+
+
+async def _repair(stops: List[Stop], center: int, mode: str) -> List[Stop]:
+    """
+    Best order of the stops within REPAIR_RADIUS of center
+    The stops just outside the window (if any) stay where they are.
+    """
+    lo, hi = max(center - REPAIR_RADIUS, 0), min(center + REPAIR_RADIUS + 1, len(stops))
+    if hi - lo < 2:
+        return stops
+    before = stops[lo - 1] if lo > 0 else None
+    after = stops[hi] if hi < len(stops) else None
+    window = stops[lo:hi]
+    points = [_point(stop) for stop in window]
+    anchors = [_point(stop) for stop in (before, after) if stop is not None]
+    matrix = (await distance_matrices.matrix_async(
+        [point[0] for point in points + anchors], [point[1] for point in points + anchors], mode
+    )).distances_km
+    k = len(window)
+    before_index = k if before is not None else None
+    after_index = k + (before is not None) if after is not None else None
+
+    def length(order: Tuple[int, ...]) -> float:
+        total = matrix[order[:-1], order[1:]].sum() if len(order) > 1 else 0.0
+        if before_index is not None:
+            total += matrix[before_index, order[0]]
+        if after_index is not None:
+            total += matrix[order[-1], after_index]
+        return float(total)
+
+    best = min(permutations(range(k)), key=lambda order: length(np.array(order)))
+    return stops[:lo] + [window[i] for i in best] + stops[hi:]
+
+
+async def _apply_totals(route: Route, stops: List[Stop], mode: str) -> None:
+    """Write the order, legs and totals from the consecutive legs of stops"""
+    distance, duration, route.legs = 0.0, 0.0, []
+    if len(stops) > 1:
+        legs = await distance_matrices.legs_async(
+            [_point(stop) for stop in stops[:-1]], [_point(stop) for stop in stops[1:]], mode
+        )
+        distance, duration = float(legs.distances_km.sum()), float(legs.durations_minutes.sum())
+        route.legs = build_legs(stops, legs.distances_km, legs.durations_minutes, mode)
+
+    previous = {entry["poi_id"]: entry for entry in route.pois or [] if isinstance(entry, dict) and entry.get("poi_id")}
+    route.pois = [
+        {**previous.get(stop.poi_id, {}), "poi_id": stop.poi_id, "order": position}
+        for position, stop in enumerate(stops, start=1)
+    ]
+    route.total_distance_km = round(distance, 2)
+    route.estimated_duration_minutes = int(round(duration)) + sum(stop.visit_minutes for stop in stops)
+
+
+def _route_stops(db: Session, route: Route) -> List[Stop]:
+    poi_ids = route_poi_ids(route.pois)
+    stops = load_stops(db.connection(), poi_ids)
+    if len(stops) != len(set(poi_ids)):
+        raise RouteEditError("Route contains unknown POIs")
+    return stops
+
+
+def _mode(route: Route) -> str:
+    return route.transport_mode if route.transport_mode in TRANSPORT_PROFILES else DEFAULT_TRANSPORT_MODE
+
+
+async def insert_stop(db: Session, route: Route, poi_id: str, position: Optional[int] = None) -> None:
+    """
+    Add a POI to a route
+    Rotaya durak ekler
+
+    position (1-based) puts the stop there; otherwise optimized routes take
+    the cheapest position and are repaired around it, others append it.
+    """
+    stops = _route_stops(db, route)
+    if any(stop.poi_id == poi_id for stop in stops):
+        raise RouteEditError("POI is already on the route", status_code=409)
+    new = load_stops(db.connection(), [poi_id])
+    if not new:
+        raise RouteEditError(f"POI not found: {poi_id}", status_code=404)
+
+    mode = _mode(route)
+    optimize = route.optimize_route != 0
+    if position is not None:
+        index = min(max(position, 1), len(stops) + 1) - 1
+    elif optimize:
+        index = await _cheapest_position(stops, new[0], mode)
+    else:
+        index = len(stops)
+    stops.insert(index, new[0])
+    if optimize and position is None:
+        stops = await _repair(stops, index, mode)
+    await _apply_totals(route, stops, mode)
+
+
+async def remove_stop(db: Session, route: Route, poi_id: str) -> None:
+    """
+    Remove a POI from a route
+    Rotadan durak çıkarır
+    """
+    stops = _route_stops(db, route)
+    index = next((i for i, stop in enumerate(stops) if stop.poi_id == poi_id), None)
+    if index is None:
+        raise RouteEditError("POI is not on the route", status_code=404)
+    del stops[index]
+    mode = _mode(route)
+    if route.optimize_route != 0 and stops:
+        stops = await _repair(stops, min(index, len(stops) - 1), mode)
+    await _apply_totals(route, stops, mode)
@@ -0,0 +1,92 @@
+"""
+Route leg geometry
+Rota bacakları - her iki durak arası mesafe, süre ve kodlanmış çizgi
+
+``Route.legs`` keeps one entry per pair of consecutive stops:
+``{"from", "to", "distance_km", "duration_minutes", "polyline"}``. The
+polyline is the road network path when a network is loaded for the route's
+mode, otherwise the straight line, in Google encoded-polyline format
+(integer coordinates, delta-encoded), which is an order of magnitude smaller
+than coordinate arrays. Legs are rebuilt whenever the order is (on save and
+on single-stop edits).
+
+Responses return the stored polylines as they are, or simplified for a map
+zoom level (Douglas-Peucker), or as delta-encoded integer arrays.
+"""
+
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import inspect, text
+
+from app.services.road_network import road_network
+from app.utils.polyline import decode_polyline, delta_encode, encode_polyline, simplify, zoom_tolerance
+
+logger = logging.getLogger(__name__)
+
+
+def build_legs(stops: Sequence, distances_km: Sequence[float], durations_minutes: Sequence[float], mode: str) -> List[dict]:
+    """
+    Legs between consecutive stops (objects with poi_id, latitude, longitude)
+    distances_km / durations_minutes hold one value per leg.
+    """
+    legs = []
+    for (origin, destination), distance, duration in zip(zip(stops[:-1], stops[1:]), distances_km, durations_minutes):
+        start, end = (origin.latitude, origin.longitude), (destination.latitude, destination.longitude)
+        points = road_network.geometry(start, end, mode) or [start, end]
+        legs.append({
+            "from": origin.poi_id,
+            "to": destination.poi_id,
+            "distance_km": round(float(distance), 3),
+            "duration_minutes": round(float(duration), 1),
+            "polyline": encode_polyline(points),
+        })
+    return legs
+
+
+def legs_response(legs: Optional[List[dict]], geometry: str = "polyline", zoom: Optional[int] = None) -> Optional[List[dict]]:
+    """
+    Legs for an API response
+    geometry: "polyline" (encoded), "delta" (flat integer deltas, 1e-5 degrees) or "none";
+    zoom simplifies the line to what is visible at that map zoom level.
+    """
+    if legs is None:
+        return None
+    result = []
+    for leg in legs:
+        item = {key: value for key, value in leg.items() if key != "polyline"}
+        if geometry != "none":
+            encoded = leg.get("polyline", "")
+            points = None
+            if zoom is not None:
+                points = simplify(decode_polyline(encoded), zoom_tolerance(zoom))
+                encoded = encode_polyline(points)
+            if geometry == "delta":
+                item["points"] = delta_encode(points if points is not None else decode_polyline(encoded))
+            else:
+                item["polyline"] = encoded
+        result.append(item)
+    return result
+
+
+def path_from_legs(legs: List[dict]) -> List[Tuple[float, float]]:
+    """The whole route as one list of points, from the stored leg polylines"""
+    path: List[Tuple[float, float]] = []
+    for leg in legs:
+        points = decode_polyline(leg.get("polyline", ""))
+        path.extend(points[1:] if path and points and points[0] == path[-1] else points)
+    return path
+
+
+def add_legs_column(engine) -> None:
+    """
+    Add the legs column to an existing routes table
+    Mevcut routes tablosuna legs kolonunu ekler (eski rotalar bir sonraki kayıtta doldurulur)
+    """
+    if "routes" not in inspect(engine).get_table_names():
+        return
+    columns = {column["name"] for column in inspect(engine).get_columns("routes")}
+    if "legs" not in columns:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE routes ADD COLUMN legs JSON"))
+        logger.info("routes.legs column added")
@@ -0,0 +1,332 @@
+"""
+Route optimization jobs on a process pool
+Rota optimizasyon işleri - ayrı süreçlerde, iş numarası ile takip
+
+Route optimization and itinerary generation are CPU-bound; running them in
+request handlers stalls the event loop for everyone. Jobs are submitted
+here, get a job id right away and are polled for their result. Distance
+matrices are still read on the event loop (through the shared caches); only
+the search itself runs in a ``ProcessPoolExecutor`` of ``ROUTE_JOB_WORKERS``
+processes (per application worker, so keep it small).
+
+At most ``ROUTE_JOB_MAX_RUNNING`` jobs run at once; the rest stay queued.
+A running job only holds a database session to read its input and to write
+its result, never while waiting for the pool, so the limit keeps jobs from
+exhausting the connection pool and blocking the event loop on checkout.
+
+Identical requests share one job: the request is hashed and the first job
+registered for the hash (in Redis, so across workers) is returned while it
+runs and, for cacheable kinds, while its result is kept. Job records live
+in process memory and, with their results, in Redis for
+``ROUTE_JOB_RESULT_TTL_SECONDS``.
+
+Kinds:
+
+- ``optimize``: order POIs (the body of POST /routes/optimize)
+- ``generate``: itinerary generation (the body of POST /routes/generate)
+- ``route``: re-optimize a saved route and store its order and totals
+  (not cached, since it is submitted after something changed)
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import get_settings
+from app.db.session import SessionLocal
+from app.models.route import Route
+from app.models.user_preferences import UserPreference
+from app.services.itinerary_generator import generate_itinerary
+from app.services.route_optimizer import apply_plan, load_stops, plan_route_async, plan_route_stops, route_poi_ids
+from app.utils.redis import redis_client
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+MAX_LOCAL_JOBS = 10000
+RUNNING_JOB_TTL_SECONDS = 600  # a job still "running" after this was lost with its worker
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobError(Exception):
+    """A job failed in a way that is reported to the client"""
+
+
+class Job:
+    """A submitted job and, once finished, its result"""
+
+    __slots__ = ("id", "kind", "request_key", "status", "result", "error", "created_at", "finished_at")
+
+    def __init__(self, job_id: str, kind: str, request_key: str):
+        self.id = job_id
+        self.kind = kind
+        self.request_key = request_key
+        self.status = QUEUED
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Job":
+        job = cls(data["job_id"], data["kind"], "")
+        job.status = data["status"]
+        job.result = data.get("result")
+        job.error = data.get("error")
+        job.created_at = datetime.fromisoformat(data["created_at"])
+        job.finished_at = datetime.fromisoformat(data["finished_at"]) if data.get("finished_at") else None
+        return job
+
+
+async def _run_optimize(payload: dict, executor) -> dict:
+    db = SessionLocal()
+    try:
+        stops = load_stops(db.connection(), payload["poi_ids"])
+    finally:
+        db.close()
+    missing = set(payload["poi_ids"]) - {stop.poi_id for stop in stops}
+    if missing:
+        raise JobError(f"POI not found: {sorted(missing)[0]}")
+    plan = await plan_route_async(
+        stops,
+        payload.get("transport_mode"),
+        optimize=True,
+        fixed_start=payload.get("fixed_start", False),
+        executor=executor,
+    )
+    return plan.to_dict()
+
+
+async def _run_generate(payload: dict, executor) -> dict:
+    preferences = None
+    if payload.get("user_id"):
+        db = SessionLocal()
+        try:
+            preferences = db.query(UserPreference).filter(UserPreference.user_id == payload["user_id"]).first()
+        finally:
+            db.close()
+    itinerary = await generate_itinerary(
+        payload["city_key"],
+        (payload["start_latitude"], payload["start_longitude"]),
+        payload["time_budget_minutes"],
+        preferences=preferences,
+        transport_mode=payload["transport_mode"],
+        max_stops=payload["max_stops"],
+        executor=executor,
+    )
+    return itinerary.to_dict()
+
+
+async def _run_route(payload: dict, executor) -> dict:
+    # No session is held while the search runs: load, plan, then reopen to write
+    db = SessionLocal()
+    try:
+        route = db.query(Route).filter(Route.id == payload["route_id"]).first()
+        if route is None:
+            raise JobError("Route not found")
+        poi_ids, transport_mode = route_poi_ids(route.pois), route.transport_mode
+        stops = load_stops(db.connection(), poi_ids)
+        optimize_route = route.optimize_route
+    finally:
+        db.close()
+
+    planned = await plan_route_stops(poi_ids, stops, transport_mode, optimize_route, executor)
+
+    db = SessionLocal()
+    try:
+        route = db.query(Route).filter(Route.id == payload["route_id"]).first()
+        if route is None:
+            raise JobError("Route not found")
+        if route_poi_ids(route.pois) != poi_ids or route.transport_mode != transport_mode:
+            raise JobError("Route changed while it was being planned")
+        apply_plan(route, planned.plan, reorder=planned.reorder, legs=planned.legs)
+        db.commit()
+        return {
+            "route_id": route.id,
+            "poi_ids": [stop.poi_id for stop in planned.plan.stops],
+            "total_distance_km": route.total_distance_km,
+            "estimated_duration_minutes": route.estimated_duration_minutes,
+        }
+    finally:
+        db.close()
+
+
+# kind -> (runner, cache finished results for identical requests)
+JOB_KINDS: Dict[str, Tuple[Callable[[dict, ProcessPoolExecutor], Awaitable[dict]], bool]] = {
+    "optimize": (_run_optimize, True),
+    "generate": (_run_generate, True),
+    "route": (_run_route, False),
+}
+
+
+def request_key(kind: str, payload: dict) -> str:
+    """Hash identifying identical requests"""
+    canonical = json.dumps([kind, payload], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+class RouteJobQueue:
+    """
+    Job ids, status and results for route optimization on a process pool
+    Rota optimizasyon iş kuyruğu
+    """
+
+    def __init__(self, workers: int, max_running: int, result_ttl_seconds: int):
+        self.workers = max(workers, 1)
+        self.max_running = max(max_running, 1)
+        self.result_ttl_seconds = result_ttl_seconds
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._by_request: Dict[str, str] = {}
+        self._tasks = set()
+
+    def start(self) -> None:
+        """Start the worker processes (called from the application lifespan)"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """The worker pool, started on first use"""
+        self.start()
+        return self._executor
+
+    def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _remember(self, job: Job) -> None:
+        self._jobs[job.id] = job
+        self._jobs.move_to_end(job.id)
+        while len(self._jobs) > MAX_LOCAL_JOBS:
+            _, old = self._jobs.popitem(last=False)
+            if self._by_request.get(old.request_key) == old.id:
+                del self._by_request[old.request_key]
+
+    def _reusable_result(self, job: Job) -> bool:
+        return (
+            job.status == DONE
+            and JOB_KINDS[job.kind][1]
+            and (datetime.utcnow() - job.finished_at).total_seconds() < self.result_ttl_seconds
+        )
+
+    async def _save(self, job: Job) -> None:
+        if redis_client.redis is None:
+            return
+        ttl = RUNNING_JOB_TTL_SECONDS if job.status in (QUEUED, RUNNING) else self.result_ttl_seconds
+        try:
+            await redis_client.job_set(job.id, json.dumps(job.to_dict()), ttl)
+            if job.status == DONE and JOB_KINDS[job.kind][1]:
+                await redis_client.job_refresh_claim(job.request_key, job.id, ttl)
+            elif job.status == FAILED or (job.status == DONE and not JOB_KINDS[job.kind][1]):
+                await redis_client.job_release(job.request_key)
+        except Exception as exc:
+            logger.warning(f"Job {job.id} not stored in Redis: {exc}")
+
+    async def _shared_job(self, key: str, job_id: str) -> Optional[Job]:
+        """Job already registered for the request (by any worker), if still usable"""
+        if redis_client.redis is None:
+            return None
+        try:
+            existing_id = await redis_client.job_claim(key, job_id, RUNNING_JOB_TTL_SECONDS)
+            if existing_id is None:
+                return None
+            job = await self.get(existing_id)
+            if job is not None and job.status != FAILED:
+                return job
+            await redis_client.job_refresh_claim(key, job_id, RUNNING_JOB_TTL_SECONDS)
+        except Exception as exc:
+            logger.warning(f"Job deduplication unavailable: {exc}")
+        return None
+
+    async def submit(self, kind: str, payload: dict) -> Job:
+        """Queue a job, or return the identical one that is running or finished"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        key = request_key(kind, payload)
+        local = self._jobs.get(self._by_request.get(key, ""))
+        if local is not None and (local.status in (QUEUED, RUNNING) or self._reusable_result(local)):
+            return local
+
+        job = Job(str(uuid.uuid4()), kind, key)
+        shared = await self._shared_job(key, job.id)
+        if shared is not None:
+            return shared
+
+        self._remember(job)
+        self._by_request[key] = job.id
+        await self._save(job)
+        task = asyncio.create_task(self._run(job, payload))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def submit_many(self, kind: str, payloads: List[dict]) -> List[Job]:
+        """Queue many jobs of one kind (they run ROUTE_JOB_MAX_RUNNING at a time)"""
+        return [await self.submit(kind, payload) for payload in payloads]
+
+    async def _run(self, job: Job, payload: dict) -> None:
+        runner, _ = JOB_KINDS[job.kind]
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_running)
+        async with self._slots:
+            job.status = RUNNING
+            await self._save(job)
+            try:
+                job.result = await runner(payload, self.executor)
+                job.status = DONE
+            except JobError as exc:
+                job.status, job.error = FAILED, str(exc)
+            except Exception:
+                logger.exception(f"Job {job.id} ({job.kind}) failed")
+                job.status, job.error = FAILED, "Job failed"
+        job.finished_at = datetime.utcnow()
+        if job.status == FAILED and self._by_request.get(job.request_key) == job.id:
+            del self._by_request[job.request_key]
+        await self._save(job)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        """Job by id from this worker, else from Redis"""
+        job = self._jobs.get(job_id)
+        if job is not None or redis_client.redis is None:
+            return job
+        try:
+            record = await redis_client.job_get(job_id)
+        except Exception as exc:
+            logger.warning(f"Job lookup unavailable: {exc}")
+            return None
+        return Job.from_dict(json.loads(record)) if record else None
+
+    def stats(self) -> dict:
+        statuses: Dict[str, int] = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {"workers": self.workers, "max_running": self.max_running, "jobs": statuses}
+
+
+# Global route job queue instance
+route_jobs = RouteJobQueue(
+    settings.ROUTE_JOB_WORKERS, settings.ROUTE_JOB_MAX_RUNNING, settings.ROUTE_JOB_RESULT_TTL_SECONDS
+)
@@ -0,0 +1,389 @@
+"""
+Route optimization
+Rota optimizasyonu - durakların ziyaret sırası, toplam mesafe ve süre
+
+The visiting order is an open path over the route's stops. Up to
+``EXACT_MAX_STOPS`` stops it is solved exactly (Held-Karp dynamic
+programming); larger routes are built with nearest neighbour (from every
+possible first stop) and improved with 2-opt and Or-opt moves over the
+street distance matrix of the route's transport mode
+(app.services.distance_matrix) until no move helps or the time budget runs
+out. The open path is handled as a tour through a dummy node whose edges
+cost nothing, so the local search only has to deal with cycles. Move gains
+include the cost change of reversed segments, as street matrices are not
+symmetric (one-way streets).
+
+Saving a route plans it with ``plan_saved_route`` before the commit: routes
+with ``optimize_route=1`` are reordered, and every route gets
+``total_distance_km``, ``estimated_duration_minutes`` and ``legs``
+(app.services.route_geometry). The search runs on the route job process
+pool and the leg geometry in a thread, so the event loop is not blocked.
+Single-stop edits (app.services.route_edits) set all of them themselves.
+"""
+
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models.poi import POI
+from app.models.route import Route
+from app.services.distance_matrix import (
+    DEFAULT_TRANSPORT_MODE,
+    TRANSPORT_PROFILES,
+    DistanceMatrix,
+    distance_matrices,
+)
+from app.services.route_geometry import build_legs
+
+settings = get_settings()
+
+
+DEFAULT_VISIT_MINUTES = 45
+OR_OPT_MAX_SEGMENT = 3
+EXACT_MAX_STOPS = 8  # 2^n * n^2 steps
+
+
+class Stop(NamedTuple):
+    poi_id: str
+    latitude: float
+    longitude: float
+    visit_minutes: int
+
+
+class RoutePlan(NamedTuple):
+    stops: List[Stop]  # in visiting order
+    transport_mode: str
+    travel: Dict[str, dict]  # transport mode -> {distance_km, duration_minutes}
+    visit_minutes: int
+    legs: List[Tuple[float, float]]  # (distance_km, duration_minutes) between consecutive stops
+
+    def to_dict(self) -> dict:
+        travel = self.travel[self.transport_mode]
+        return {
+            "poi_ids": [stop.poi_id for stop in self.stops],
+            "transport_mode": self.transport_mode,
+            "total_distance_km": travel["distance_km"],
+            "estimated_duration_minutes": travel["duration_minutes"] + self.visit_minutes,
+            "visit_minutes": self.visit_minutes,
+            "travel": self.travel,
+        }
+
+
+def path_length(matrix: np.ndarray, order: Sequence[int]) -> float:
+    """Length of the open path visiting order"""
+    order = np.asarray(order, dtype=np.intp)
+    if order.shape[0] < 2:
+        return 0.0
+    return float(matrix[order[:-1], order[1:]].sum())
+
+
+def travel_totals(matrices: Dict[str, DistanceMatrix], order: Sequence[int]) -> Dict[str, dict]:
+    """Street distance and travel time of the path, per transport mode"""
+    return {
+        mode: {
+            "distance_km": round(path_length(matrix.distances_km, order), 2),
+            "duration_minutes": int(round(path_length(matrix.durations_minutes, order))),
+        }
+        for mode, matrix in matrices.items()
+    }
+
+
+def _nearest_neighbour(matrix: np.ndarray, first: int) -> List[int]:
+    n = matrix.shape[0]
+    visited = np.zeros(n, dtype=bool)
+    order = [first]
+    visited[first] = True
+    current = first
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, matrix[current])
+        current = int(np.argmin(row))
+        visited[current] = True
+        order.append(current)
+    return order
+
+
+def _exact_order(matrix: np.ndarray, fixed_start: bool) -> List[int]:
+    """Shortest open path by dynamic programming over subsets (small n only)"""
+    n = matrix.shape[0]
+    full = 1 << n
+    # best[mask, last]: shortest path visiting mask and ending at last
+    best = np.full((full, n), np.inf)
+    parent = np.full((full, n), -1, dtype=np.intp)
+    for first in ([0] if fixed_start else range(n)):
+        best[1 << first, first] = 0.0
+    nodes = np.arange(n)
+    for mask in range(1, full):
+        if not np.isfinite(best[mask]).any():
+            continue
+        totals = best[mask][:, None] + matrix  # last -> next
+        lasts = np.argmin(totals, axis=0)
+        lengths = totals[lasts, nodes]
+        for node in range(n):
+            extended = mask | (1 << node)
+            if extended != mask and lengths[node] < best[extended, node]:
+                best[extended, node] = lengths[node]
+                parent[extended, node] = lasts[node]
+
+    order, mask, last = [], full - 1, int(np.argmin(best[full - 1]))
+    while last >= 0:
+        order.append(last)
+        mask, last = mask ^ (1 << last), int(parent[mask, last])
+    return order[::-1]
+
+
+def _two_opt(cost: np.ndarray, tour: np.ndarray, deadline: float) -> bool:
+    """Apply the best improving segment reversal for each position; True if any"""
+    m = tour.shape[0]
+    improved = False
+    for i in range(1, m - 1):
+        if time.perf_counter() > deadline:
+            break
+        j = np.arange(i + 1, m)
+        a, b = tour[i - 1], tour[i]
+        c, d = tour[j], tour[(j + 1) % m]
+        # Edges inside tour[i..j] are walked backwards after the reversal
+        inner = tour[i:]
+        reversal = np.cumsum(cost[inner[1:], inner[:-1]] - cost[inner[:-1], inner[1:]])
+        delta = cost[a, c] + cost[b, d] - cost[a, b] - cost[c, d] + reversal
+        best = int(np.argmin(delta))
+        if delta[best] < -1e-9:
+            k = int(j[best])
+            tour[i:k + 1] = tour[i:k + 1][::-1].copy()
+            improved = True
+    return improved
+
+
+def _or_opt(cost: np.ndarray, tour: np.ndarray, deadline: float) -> Optional[np.ndarray]:
+    """First improving move of a 1..3 stop segment (optionally reversed), or None"""
+    m = tour.shape[0]
+    for length in range(1, min(OR_OPT_MAX_SEGMENT, m - 2) + 1):
+        for i in range(1, m - length + 1):
+            if time.perf_counter() > deadline:
+                return None
+            segment = tour[i:i + length]
+            rest = np.concatenate((tour[:i], tour[i + length:]))
+            prev, nxt = tour[i - 1], tour[(i + length) % m]
+            removal_gain = cost[prev, segment[0]] + cost[segment[-1], nxt] - cost[prev, nxt]
+            p, q = rest, np.roll(rest, -1)
+            base = cost[p, q]
+            forward = cost[p, segment[0]] + cost[segment[-1], q] - base
+            reversal = cost[segment[1:], segment[:-1]].sum() - cost[segment[:-1], segment[1:]].sum()
+            backward = cost[p, segment[-1]] + cost[segment[0], q] - base + reversal
+            for insertion, reverse in ((forward, False), (backward, True)):
+                best = int(np.argmin(insertion))
+                if insertion[best] < removal_gain - 1e-9:
+                    moved = segment[::-1] if reverse else segment
+                    return np.concatenate((rest[:best + 1], moved, rest[best + 1:]))
+    return None
+
+
+def solve_order(
+    matrix: np.ndarray,
+    time_budget_ms: Optional[float] = None,
+    fixed_start: bool = False,
+) -> List[int]:
+    """
+    Visiting order (indices into matrix) minimizing the open path length
+    Toplam yolu en kısa yapan ziyaret sırası
+
+    fixed_start keeps index 0 as the first stop. Exact up to
+    EXACT_MAX_STOPS stops; above, runs until no 2-opt/Or-opt move improves
+    the path or time_budget_ms is used up.
+    """
+    n = matrix.shape[0]
+    if n <= 2 and (fixed_start or n < 2):
+        return list(range(n))
+    if n <= EXACT_MAX_STOPS:
+        return _exact_order(matrix, fixed_start)
+    budget = settings.ROUTE_OPTIMIZE_TIME_BUDGET_MS if time_budget_ms is None else time_budget_ms
+    deadline = time.perf_counter() + budget / 1000.0
+
+    # Nearest neighbour from every first stop, keep the shortest
+    firsts = [0] if fixed_start else range(n)
+    best_order, best_length = None, np.inf
+    for first in firsts:
+        order = _nearest_neighbour(matrix, first)
+        length = path_length(matrix, order)
+        if length < best_length:
+            best_order, best_length = order, length
+        if time.perf_counter() > deadline:
+            break
+
+    # Dummy node n closes the open path into a tour
+    cost = np.zeros((n + 1, n + 1), dtype=np.float64)
+    cost[:n, :n] = matrix
+    if fixed_start:
+        # Entering the path anywhere but stop 0 costs more than any path
+        cost[n, 1:n] = matrix.sum() + 1.0
+    tour = np.array([n] + best_order, dtype=np.intp)
+
+    while time.perf_counter() < deadline:
+        improved = _two_opt(cost, tour, deadline)
+        moved = _or_opt(cost, tour, deadline)
+        if moved is not None:
+            tour, improved = moved, True
+        if not improved:
+            break
+
+    start = int(np.flatnonzero(tour == n)[0])
+    tour = np.roll(tour, -start)
+    return [int(index) for index in tour[1:]]
+
+
+def _plan(
+    stops: List[Stop],
+    matrices: Dict[str, DistanceMatrix],
+    transport_mode: str,
+    optimize: bool,
+    fixed_start: bool,
+    time_budget_ms: Optional[float],
+) -> RoutePlan:
+    matrix = matrices[transport_mode]
+    order = solve_order(matrix.distances_km, time_budget_ms, fixed_start) if optimize else list(range(len(stops)))
+    return RoutePlan(
+        [stops[i] for i in order],
+        transport_mode,
+        travel_totals(matrices, order),
+        sum(stop.visit_minutes for stop in stops),
+        [(float(matrix.distances_km[a, b]), float(matrix.durations_minutes[a, b])) for a, b in zip(order[:-1], order[1:])],
+    )
+
+
+def _mode(transport_mode: Optional[str]) -> str:
+    return transport_mode if transport_mode in TRANSPORT_PROFILES else DEFAULT_TRANSPORT_MODE
+
+
+def plan_route(
+    stops: List[Stop],
+    transport_mode: Optional[str] = DEFAULT_TRANSPORT_MODE,
+    optimize: bool = True,
+    fixed_start: bool = False,
+    time_budget_ms: Optional[float] = None,
+) -> RoutePlan:
+    """
+    Order stops (when optimize is set) and estimate distance and duration
+    Durakları sıralar, mesafe ve süreyi hesaplar
+
+    Uses the in-process distance cache only; async callers should use
+    plan_route_async, which also reads the shared Redis cache.
+    """
+    lats, lons = [stop.latitude for stop in stops], [stop.longitude for stop in stops]
+    matrices = {mode: distance_matrices.matrix(lats, lons, mode) for mode in TRANSPORT_PROFILES}
+    return _plan(stops, matrices, _mode(transport_mode), optimize, fixed_start, time_budget_ms)
+
+
+async def plan_route_async(
+    stops: List[Stop],
+    transport_mode: Optional[str] = DEFAULT_TRANSPORT_MODE,
+    optimize: bool = True,
+    fixed_start: bool = False,
+    time_budget_ms: Optional[float] = None,
+    executor: Optional[Executor] = None,
+) -> RoutePlan:
+    """
+    plan_route with matrices from the LRU and Redis distance caches
+    With an executor the search runs there (e.g. the route job process pool).
+    """
+    lats, lons = [stop.latitude for stop in stops], [stop.longitude for stop in stops]
+    matrices = await distance_matrices.matrices_async(lats, lons, list(TRANSPORT_PROFILES))
+    if executor is None:
+        return _plan(stops, matrices, _mode(transport_mode), optimize, fixed_start, time_budget_ms)
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, _plan, stops, matrices, _mode(transport_mode), optimize, fixed_start, time_budget_ms
+    )
+
+
+def route_poi_ids(pois) -> List[str]:
+    """POI ids of a Route.pois value ([{"poi_id", "order"}, ...] or plain ids) in stored order"""
+    entries = []
+    for position, entry in enumerate(pois or []):
+        if isinstance(entry, dict):
+            entries.append((entry.get("order", position), position, entry.get("poi_id")))
+        else:
+            entries.append((position, position, entry))
+    entries.sort(key=lambda item: (item[0] is None, item[0] or 0, item[1]))
+    return [poi_id for _, _, poi_id in entries if poi_id]
+
+
+def load_stops(connection, poi_ids: List[str]) -> List[Stop]:
+    """Stops for the given POI ids in the same order; unknown ids are skipped"""
+    if not poi_ids:
+        return []
+    table = POI.__table__
+    rows = connection.execute(
+        select(table.c.id, table.c.latitude, table.c.longitude, table.c.average_visit_duration_minutes)
+        .where(table.c.id.in_(set(poi_ids)))
+    ).all()
+    by_id = {row.id: row for row in rows}
+    stops = []
+    for poi_id in dict.fromkeys(poi_ids):
+        row = by_id.get(poi_id)
+        if row is not None:
+            stops.append(Stop(row.id, row.latitude, row.longitude, row.average_visit_duration_minutes or DEFAULT_VISIT_MINUTES))
+    return stops
+
+
+def plan_legs(plan: RoutePlan) -> List[dict]:
+    """Legs (with road geometry) between the consecutive stops of a plan"""
+    return build_legs(
+        plan.stops, [leg[0] for leg in plan.legs], [leg[1] for leg in plan.legs], plan.transport_mode
+    )
+
+
+def apply_plan(route: Route, plan: RoutePlan, reorder: bool, legs: List[dict]) -> None:
+    """Write the plan's order, totals and legs onto a Route"""
+    if reorder:
+        previous = {}
+        for entry in route.pois or []:
+            if isinstance(entry, dict) and entry.get("poi_id"):
+                previous[entry["poi_id"]] = entry
+        route.pois = [
+            {**previous.get(stop.poi_id, {}), "poi_id": stop.poi_id, "order": position}
+            for position, stop in enumerate(plan.stops, start=1)
+        ]
+    travel = plan.travel[plan.transport_mode]
+    route.total_distance_km = travel["distance_km"]
+    route.estimated_duration_minutes = travel["duration_minutes"] + plan.visit_minutes
+    route.legs = legs
+
+
+class StopsPlan(NamedTuple):
+    plan: RoutePlan
+    reorder: bool  # whether the plan's order replaces the stored one
+    legs: List[dict]
+
+
+async def plan_route_stops(
+    poi_ids: List[str],
+    stops: List[Stop],
+    transport_mode: Optional[str],
+    optimize_route: Optional[int],
+    executor: Optional[Executor] = None,
+) -> StopsPlan:
+    """
+    Plan a saved route's loaded stops without holding a database session
+    Kayıtlı rotanın duraklarını veritabanı oturumu tutmadan planlar
+    """
+    # optimize_route defaults to 1 (the column default is only applied by the INSERT)
+    optimize = optimize_route != 0 and len(stops) == len(set(poi_ids))
+    plan = await plan_route_async(stops, transport_mode, optimize=optimize, executor=executor)
+    legs = await asyncio.to_thread(plan_legs, plan)
+    return StopsPlan(plan, optimize, legs)
+
+
+async def plan_saved_route(db: Session, route: Route, executor: Optional[Executor] = None) -> RoutePlan:
+    """
+    Plan a route's stops and write the order (optimize_route=1), totals and legs onto it
+    Kaydedilecek rotayı planlar - sıralama, toplamlar ve bacaklar
+    """
+    poi_ids = route_poi_ids(route.pois)
+    stops = load_stops(db.connection(), poi_ids)
+    planned = await plan_route_stops(poi_ids, stops, route.transport_mode, route.optimize_route, executor)
+    apply_plan(route, planned.plan, reorder=planned.reorder, legs=planned.legs)
+    return planned.plan
@@ -0,0 +1,249 @@
+"""
+Cached payloads for publicly shared routes
+Paylaşılan rotalar - önceden hazırlanmış, önbellekli yanıtlar
+
+A shared route (``is_public=1`` with a ``share_url`` token) is served as one
+pre-serialized JSON document: the route, its POIs in visiting order and the
+leg geometry. The document is built once and cached with a strong ETag (hash
+of the bytes):
+
+- in Redis, shared by every worker, until something changes;
+- in a small in-process LRU for ``LOCAL_TTL_SECONDS``, so a link that goes
+  viral is answered without a Redis round trip. Other workers may serve the
+  previous version for at most that long after a change.
+
+The in-process entry also keeps the brotli / gzip variants of the body,
+compressed once (at the highest level) on first request for each coding.
+
+Redis also keeps, per POI, the tokens of the cached routes that show it.
+Committed changes to a shared route (session hooks below) or to one of its
+POIs (poi_events listener) drop the cached documents and move the
+generation counter of the route or POI on. A document is only written to
+Redis if the generations are still those read before the route and its POIs
+were loaded, so a reader that built it from the previous version cannot put
+it back for a day.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import Iterable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models.poi import POI
+from app.models.route import Route
+from app.services import poi_events
+from app.services.poi_events import POIChange
+from app.services.route_optimizer import load_stops, plan_legs, plan_route_async, route_poi_ids
+from app.utils.redis import redis_client
+from app.utils.response_encoding import compress
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+LOCAL_TTL_SECONDS = 5
+LOCAL_MAX_ENTRIES = 1000
+REDIS_TTL_SECONDS = 24 * 3600
+CACHE_CONTROL = "public, max-age=30, must-revalidate"
+
+_SESSION_KEY = "shared_route_tokens"
+
+
+class SharedPayload(NamedTuple):
+    etag: str  # quoted strong ETag
+    body: bytes
+    variants: dict  # content coding -> compressed body
+
+    def encoded(self, encoding: str) -> bytes:
+        """The body compressed with a content coding, compressed only once"""
+        body = self.variants.get(encoding)
+        if body is None:
+            body = self.variants[encoding] = compress(self.body, encoding, static=True)
+        return body
+
+
+def new_share_token() -> str:
+    return secrets.token_urlsafe(12)
+
+
+def share_link(token: str) -> str:
+    return f"{settings.FRONTEND_URL}/shared/{token}"
+
+
+def _payload(text: str) -> SharedPayload:
+    body = text.encode("utf-8")
+    return SharedPayload(f'"{hashlib.sha256(body).hexdigest()[:32]}"', body, {})
+
+
+class _LocalCache:
+    """Small LRU of token -> (expires_at, payload)"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, token: str) -> Optional[SharedPayload]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return entry[1]
+
+    def put(self, token: str, payload: SharedPayload) -> None:
+        self._entries[token] = (time.monotonic() + self.ttl_seconds, payload)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, tokens: Iterable[str]) -> None:
+        for token in tokens:
+            self._entries.pop(token, None)
+
+
+_local = _LocalCache(LOCAL_MAX_ENTRIES, LOCAL_TTL_SECONDS)
+
+
+async def _build(db: Session, route: Route, poi_ids: List[str]) -> str:
+    """JSON text of a shared route"""
+    pois_by_id = {poi.id: poi for poi in db.query(POI).filter(POI.id.in_(poi_ids)).all()} if poi_ids else {}
+    stops = [pois_by_id[poi_id] for poi_id in poi_ids if poi_id in pois_by_id]
+
+    legs = route.legs
+    if legs is None:
+        # Saved before legs were stored
+        plan = await plan_route_async(load_stops(db.connection(), poi_ids), route.transport_mode, optimize=False)
+        legs = await asyncio.to_thread(plan_legs, plan)
+
+    document = {
+        "share_token": route.share_url,
+        "name": route.name,
+        "description": route.description,
+        "transport_mode": route.transport_mode,
+        "total_distance_km": route.total_distance_km,
+        "estimated_duration_minutes": route.estimated_duration_minutes,
+        "stops": [{"order": order, **poi.to_dict()} for order, poi in enumerate(stops, start=1)],
+        "legs": legs,
+        "created_at": route.created_at.isoformat() if route.created_at else None,
+        "updated_at": route.updated_at.isoformat() if route.updated_at else None,
+    }
+    return json.dumps(document, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+async def get_shared_payload(db: Session, token: str) -> Optional[SharedPayload]:
+    """
+    Serialized payload of a public route by share token, None if not shared
+    Paylaşılan rotanın hazır JSON yanıtı
+    """
+    payload = _local.get(token)
+    if payload is not None:
+        return payload
+
+    cached = generation = None
+    if redis_client.redis is not None:
+        try:
+            cached, generation = await redis_client.shared_route_get(token)
+        except Exception as exc:
+            logger.warning(f"Shared route cache unavailable: {exc}")
+        if cached is not None:
+            payload = _payload(cached)
+            _local.put(token, payload)
+            return payload
+
+    route = db.query(Route).filter(Route.share_url == token, Route.is_public == 1).first()
+    if route is None:
+        return None
+    poi_ids = route_poi_ids(route.pois)
+    distinct_ids = list(dict.fromkeys(poi_ids))
+    # Like the route's generation above, the POIs' are read before their rows
+    poi_generations = None
+    if generation is not None:
+        try:
+            poi_generations = await redis_client.shared_route_poi_generations(distinct_ids)
+        except Exception as exc:
+            logger.warning(f"Shared route cache unavailable: {exc}")
+    text = await _build(db, route, poi_ids)
+    payload = _payload(text)
+    _local.put(token, payload)
+    if poi_generations is not None:
+        try:
+            await redis_client.shared_route_set(
+                token, text, generation, distinct_ids, poi_generations, REDIS_TTL_SECONDS
+            )
+        except Exception as exc:
+            logger.warning(f"Shared route not cached: {exc}")
+    return payload
+
+
+async def invalidate(tokens: Iterable[str]) -> None:
+    """Drop the cached payloads of shared routes"""
+    tokens = [token for token in set(tokens) if token]
+    if not tokens:
+        return
+    _local.discard(tokens)
+    if redis_client.redis is not None:
+        try:
+            await redis_client.shared_route_delete(tokens, REDIS_TTL_SECONDS)
+        except Exception:
+            logger.exception("Shared route cache invalidation failed")
+
+
+async def on_poi_changes(changes: List[POIChange]) -> None:
+    """POI change listener dropping the shared routes that show a changed POI"""
+    if redis_client.redis is None:
+        return
+    try:
+        tokens = await redis_client.shared_route_tokens_for_pois(
+            [change.poi_id for change in changes], REDIS_TTL_SECONDS
+        )
+    except Exception:
+        logger.exception("Shared route lookup by POI failed")
+        return
+    await invalidate(tokens)
+
+
+# Route changes: collect share tokens during the flush, invalidate after commit
+
+def _route_tokens(route: Route) -> Set[str]:
+    tokens = {route.share_url} if route.share_url else set()
+    history = sa_inspect(route).attrs.share_url.history
+    tokens.update(token for token in history.deleted or () if token)
+    return tokens
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_routes(session, flush_context, instances):
+    tokens: Set[str] = session.info.setdefault(_SESSION_KEY, set())
+    for obj in session.dirty:
+        if isinstance(obj, Route) and session.is_modified(obj):
+            tokens.update(_route_tokens(obj))
+    for obj in session.deleted:
+        if isinstance(obj, Route):
+            tokens.update(_route_tokens(obj))
+    if not tokens:
+        session.info.pop(_SESSION_KEY, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_routes(session):
+    tokens = session.info.pop(_SESSION_KEY, None)
+    if not tokens:
+        return
+    _local.discard(tokens)
+    if not poi_events.schedule(invalidate(tokens)) and redis_client.redis is not None:
+        logger.warning(f"Shared routes changed outside the event loop, Redis copies expire on their own: {sorted(tokens)}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_routes(session):
+    session.info.pop(_SESSION_KEY, None)
@@ -0,0 +1,78 @@
+"""
+Conditional GET helpers (ETag / Last-Modified)
+Koşullu GET - değişmeyen yanıtlar için 304 Not Modified
+
+Validators are computed from cheap version information (timestamps, counts,
+request parameters), never from the body, so a 304 is answered before the
+body is loaded or serialized. Equal inputs always produce the same body, so
+the ETags are strong.
+
+Last-Modified is only sent for bodies that change exactly when their
+timestamp moves forward; bodies that also depend on counts or per-user
+data (favorites, preferences) are validated by ETag alone, otherwise an
+If-Modified-Since request could get a wrong 304.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Strong (quoted) ETag of the parts that determine a response"""
+    digest = hashlib.sha256("\x1f".join("" if part is None else str(part) for part in parts).encode("utf-8"))
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers the ETag"""
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip() for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def http_date(value: datetime) -> str:
+    """HTTP-date of a naive UTC (or aware) datetime"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime], cache_control: str = "private, no-cache") -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    Whether the client's copy is current
+    If-None-Match wins; If-Modified-Since is only used without it.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        since = _parse_http_date(if_modified_since)
+        if since is not None:
+            modified = last_modified if last_modified.tzinfo else last_modified.replace(tzinfo=timezone.utc)
+            return modified.replace(microsecond=0) <= since
+    return False
+
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
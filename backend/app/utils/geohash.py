@@ -0,0 +1,90 @@
+"""
+Geohash cells
+Geohash hücreleri - koordinatları sabit ızgara hücrelerine yuvarlar
+
+A geohash names a latitude/longitude rectangle; every extra character splits
+it into 32 and a cell's hash is the prefix of every hash inside it. Cell size
+at precision 5 is about 4.9 x 4.9 km, at 7 about 153 x 153 m (narrower in
+longitude away from the equator).
+"""
+
+from math import cos, radians
+from typing import List, Tuple
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+KM_PER_DEGREE = 111.0
+
+
+def encode(lat: float, lon: float, precision: int) -> str:
+    """Geohash of the cell containing (lat, lon)"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, value, bits, even = [], 0, 0, True
+    while len(chars) < precision:
+        target, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (target[0] + target[1]) / 2.0
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            target[0] = middle
+        else:
+            target[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            value, bits = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(latitude, longitude) extent of a cell in degrees"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lon, max_lon) of a cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            target = lon_range if even else lat_range
+            middle = (target[0] + target[1]) / 2.0
+            if value >> shift & 1:
+                target[0] = middle
+            else:
+                target[1] = middle
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def center(geohash: str) -> Tuple[float, float]:
+    """Center (lat, lon) of a cell"""
+    min_lat, max_lat, min_lon, max_lon = bounds(geohash)
+    return (min_lat + max_lat) / 2.0, (min_lon + max_lon) / 2.0
+
+
+def covering(lat: float, lon: float, radius_km: float, precision: int) -> List[str]:
+    """Cells overlapping the bounding box of a circle"""
+    lat_step, lon_step = cell_size(precision)
+    lat_range = radius_km / KM_PER_DEGREE
+    lon_range = radius_km / (KM_PER_DEGREE * max(cos(radians(lat)), 0.01))
+    min_lat, max_lat = max(lat - lat_range, -90.0), min(lat + lat_range, 90.0 - 1e-9)
+    min_lon, max_lon = lon - lon_range, lon + lon_range
+
+    cells = []
+    row = min_lat
+    while True:
+        column = min_lon
+        while True:
+            wrapped = (column + 180.0) % 360.0 - 180.0
+            cells.append(encode(row, wrapped, precision))
+            if column >= max_lon:
+                break
+            column = min(column + lon_step, max_lon)
+        if row >= max_lat:
+            break
+        row = min(row + lat_step, max_lat)
+    return sorted(set(cells))
@@ -0,0 +1,102 @@
+"""
+Compact line geometry: encoded polylines, delta-encoded coordinates, simplification
+Çizgi geometrisi - kodlanmış polyline, fark kodlaması ve sadeleştirme
+
+Coordinates are (latitude, longitude) pairs. Both encodings store integer
+coordinates (``precision`` decimal digits, 5 = about 1 m) as differences
+from the previous point; the polyline format is Google's, which map SDKs
+decode natively.
+"""
+
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+Point = Tuple[float, float]
+
+DEFAULT_PRECISION = 5
+TILE_SIZE = 256
+
+
+def _integer_deltas(points: Sequence[Point], precision: int) -> np.ndarray:
+    if not len(points):
+        return np.zeros((0, 2), dtype=np.int64)
+    scaled = np.rint(np.asarray(points, dtype=np.float64) * 10 ** precision).astype(np.int64)
+    return np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+
+
+def encode_polyline(points: Sequence[Point], precision: int = DEFAULT_PRECISION) -> str:
+    """Google encoded polyline of the points"""
+    chunks = []
+    for value in _integer_deltas(points, precision).ravel().tolist():
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+
+def decode_polyline(encoded: str, precision: int = DEFAULT_PRECISION) -> List[Point]:
+    """Points of a Google encoded polyline"""
+    values = []
+    value, shift = 0, 0
+    for char in encoded:
+        byte = ord(char) - 63
+        value |= (byte & 0x1F) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value, shift = 0, 0
+    coordinates = np.cumsum(np.array(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return [(float(lat), float(lon)) for lat, lon in coordinates]
+
+
+def delta_encode(points: Sequence[Point], precision: int = DEFAULT_PRECISION) -> List[int]:
+    """Flat [lat0, lon0, dlat1, dlon1, ...] integer list of the points"""
+    return _integer_deltas(points, precision).ravel().tolist()
+
+
+def delta_decode(values: Sequence[int], precision: int = DEFAULT_PRECISION) -> List[Point]:
+    """Points of a delta_encode list"""
+    coordinates = np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return [(float(lat), float(lon)) for lat, lon in coordinates]
+
+
+def zoom_tolerance(zoom: int) -> float:
+    """Degrees covered by one map pixel at the zoom level (at the equator)"""
+    return 360.0 / (TILE_SIZE * 2 ** zoom)
+
+
+def simplify(points: Sequence[Point], tolerance: float) -> List[Point]:
+    """
+    Douglas-Peucker simplification; tolerance in degrees
+    Longitudes are scaled by cos(latitude), so the tolerance is the same
+    distance in every direction.
+    """
+    if len(points) < 3 or tolerance <= 0:
+        return list(points)
+    coordinates = np.asarray(points, dtype=np.float64)
+    xy = np.column_stack((coordinates[:, 1] * np.cos(np.radians(coordinates[:, 0].mean())), coordinates[:, 0]))
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = xy[first], xy[last]
+        segment = end - start
+        inner = xy[first + 1:last] - start
+        length = np.hypot(segment[0], segment[1])
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return [points[i] for i in np.flatnonzero(keep)]
@@ -1,5 +1,6 @@
 import redis.asyncio as redis
 from app.config import get_settings
+from typing import Dict, Iterable, List, Optional, Tuple
 import secrets
 import string
 
@@ -38,6 +39,339 @@ class RedisClient:
         key = f"verification:{email}"
         await self.redis.delete(key)
 
+    
+    # POI GEO index (one GEO set for all POIs plus one per category)
+    
+    GEO_ALL_KEY = "pois:geo:all"
+    GEO_CATEGORY_KEY = "pois:geo:category"  # hash: poi_id -> category
+    GEO_WATERMARK_KEY = "pois:geo:watermark"  # newest POI.updated_at applied (ISO format)
+    
+    @staticmethod
+    def geo_category_key(category: str) -> str:
+        return f"pois:geo:cat:{category}"
+    
+    async def geo_index_exists(self) -> bool:
+        """Check whether the POI GEO index has been populated"""
+        return bool(await self.redis.exists(self.GEO_ALL_KEY))
+    
+    async def geo_replace_pois(self, pois: Iterable[Tuple[str, float, float, str]], batch_size: int = 5000):
+        """Rebuild the POI GEO index from (poi_id, latitude, longitude, category) tuples"""
+        suffix = ":building"
+        keys = set()
+        pipe = self.redis.pipeline(transaction=False)
+        pending = 0
+        for poi_id, latitude, longitude, category in pois:
+            for key in (self.GEO_ALL_KEY, self.geo_category_key(category)):
+                pipe.geoadd(key + suffix, (longitude, latitude, poi_id))
+                keys.add(key)
+            pipe.hset(self.GEO_CATEGORY_KEY + suffix, poi_id, category)
+            pending += 1
+            if pending >= batch_size:
+                await pipe.execute()
+                pending = 0
+        await pipe.execute()
+        
+        # Swap the new sets in atomically and drop categories that disappeared
+        old_keys = {key async for key in self.redis.scan_iter(match="pois:geo:cat:*") if not key.endswith(suffix)}
+        pipe = self.redis.pipeline(transaction=True)
+        for key in old_keys - keys:
+            pipe.delete(key)
+        for key in keys:
+            pipe.rename(key + suffix, key)
+        if keys:
+            pipe.rename(self.GEO_CATEGORY_KEY + suffix, self.GEO_CATEGORY_KEY)
+        else:
+            pipe.delete(self.GEO_ALL_KEY, self.GEO_CATEGORY_KEY)
+        await pipe.execute()
+    
+    async def geo_poi_ids(self) -> set:
+        """Ids of the POIs in the GEO index"""
+        return set(await self.redis.hkeys(self.GEO_CATEGORY_KEY))
+    
+    async def geo_get_watermark(self) -> Optional[str]:
+        return await self.redis.get(self.GEO_WATERMARK_KEY)
+    
+    async def geo_set_watermark(self, watermark: str):
+        await self.redis.set(self.GEO_WATERMARK_KEY, watermark)
+    
+    async def geo_upsert_poi(self, poi_id: str, latitude: float, longitude: float, category: str):
+        """Add or move a POI in the GEO index"""
+        previous_category = await self.redis.hget(self.GEO_CATEGORY_KEY, poi_id)
+        pipe = self.redis.pipeline(transaction=True)
+        if previous_category and previous_category != category:
+            pipe.zrem(self.geo_category_key(previous_category), poi_id)
+        pipe.geoadd(self.GEO_ALL_KEY, (longitude, latitude, poi_id))
+        pipe.geoadd(self.geo_category_key(category), (longitude, latitude, poi_id))
+        pipe.hset(self.GEO_CATEGORY_KEY, poi_id, category)
+        await pipe.execute()
+    
+    async def geo_remove_poi(self, poi_id: str):
+        """Remove a POI from the GEO index"""
+        category = await self.redis.hget(self.GEO_CATEGORY_KEY, poi_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zrem(self.GEO_ALL_KEY, poi_id)
+        if category:
+            pipe.zrem(self.geo_category_key(category), poi_id)
+        pipe.hdel(self.GEO_CATEGORY_KEY, poi_id)
+        await pipe.execute()
+    
+    async def geo_search_pois(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        category: Optional[str] = None,
+        count: Optional[int] = None,
+    ) -> List[Tuple[str, str, float]]:
+        """Return (poi_id, category, distance_km) within radius_km, nearest first"""
+        key = self.geo_category_key(category) if category else self.GEO_ALL_KEY
+        results = await self.redis.geosearch(
+            key,
+            longitude=longitude,
+            latitude=latitude,
+            radius=radius_km,
+            unit="km",
+            sort="ASC",
+            count=count,
+            withdist=True,
+        )
+        if not results:
+            return []
+        poi_ids = [poi_id for poi_id, _ in results]
+        if category:
+            categories = [category] * len(poi_ids)
+        else:
+            categories = await self.redis.hmget(self.GEO_CATEGORY_KEY, poi_ids)
+        return [
+            (poi_id, poi_category, float(distance))
+            for (poi_id, distance), poi_category in zip(results, categories)
+        ]
+
+
+    # Distance matrix cache (one string per directed pair of points)
+    
+    @staticmethod
+    def distance_key(pair_key: str) -> str:
+        return f"distance:{pair_key}"
+    
+    async def distance_get_many(self, pair_keys: List[str], batch_size: int = 1000) -> List[Optional[str]]:
+        """Cached values for pair keys, None where missing"""
+        values: List[Optional[str]] = []
+        for start in range(0, len(pair_keys), batch_size):
+            batch = pair_keys[start:start + batch_size]
+            values.extend(await self.redis.mget([self.distance_key(key) for key in batch]))
+        return values
+    
+    async def distance_set_many(self, values: Dict[str, str], expire_seconds: int):
+        """Store pair key -> value strings with a TTL"""
+        pipe = self.redis.pipeline(transaction=False)
+        for pair_key, value in values.items():
+            pipe.setex(self.distance_key(pair_key), expire_seconds, value)
+        await pipe.execute()
+
+
+    # Route jobs (record per job id, request key -> job id for deduplication)
+    
+    @staticmethod
+    def job_key(job_id: str) -> str:
+        return f"jobs:{job_id}"
+    
+    @staticmethod
+    def job_request_key(request_key: str) -> str:
+        return f"jobs:request:{request_key}"
+    
+    async def job_set(self, job_id: str, record: str, expire_seconds: int):
+        """Store a job record (JSON) with a TTL"""
+        await self.redis.setex(self.job_key(job_id), expire_seconds, record)
+    
+    async def job_get(self, job_id: str) -> Optional[str]:
+        """Job record (JSON), None when unknown or expired"""
+        return await self.redis.get(self.job_key(job_id))
+    
+    async def job_claim(self, request_key: str, job_id: str, expire_seconds: int) -> Optional[str]:
+        """Register job_id for a request; returns the job id already registered, if any"""
+        key = self.job_request_key(request_key)
+        if await self.redis.set(key, job_id, ex=expire_seconds, nx=True):
+            return None
+        return await self.redis.get(key)
+    
+    async def job_refresh_claim(self, request_key: str, job_id: str, expire_seconds: int):
+        """Keep the request -> job id entry for expire_seconds (e.g. as long as the result)"""
+        await self.redis.setex(self.job_request_key(request_key), expire_seconds, job_id)
+    
+    async def job_release(self, request_key: str):
+        """Forget the job registered for a request"""
+        await self.redis.delete(self.job_request_key(request_key))
+
+    # Shared route payloads (pre-serialized JSON) and the routes showing each POI
+    
+    @staticmethod
+    def shared_route_key(token: str) -> str:
+        return f"shared_routes:{token}"
+    
+    @staticmethod
+    def shared_route_poi_key(poi_id: str) -> str:
+        return f"shared_routes:poi:{poi_id}"
+    
+    @staticmethod
+    def shared_route_generation_key(token: str) -> str:
+        return f"shared_routes:generation:{token}"
+    
+    @staticmethod
+    def shared_route_poi_generation_key(poi_id: str) -> str:
+        return f"shared_routes:poi_generation:{poi_id}"
+    
+    # KEYS: payload, route generation, then (POI generation, POI index) per POI
+    # ARGV: route generation and body, ttl, token, then the POI generations
+    _SHARED_ROUTE_SET_SCRIPT = """
+    if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+        return 0
+    end
+    for i = 3, #KEYS, 2 do
+        if (redis.call('GET', KEYS[i]) or '0') ~= ARGV[5 + (i - 3) / 2] then
+            return 0
+        end
+    end
+    redis.call('SETEX', KEYS[1], ARGV[3], ARGV[2])
+    for i = 4, #KEYS, 2 do
+        redis.call('SADD', KEYS[i], ARGV[4])
+        redis.call('EXPIRE', KEYS[i], ARGV[3])
+    end
+    return 1
+    """
+    
+    async def shared_route_get(self, token: str) -> Tuple[Optional[str], str]:
+        """Cached payload of a shared route and the route's current generation"""
+        body, generation = await self.redis.mget(self.shared_route_key(token), self.shared_route_generation_key(token))
+        return body, generation or "0"
+    
+    async def shared_route_poi_generations(self, poi_ids: List[str]) -> List[str]:
+        """Current generation of each POI (moved on by shared_route_tokens_for_pois)"""
+        if not poi_ids:
+            return []
+        generations = await self.redis.mget([self.shared_route_poi_generation_key(poi_id) for poi_id in poi_ids])
+        return [generation or "0" for generation in generations]
+    
+    async def shared_route_set(
+        self,
+        token: str,
+        body: str,
+        generation: str,
+        poi_ids: List[str],
+        poi_generations: List[str],
+        expire_seconds: int,
+    ) -> bool:
+        """
+        Cache a shared route payload and index it under its POIs, unless the
+        route or one of the POIs changed since their generations were read
+        """
+        keys = [self.shared_route_key(token), self.shared_route_generation_key(token)]
+        for poi_id in poi_ids:
+            keys.extend((self.shared_route_poi_generation_key(poi_id), self.shared_route_poi_key(poi_id)))
+        stored = await self.redis.eval(
+            self._SHARED_ROUTE_SET_SCRIPT, len(keys), *keys, generation, body, expire_seconds, token, *poi_generations
+        )
+        return bool(stored)
+    
+    async def shared_route_delete(self, tokens: Iterable[str], expire_seconds: int):
+        """Drop cached shared route payloads and move their generations on"""
+        tokens = list(tokens)
+        if not tokens:
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(*[self.shared_route_key(token) for token in tokens])
+            for token in tokens:
+                pipe.incr(self.shared_route_generation_key(token))
+                pipe.expire(self.shared_route_generation_key(token), expire_seconds)
+            await pipe.execute()
+    
+    async def shared_route_tokens_for_pois(self, poi_ids: Iterable[str], expire_seconds: int) -> List[str]:
+        """
+        Tokens of cached shared routes showing any of the POIs (the index
+        entries are consumed) after moving the POIs' generations on
+        """
+        poi_ids = list(poi_ids)
+        if not poi_ids:
+            return []
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for poi_id in poi_ids:
+                pipe.incr(self.shared_route_poi_generation_key(poi_id))
+                pipe.expire(self.shared_route_poi_generation_key(poi_id), expire_seconds)
+            keys = [self.shared_route_poi_key(poi_id) for poi_id in poi_ids]
+            pipe.sunion(*keys)
+            pipe.delete(*keys)
+            results = await pipe.execute()
+        return list(results[-2])
+
+    
+    # POI listing responses, tagged by the cells / cities they depend on
+    
+    @staticmethod
+    def response_cache_key(key: str) -> str:
+        return f"poi_responses:{key}"
+    
+    @staticmethod
+    def response_cache_tag_key(tag: str) -> str:
+        return f"poi_responses:tag:{tag}"
+    
+    async def response_cache_get(self, key: str) -> Optional[str]:
+        """Cached response body (JSON)"""
+        return await self.redis.get(self.response_cache_key(key))
+    
+    async def response_cache_set(self, key: str, body: str, tags: Iterable[str], expire_seconds: int):
+        """Cache a response body and list it under its tags"""
+        cache_key = self.response_cache_key(key)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.setex(cache_key, expire_seconds, body)
+            for tag in tags:
+                tag_key = self.response_cache_tag_key(tag)
+                pipe.sadd(tag_key, cache_key)
+                pipe.expire(tag_key, expire_seconds)
+            await pipe.execute()
+    
+    async def response_cache_invalidate(self, tags: Iterable[str]) -> int:
+        """Drop the cached responses listed under any of the tags; returns how many"""
+        tag_keys = [self.response_cache_tag_key(tag) for tag in tags]
+        if not tag_keys:
+            return 0
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.sunion(*tag_keys)
+            pipe.delete(*tag_keys)
+            cache_keys, _ = await pipe.execute()
+        if cache_keys:
+            await self.redis.delete(*cache_keys)
+        return len(cache_keys)
+    
+    # POI entity payloads (POI.to_dict JSON) and their invalidation channel
+    
+    POI_ENTITY_CHANNEL = "poi_entities:invalidate"
+    
+    @staticmethod
+    def poi_entity_key(poi_id: str) -> str:
+        return f"poi_entities:{poi_id}"
+    
+    async def poi_entity_get_many(self, poi_ids: List[str]) -> List[Optional[str]]:
+        """Cached POI payloads, None where missing"""
+        if not poi_ids:
+            return []
+        return await self.redis.mget([self.poi_entity_key(poi_id) for poi_id in poi_ids])
+    
+    async def poi_entity_set_many(self, payloads: Dict[str, str], expire_seconds: int):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for poi_id, payload in payloads.items():
+                pipe.setex(self.poi_entity_key(poi_id), expire_seconds, payload)
+            await pipe.execute()
+    
+    async def poi_entity_invalidate(self, poi_ids: List[str]):
+        """Delete cached POI payloads and tell every worker to evict them"""
+        if not poi_ids:
+            return
+        await self.redis.delete(*[self.poi_entity_key(poi_id) for poi_id in poi_ids])
+        await self.redis.publish(self.POI_ENTITY_CHANNEL, ",".join(poi_ids))
+    
+    def poi_entity_subscription(self):
+        """Pub/sub connection for POI invalidations (subscribe with .subscribe(POI_ENTITY_CHANNEL))"""
+        return self.redis.pubsub(ignore_subscribe_messages=True)
 
 # Global Redis client instance
 redis_client = RedisClient()
@@ -0,0 +1,239 @@
+"""
+Response encodings: compression and MessagePack
+Yanıt kodlamaları - sıkıştırma (br/gzip) ve MessagePack
+
+Two ASGI middlewares sit in front of every endpoint:
+
+- ``MessagePackMiddleware`` re-encodes JSON bodies as MessagePack for
+  clients whose ``Accept`` asks for ``application/msgpack`` (at least as
+  strongly as for JSON). Endpoints keep producing JSON.
+- ``CompressionMiddleware`` compresses bodies of ``minimum_size`` bytes and
+  more with brotli or gzip, whichever ``Accept-Encoding`` prefers (brotli on
+  a tie). Responses that already carry ``Content-Encoding`` (precompressed
+  cached bodies, see ``compress``) pass through.
+
+Only shared routes are stored precompressed: their cached document is the
+exact response body. POI listings and details cached in Redis
+(``poi_response_cache``, ``poi_cache``) are finished per request (distances
+re-measured from the caller, ``is_favorite``, field projection), so there
+are no fixed bytes to compress ahead of time; they are compressed here.
+
+The ETag of a re-encoded response is made weak, as the bytes differ from
+the representation it was computed for. It is weakened whenever the request
+negotiated a coding (or MessagePack), on 304 responses and small bodies left
+uncompressed too, so a client always sees the same ETag form for the same
+request headers; ``etag_matches`` accepts either form.
+"""
+
+import zlib
+from typing import Dict, Optional
+
+import brotli
+import msgpack
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+ENCODINGS = ("br", "gzip")  # in order of preference
+COMPRESSIBLE_TYPES = ("application/json", MSGPACK_MEDIA_TYPE, "text/", "application/javascript", "image/svg+xml")
+
+# (gzip level, brotli quality): per response vs. once for a cached body
+DYNAMIC_LEVELS = (6, 4)
+STATIC_LEVELS = (9, 11)
+
+
+def parse_qualities(header: Optional[str]) -> Dict[str, float]:
+    """Value -> q of an Accept / Accept-Encoding header"""
+    qualities = {}
+    for part in (header or "").split(","):
+        value, *params = [item.strip() for item in part.split(";")]
+        if not value:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        qualities[value.lower()] = q
+    return qualities
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Content coding to use for a request, None for identity"""
+    qualities = parse_qualities(accept_encoding)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = qualities.get(encoding, qualities.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def prefers_msgpack(accept: Optional[str]) -> bool:
+    """Whether the client asked for MessagePack at least as strongly as for JSON"""
+    qualities = parse_qualities(accept)
+    msgpack_q = max(qualities.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    if msgpack_q <= 0:
+        return False
+    json_q = qualities.get("application/json", qualities.get("application/*", qualities.get("*/*", 0.0)))
+    return msgpack_q >= json_q
+
+
+def weak_etag(etag: str) -> str:
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+
+def compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    """Compressed body; static=True spends more time for a body that is served many times"""
+    gzip_level, brotli_quality = STATIC_LEVELS if static else DYNAMIC_LEVELS
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    if encoding == "gzip":
+        compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress(body) + compressor.flush()
+    raise ValueError(f"Unknown content coding: {encoding}")
+
+
+def _compressible(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.lower().startswith(COMPRESSIBLE_TYPES)
+
+
+class _StreamCompressor:
+    """Incremental br/gzip compressor; every chunk is flushed so streams stay live"""
+
+    def __init__(self, encoding: str):
+        gzip_level, brotli_quality = DYNAMIC_LEVELS
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._gzip = None
+        else:
+            self._brotli = None
+            self._gzip = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes, last: bool) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data) + (self._brotli.finish() if last else self._brotli.flush())
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    br/gzip compression of responses of ``minimum_size`` bytes and more
+    Belirli boyutun üzerindeki yanıtları sıkıştırır
+    """
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding")) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is not None:
+                await send({"type": "http.response.body", "body": compressor.chunk(body, not more_body), "more_body": more_body})
+                return
+
+            # First body message: decide for the whole response
+            headers = MutableHeaders(raw=start["headers"])
+            if "etag" in headers and "content-encoding" not in headers:
+                headers["ETag"] = weak_etag(headers["etag"])
+            if "content-encoding" in headers or start["status"] in (204, 304) or not _compressible(headers.get("content-type")):
+                passthrough = True
+            else:
+                headers.add_vary_header("Accept-Encoding")
+                passthrough = not more_body and len(body) < self.minimum_size
+            if passthrough:
+                await send(start)
+                await send(message)
+                return
+
+            headers["Content-Encoding"] = encoding
+            if not more_body:
+                body = compress(body, encoding)
+                headers["Content-Length"] = str(len(body))
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+            del headers["Content-Length"]
+            compressor = _StreamCompressor(encoding)
+            await send(start)
+            await send({"type": "http.response.body", "body": compressor.chunk(body, False), "more_body": True})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class MessagePackMiddleware:
+    """
+    JSON responses re-encoded as MessagePack when the client asks for it
+    İstemci isterse JSON yanıtları MessagePack olarak döner
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        wants_msgpack = prefers_msgpack(Headers(scope=scope).get("accept"))
+        start = None
+        chunks = []
+        transcode = False
+
+        async def send_negotiated(message):
+            nonlocal start, transcode
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                is_json = (headers.get("content-type") or "").startswith("application/json")
+                if is_json:
+                    # The body depends on Accept, also for shared caches
+                    headers.add_vary_header("Accept")
+                transcode = wants_msgpack and is_json and "content-encoding" not in headers and message["status"] not in (204, 304)
+                if wants_msgpack and message["status"] == 304 and "etag" in headers:
+                    # Same form as on the transcoded 200
+                    headers["ETag"] = weak_etag(headers["etag"])
+                if transcode:
+                    start = message
+                else:
+                    await send(message)
+                return
+            if not transcode or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = msgpack.packb(orjson.loads(b"".join(chunks)), use_bin_type=True)
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Type"] = MSGPACK_MEDIA_TYPE
+            headers["Content-Length"] = str(len(body))
+            if "etag" in headers:
+                headers["ETag"] = weak_etag(headers["etag"])
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_negotiated)
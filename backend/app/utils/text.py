@@ -0,0 +1,24 @@
+import re
+import unicodedata
+from typing import List
+
+_WORD_RE = re.compile(r"\w+")
+# Letters that do not decompose into base letter + combining mark
+_EXTRA_FOLDS = str.maketrans({"ı": "i", "ø": "o", "đ": "d", "ł": "l", "æ": "ae", "œ": "oe"})
+
+
+def normalize_text(value: str) -> str:
+    """
+    Case-fold and strip diacritics so "İstanbul", "ISTANBUL" and "istanbul" compare equal
+    Büyük/küçük harf ve aksanları kaldırır (Çarşı -> carsi)
+    """
+    if not value:
+        return ""
+    folded = unicodedata.normalize("NFKD", value.casefold())
+    stripped = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return " ".join(stripped.translate(_EXTRA_FOLDS).split())
+
+
+def tokenize(value: str) -> List[str]:
+    """Normalized words of a string"""
+    return _WORD_RE.findall(normalize_text(value))
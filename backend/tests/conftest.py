@@ -0,0 +1,99 @@
+"""
+Shared fixtures: a throwaway SQLite database and the POI API
+Testler için geçici SQLite veritabanı ve POI API'si
+
+DATABASE_URL is set before any app module is imported, so the engine in
+app.db.session points at the temporary file. Redis is left unconnected;
+the response caches are then skipped and every request hits the database.
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="routewise-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, String
+from sqlalchemy.orm import relationship
+
+from app.db.session import SessionLocal, engine
+from app.models.base import Base
+from app.models.favorite import Favorite  # noqa: F401
+from app.models.interaction import Interaction  # noqa: F401
+from app.models.poi import POI
+from app.models.route import Route  # noqa: F401
+from app.models.user_preferences import UserPreference  # noqa: F401
+from app.services import city_catalogue
+
+
+class User(Base):
+    """
+    The users table on the POI models' Base
+    (app.models.user is declared on app.database.Base, which these models do not share)
+    """
+
+    __tablename__ = "users"
+
+    id = Column(String(36), primary_key=True)
+    favorites = relationship("Favorite", back_populates="user")
+    interactions = relationship("Interaction", back_populates="user")
+    routes = relationship("Route", back_populates="user")
+    preferences = relationship("UserPreference", back_populates="user")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_DB_DIR, ignore_errors=True)
+
+
+CITIES = ("İstanbul", "Ankara", "Izmir")
+CATEGORIES = ("culture", "food", "nightlife", "shopping")
+
+
+@pytest.fixture(scope="session")
+def database():
+    Base.metadata.create_all(engine)
+    city_catalogue.backfill_city_keys(engine)
+    rng = random.Random(0)
+    db = SessionLocal()
+    db.add(User(id="test-user-1"))
+    for i in range(600):
+        db.add(POI(
+            name=f"Place {i}",
+            city=CITIES[i % len(CITIES)],
+            latitude=41.0 + rng.uniform(-0.1, 0.1),
+            longitude=29.0 + rng.uniform(-0.1, 0.1),
+            category=rng.choice(CATEGORIES),
+            # Some listings rows have no rating / popularity yet
+            rating=None if i % 7 == 0 else round(rng.uniform(1.0, 5.0), 1),
+            popularity_score=None if i % 5 == 0 else rng.random(),
+        ))
+    db.commit()
+    db.close()
+    yield engine
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(database):
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client(database):
+    from app.api.v1.endpoints import pois
+
+    city_catalogue.invalidate_catalogue()
+    app = FastAPI()
+    app.include_router(pois.router, prefix="/pois")
+    with TestClient(app) as test_client:
+        yield test_client
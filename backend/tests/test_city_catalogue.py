@@ -0,0 +1,21 @@
+"""City key resolution against the catalogue (SQLite)"""
+
+import pytest
+
+from app.services import city_catalogue
+
+
+@pytest.mark.parametrize(
+    "city, key",
+    [
+        ("İSTANBUL", "istanbul"),
+        ("Ankara", "ankara"),
+        ("ist", "istanbul"),  # prefix of exactly one city
+        ("i", None),  # istanbul and izmir
+        ("bul", None),  # only inside a name
+        ("", None),
+    ],
+)
+def test_resolve_city_key(db, city, key):
+    city_catalogue.invalidate_catalogue()
+    assert city_catalogue.resolve_city_key(db, city) == key
@@ -0,0 +1,44 @@
+"""Geohash cells and circle coverings"""
+
+import numpy as np
+import pytest
+
+from app.services.geo import EARTH_RADIUS_KM
+from app.utils import geohash
+
+
+def test_known_hash():
+    assert geohash.encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+
+@pytest.mark.parametrize("precision", [3, 5, 7])
+def test_cells_contain_their_points(precision):
+    rng = np.random.default_rng(precision)
+    for lat, lon in zip(rng.uniform(-80, 80, 200), rng.uniform(-179, 179, 200)):
+        cell = geohash.encode(lat, lon, precision)
+        min_lat, max_lat, min_lon, max_lon = geohash.bounds(cell)
+        assert min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+        assert geohash.encode(*geohash.center(cell), precision) == cell
+        assert geohash.encode(lat, lon, precision + 1).startswith(cell)
+
+
+def _destination(lat: float, lon: float, bearing: float, distance_km: float):
+    """Point at distance_km from (lat, lon) in the bearing (radians)"""
+    angle = distance_km / EARTH_RADIUS_KM
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2 = np.arcsin(np.sin(lat1) * np.cos(angle) + np.cos(lat1) * np.sin(angle) * np.cos(bearing))
+    lon2 = lon1 + np.arctan2(np.sin(bearing) * np.sin(angle) * np.cos(lat1), np.cos(angle) - np.sin(lat1) * np.sin(lat2))
+    return float(np.degrees(lat2)), float((np.degrees(lon2) + 180.0) % 360.0 - 180.0)
+
+
+@pytest.mark.parametrize("precision, radius_km", [(4, 20.0), (5, 5.0), (6, 2.0), (7, 0.5)])
+def test_covering_holds_every_point_of_the_circle(precision, radius_km):
+    rng = np.random.default_rng(precision)
+    for lat, lon in [(41.0, 29.0), (0.0, 0.0), (-33.9, 151.2), (60.2, 24.9), (41.0, 179.999)]:
+        cells = set(geohash.covering(lat, lon, radius_km, precision))
+        for bearing, fraction in zip(rng.uniform(0, 2 * np.pi, 300), rng.uniform(0, 1, 300)):
+            point = _destination(lat, lon, bearing, radius_km * fraction)
+            assert geohash.encode(*point, precision) in cells
+        # The rim itself
+        for bearing in np.linspace(0, 2 * np.pi, 72, endpoint=False):
+            assert geohash.encode(*_destination(lat, lon, bearing, radius_km), precision) in cells
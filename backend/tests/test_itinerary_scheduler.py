@@ -0,0 +1,60 @@
+"""Time-window scheduling: every scheduled visit fits its windows"""
+
+import numpy as np
+import pytest
+
+from app.services.itinerary_scheduler import ScheduleStop, build_schedule, schedule_stops
+
+DAY_START = 9 * 60
+
+
+def _stops(rng, n: int):
+    stops = []
+    for i in range(n):
+        opens = int(rng.integers(8 * 60, 15 * 60))
+        windows = [(opens, opens + int(rng.integers(60, 240)))]
+        if rng.random() < 0.3:
+            # Closed for lunch: a second window later in the day
+            later = windows[0][1] + 60
+            windows.append((later, later + 180))
+        stops.append(ScheduleStop(f"poi-{i}", int(rng.integers(20, 90)), windows, []))
+    return stops
+
+
+def _travel(rng, n: int) -> np.ndarray:
+    points = rng.uniform(0.0, 5.0, (n + 1, 2))
+    return np.linalg.norm(points[:, None] - points[None], axis=2) * 6.0  # minutes
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_visits_start_and_end_inside_a_window(seed):
+    rng = np.random.default_rng(seed)
+    stops = _stops(rng, 12)
+    travel = _travel(rng, len(stops))
+    order, left_out = schedule_stops(stops, travel, DAY_START, time_budget_ms=50)
+    assert sorted(order + left_out) == list(range(len(stops)))
+
+    schedule = build_schedule(stops, travel, DAY_START, order, [])
+    previous, ready = 0, DAY_START
+    for index, visit in zip(order, schedule.visits):
+        stop = stops[index]
+        assert visit.poi_id == stop.poi_id
+        assert visit.arrival == pytest.approx(ready + travel[previous, index + 1], abs=1)
+        assert visit.start >= visit.arrival
+        assert any(opens <= visit.start and visit.end <= closes for opens, closes in stop.windows)
+        previous, ready = index + 1, visit.end
+
+
+def test_everything_fits_an_open_day():
+    rng = np.random.default_rng(11)
+    stops = [ScheduleStop(f"poi-{i}", 30, [(0, 24 * 60)], []) for i in range(6)]
+    travel = _travel(rng, len(stops))
+    order, left_out = schedule_stops(stops, travel, DAY_START, time_budget_ms=50)
+    assert left_out == [] and sorted(order) == list(range(6))
+
+
+def test_previous_order_is_kept_when_still_feasible():
+    stops = [ScheduleStop(f"poi-{i}", 30, [(0, 24 * 60)], []) for i in range(4)]
+    travel = np.ones((5, 5)) - np.eye(5)
+    order, left_out = schedule_stops(stops, travel, DAY_START, initial_order=[3, 1, 2, 0], time_budget_ms=20)
+    assert order == [3, 1, 2, 0] and left_out == []
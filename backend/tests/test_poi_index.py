@@ -0,0 +1,52 @@
+"""In-process KD-tree index against a brute-force scan"""
+
+import asyncio
+from collections import namedtuple
+
+import numpy as np
+import pytest
+
+from app.services.geo import haversine_km
+from app.services.poi_index import POIIndex
+
+Row = namedtuple("Row", ["id", "latitude", "longitude", "category", "rating", "is_active", "updated_at"])
+
+
+def _rows(rng, n: int):
+    return [
+        Row(f"poi-{i}", 41.0 + rng.normal(0, 0.05), 29.0 + rng.normal(0, 0.05), rng.choice(["food", "culture"]), 4.0, 1, None)
+        for i in range(n)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_queries_match_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    rows = _rows(rng, 2000)
+    index = POIIndex()
+    index.build(rows)
+    lats, lons = np.array([row.latitude for row in rows]), np.array([row.longitude for row in rows])
+
+    for lat, lon in zip(41.0 + rng.normal(0, 0.05, 10), 29.0 + rng.normal(0, 0.05, 10)):
+        distances = haversine_km(lat, lon, lats, lons)
+        expected = {rows[i].id for i in np.flatnonzero(distances <= 2.0)}
+        hits = index.query_radius(lat, lon, 2.0)
+        assert {hit.poi_id for hit in hits} == expected
+        assert [hit.distance_km for hit in hits] == sorted(hit.distance_km for hit in hits)
+
+        nearest = index.query_nearest(lat, lon, 5, category="food")
+        food = [i for i in np.argsort(distances, kind="stable") if rows[i].category == "food"][:5]
+        assert [hit.poi_id for hit in nearest] == [rows[i].id for i in food]
+
+
+def test_reconcile_forgets_deleted_pois(monkeypatch):
+    rows = _rows(np.random.default_rng(0), 50)
+    index = POIIndex()
+    index.build(rows)
+    index.apply([rows[0]._replace(latitude=41.2)])
+    deleted = {rows[0].id, rows[1].id}
+    monkeypatch.setattr(index, "load_active_ids", lambda: {row.id for row in rows} - deleted)
+
+    asyncio.run(index.reconcile())
+    assert index.indexed_ids() == {row.id for row in rows} - deleted
+    assert not deleted & {hit.poi_id for hit in index.query_radius(41.0, 29.0, 100.0)}
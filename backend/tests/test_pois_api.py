@@ -0,0 +1,73 @@
+"""Conditional GET and cursor paging of the POI listings (SQLite)"""
+
+import pytest
+
+from app.models.poi import POI
+from app.utils.pagination import encode_cursor
+
+
+def test_city_listing_answers_matching_etag_with_304(client, db):
+    first = client.get("/pois/city/ankara", params={"limit": 5})
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    # Favorites and deleted rows do not move updated_at, so only the ETag validates
+    assert "last-modified" not in first.headers
+
+    repeat = client.get("/pois/city/ankara", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.content == b""
+
+    poi = db.query(POI).filter(POI.city_key == "ankara").first()
+    poi.rating = 4.95
+    db.commit()
+    changed = client.get("/pois/city/ankara", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_city_listing_ignores_if_modified_since(client):
+    response = client.get(
+        "/pois/city/ankara", params={"limit": 5}, headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}
+    )
+    assert response.status_code == 200
+
+
+def test_cursor_pages_cover_every_row_once(client, db):
+    expected = {
+        poi_id for (poi_id,) in db.query(POI.id).filter(POI.city_key == "istanbul", POI.is_active == 1)
+    }
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 17, "fields": "compact"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/pois/city/istanbul", params=params)
+        assert response.status_code == 200
+        seen.extend(item["id"] for item in response.json())
+        pages += 1
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+
+    assert len(seen) == len(set(seen))
+    assert set(seen) == expected
+    assert pages == -(-len(expected) // 17)
+
+
+def test_cursor_pages_follow_the_offset_order(client):
+    offset_page = client.get("/pois/city/izmir", params={"limit": 10, "offset": 10, "fields": "compact"}).json()
+    first = client.get("/pois/city/izmir", params={"limit": 10, "fields": "compact"})
+    cursor_page = client.get(
+        "/pois/city/izmir", params={"limit": 10, "fields": "compact", "cursor": first.headers["x-next-cursor"]}
+    ).json()
+    assert [item["id"] for item in cursor_page] == [item["id"] for item in offset_page]
+
+
+def test_malformed_cursor_is_rejected(client):
+    assert client.get("/pois/city/izmir", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+@pytest.mark.parametrize("values", [[None, "poi"], ["high", "poi"], [[1], "poi"]])
+def test_search_cursor_with_wrong_types_is_rejected(client, values):
+    response = client.get("/pois/search", params={"q": "place", "cursor": encode_cursor(values)})
+    assert response.status_code == 400
@@ -0,0 +1,76 @@
+"""Encoded polylines, delta encoding and Douglas-Peucker simplification"""
+
+import numpy as np
+import pytest
+
+from app.utils.polyline import decode_polyline, delta_decode, delta_encode, encode_polyline, simplify
+
+
+def _track(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0.0, 0.001, (n, 2))
+    coordinates = np.cumsum(steps, axis=0) + (41.0, 29.0)
+    return [(float(lat), float(lon)) for lat, lon in coordinates]
+
+
+def test_known_polyline():
+    # Example from Google's polyline algorithm documentation
+    points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    assert encode_polyline(points) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@") == pytest.approx(points)
+
+
+@pytest.mark.parametrize("precision", [5, 6])
+def test_polyline_round_trip(precision):
+    points = _track(500) + [(-33.8688, 151.2093), (89.99999, -179.99999), (0.0, 0.0)]
+    decoded = decode_polyline(encode_polyline(points, precision), precision)
+    assert len(decoded) == len(points)
+    assert np.abs(np.subtract(decoded, points)).max() <= 0.5 / 10 ** precision + 1e-12
+
+
+def test_delta_round_trip():
+    points = _track(200, seed=1)
+    decoded = delta_decode(delta_encode(points))
+    assert np.abs(np.subtract(decoded, points)).max() <= 0.5e-5 + 1e-12
+    # Re-encoding decoded points is lossless
+    assert delta_encode(decoded) == delta_encode(points)
+
+
+def test_empty_line():
+    assert decode_polyline(encode_polyline([])) == []
+
+
+def _segment_distances(xy: np.ndarray, path: np.ndarray) -> np.ndarray:
+    """Distance of every point to the nearest segment of path"""
+    starts, ends = path[:-1], path[1:]
+    segments = ends - starts
+    lengths = np.maximum((segments ** 2).sum(axis=1), 1e-300)
+    offsets = xy[:, None, :] - starts[None]
+    t = np.clip((offsets * segments[None]).sum(axis=2) / lengths[None], 0.0, 1.0)
+    nearest = starts[None] + t[..., None] * segments[None]
+    return np.sqrt(((xy[:, None, :] - nearest) ** 2).sum(axis=2)).min(axis=1)
+
+
+@pytest.mark.parametrize("tolerance", [0.0005, 0.002, 0.01])
+def test_simplify_stays_within_tolerance(tolerance):
+    points = _track(400, seed=2)
+    simplified = simplify(points, tolerance)
+
+    assert simplified[0] == points[0] and simplified[-1] == points[-1]
+    assert 2 <= len(simplified) < len(points)
+    # Kept points are a subsequence of the input
+    positions = [points.index(point) for point in simplified]
+    assert positions == sorted(positions)
+
+    def scaled(line):
+        coordinates = np.asarray(line)
+        scale = np.cos(np.radians(np.asarray(points)[:, 0].mean()))
+        return np.column_stack((coordinates[:, 1] * scale, coordinates[:, 0]))
+
+    assert _segment_distances(scaled(points), scaled(simplified)).max() <= tolerance + 1e-12
+
+
+def test_simplify_keeps_short_lines():
+    line = [(41.0, 29.0), (41.1, 29.1)]
+    assert simplify(line, 0.1) == line
+    assert simplify(_track(10), 0) == _track(10)
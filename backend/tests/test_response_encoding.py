@@ -0,0 +1,55 @@
+"""Compression / MessagePack negotiation and the ETag form it leaves"""
+
+import msgpack
+import pytest
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from app.utils.conditional import etag_matches
+from app.utils.response_encoding import CompressionMiddleware, MessagePackMiddleware
+
+ETAG = '"v1"'
+
+
+@pytest.fixture(scope="module")
+def encoded_client():
+    app = FastAPI()
+    app.add_middleware(MessagePackMiddleware)
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get("/items")
+    def items(request: Request, size: int = 100):
+        if etag_matches(request.headers.get("if-none-match"), ETAG):
+            return Response(status_code=304, headers={"ETag": ETAG})
+        body = '{"items":[' + ",".join(["1"] * size) + "]}"
+        return Response(body, media_type="application/json", headers={"ETag": ETAG})
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize(
+    "headers, size",
+    [
+        ({"Accept-Encoding": "gzip"}, 1000),
+        ({"Accept-Encoding": "br"}, 10),  # below minimum_size: sent uncompressed
+        ({"Accept-Encoding": "identity", "Accept": "application/msgpack"}, 1000),
+        ({"Accept-Encoding": "identity"}, 1000),
+    ],
+)
+def test_304_carries_the_etag_form_of_the_200(encoded_client, headers, size):
+    full = encoded_client.get("/items", params={"size": size}, headers=headers)
+    assert full.status_code == 200
+    revalidated = encoded_client.get("/items", params={"size": size}, headers={**headers, "If-None-Match": full.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == full.headers["etag"]
+
+
+def test_reencoded_bodies_get_weak_etags(encoded_client):
+    compressed = encoded_client.get("/items", params={"size": 1000}, headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] == f"W/{ETAG}"
+    packed = encoded_client.get("/items", headers={"Accept-Encoding": "identity", "Accept": "application/msgpack"})
+    assert msgpack.unpackb(packed.content) == {"items": [1] * 100}
+    assert packed.headers["etag"] == f"W/{ETAG}"
+    plain = encoded_client.get("/items", headers={"Accept-Encoding": "identity"})
+    assert plain.headers["etag"] == ETAG
@@ -0,0 +1,147 @@
+"""Contraction hierarchies against plain Dijkstra, and the offline preprocessing step"""
+
+import csv
+import heapq
+import os
+
+import numpy as np
+import pytest
+
+from app.services.road_network import RoadNetwork, contract, preprocess
+
+
+def _random_graph(rng, n: int, extra_edges: int):
+    """Connected directed graph: a random spanning chain plus random (often one-way) edges"""
+    order = rng.permutation(n)
+    edges = []
+    for a, b in zip(order[:-1], order[1:]):
+        edges.append((int(a), int(b)))
+        edges.append((int(b), int(a)))
+    for _ in range(extra_edges):
+        a, b = rng.integers(0, n, 2)
+        edges.append((int(a), int(b)))
+    weights = rng.uniform(1.0, 100.0, len(edges))
+    lengths = rng.uniform(1.0, 500.0, len(edges))
+    return edges, weights, lengths
+
+
+def _dijkstra(n: int, edges, weights, source: int) -> np.ndarray:
+    adjacency = [[] for _ in range(n)]
+    for (a, b), weight in zip(edges, weights):
+        adjacency[a].append((b, weight))
+    distances = np.full(n, np.inf)
+    distances[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        distance, node = heapq.heappop(heap)
+        if distance > distances[node]:
+            continue
+        for target, weight in adjacency[node]:
+            if distance + weight < distances[target]:
+                distances[target] = distance + weight
+                heapq.heappush(heap, (distance + weight, target))
+    return distances
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_hierarchy_distances_match_dijkstra(seed):
+    rng = np.random.default_rng(seed)
+    n = 120
+    edges, weights, lengths = _random_graph(rng, n, 250)
+    sources, targets = zip(*edges)
+    hierarchy = contract(n, sources, targets, weights, lengths)
+
+    origins = [int(node) for node in rng.choice(n, 6, replace=False)]
+    destinations = [int(node) for node in rng.choice(n, 8, replace=False)]
+    table = hierarchy.many_to_many(origins, destinations)
+    for row, origin in zip(table, origins):
+        expected = _dijkstra(n, edges, weights, origin)
+        assert [cell[0] for cell in row] == pytest.approx(expected[destinations].tolist())
+        assert [cell[0] for cell in hierarchy.one_to_many(origin, destinations)] == pytest.approx(
+            expected[destinations].tolist()
+        )
+
+
+def test_unpacked_path_walks_road_edges():
+    rng = np.random.default_rng(5)
+    n = 80
+    edges, weights, lengths = _random_graph(rng, n, 150)
+    sources, targets = zip(*edges)
+    hierarchy = contract(n, sources, targets, weights, lengths)
+    lightest = {}
+    for edge, weight in zip(edges, weights):
+        lightest[edge] = min(weight, lightest.get(edge, np.inf))
+
+    for source, target in rng.integers(0, n, (20, 2)):
+        source, target = int(source), int(target)
+        path = hierarchy.path(source, target)
+        assert path[0] == source and path[-1] == target
+        walked = sum(lightest[edge] for edge in zip(path[:-1], path[1:]))
+        assert walked == pytest.approx(hierarchy.query(source, target)[0])
+
+
+def test_unreachable_nodes():
+    hierarchy = contract(3, [0], [1], [1.0], [10.0])
+    assert hierarchy.query(0, 1) == pytest.approx((1.0, 10.0))
+    assert hierarchy.query(1, 0) is None
+    assert hierarchy.query(0, 2) is None
+
+
+def _write_extract(directory, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    side = 6
+    with open(os.path.join(directory, "nodes.csv"), "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["id", "lat", "lon"])
+        for i in range(side * side):
+            writer.writerow([i + 1, 41.0 + (i // side) * 0.001, 29.0 + (i % side) * 0.001])
+    with open(os.path.join(directory, "edges.csv"), "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["source", "target", "length_m", "foot", "car", "maxspeed_kmh", "oneway"])
+        for i in range(side * side):
+            for j in (i + 1 if (i + 1) % side else None, i + side if i + side < side * side else None):
+                if j is not None:
+                    writer.writerow([i + 1, j + 1, round(float(rng.uniform(80, 120)), 1), 1, 1, 50, int(rng.random() < 0.2)])
+
+
+def test_load_only_maps_preprocessed_files(tmp_path):
+    _write_extract(tmp_path)
+    network = RoadNetwork()
+    # Nothing preprocessed yet: network routing stays off
+    assert network.load(str(tmp_path)) is False
+    assert not (tmp_path / "ch").exists()
+
+    preprocess(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["ch", "edges.csv", "nodes.csv"]
+    assert RoadNetwork().load(str(tmp_path)) is True
+
+    # Re-running replaces the directory without leaving staging copies behind
+    preprocess(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["ch", "edges.csv", "nodes.csv"]
+
+
+def test_stale_preprocessing_is_not_loaded(tmp_path):
+    _write_extract(tmp_path)
+    preprocess(str(tmp_path))
+    _write_extract(tmp_path, seed=1)
+    stat = os.stat(tmp_path / "edges.csv")
+    os.utime(tmp_path / "edges.csv", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert RoadNetwork().load(str(tmp_path)) is False
+
+
+def test_matrices_share_one_search_per_graph(tmp_path):
+    _write_extract(tmp_path)
+    preprocess(str(tmp_path))
+    network = RoadNetwork()
+    assert network.load(str(tmp_path)) is True
+    lats, lons = [41.0, 41.003, 41.005, 41.001], [29.0, 29.004, 29.001, 29.005]
+    speeds = {"walking": 4.5, "cycling": 14.0, "driving": 28.0}
+
+    matrices = network.matrices(lats, lons, speeds)
+    for mode, speed_kmh in speeds.items():
+        distances, durations = network.matrix(lats, lons, mode, speed_kmh)
+        np.testing.assert_allclose(matrices[mode][0], distances)
+        np.testing.assert_allclose(matrices[mode][1], durations)
+    # Walking and cycling share the foot graph: same distances, durations scale with speed
+    np.testing.assert_allclose(matrices["walking"][0], matrices["cycling"][0])
+    np.testing.assert_allclose(matrices["walking"][1] * 4.5, matrices["cycling"][1] * 14.0)
@@ -0,0 +1,54 @@
+"""Visiting order (solve_order) against brute force"""
+
+from itertools import permutations
+
+import numpy as np
+import pytest
+
+from app.services.route_optimizer import EXACT_MAX_STOPS, _nearest_neighbour, path_length, solve_order
+
+
+def _matrix(rng, n: int, symmetric: bool) -> np.ndarray:
+    points = rng.uniform(0.0, 10.0, (n, 2))
+    matrix = np.linalg.norm(points[:, None] - points[None], axis=2)
+    if not symmetric:
+        # One-way streets: each direction its own detour
+        matrix = matrix * rng.uniform(1.0, 1.5, (n, n))
+    return matrix
+
+
+def _shortest(matrix: np.ndarray, fixed_start: bool) -> float:
+    orders = np.array(list(permutations(range(matrix.shape[0]))), dtype=np.intp)
+    if fixed_start:
+        orders = orders[orders[:, 0] == 0]
+    return float(matrix[orders[:, :-1], orders[:, 1:]].sum(axis=1).min())
+
+
+@pytest.mark.parametrize("n", range(1, EXACT_MAX_STOPS + 1))
+@pytest.mark.parametrize("symmetric", [True, False])
+@pytest.mark.parametrize("fixed_start", [False, True])
+def test_small_routes_are_optimal(n, symmetric, fixed_start):
+    rng = np.random.default_rng(n)
+    for _ in range(5):
+        matrix = _matrix(rng, n, symmetric)
+        order = solve_order(matrix, time_budget_ms=1000, fixed_start=fixed_start)
+        assert sorted(order) == list(range(n))
+        if fixed_start:
+            assert order[0] == 0
+        assert path_length(matrix, order) == pytest.approx(_shortest(matrix, fixed_start))
+
+
+@pytest.mark.parametrize("symmetric", [True, False])
+@pytest.mark.parametrize("fixed_start", [False, True])
+def test_local_search_never_worse_than_nearest_neighbour(symmetric, fixed_start):
+    rng = np.random.default_rng(7)
+    for _ in range(10):
+        n = int(rng.integers(EXACT_MAX_STOPS + 1, 16))
+        matrix = _matrix(rng, n, symmetric)
+        order = solve_order(matrix, time_budget_ms=1000, fixed_start=fixed_start)
+        assert sorted(order) == list(range(n))
+        if fixed_start:
+            assert order[0] == 0
+        firsts = [0] if fixed_start else range(n)
+        greedy = min(path_length(matrix, _nearest_neighbour(matrix, first)) for first in firsts)
+        assert path_length(matrix, order) <= greedy + 1e-9
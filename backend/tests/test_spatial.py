@@ -0,0 +1,34 @@
+"""R*Tree spatial index on SQLite: installation and repair of a stale tree"""
+
+from sqlalchemy import create_engine, text
+
+from app.db.spatial import RTREE_TABLE, install_spatial_index, radius_sql
+from app.models.poi import POI
+
+
+def _ids_near(engine, lat: float, lon: float, radius_km: float):
+    sql, params = radius_sql("sqlite", lat, lon, radius_km)
+    with engine.connect() as connection:
+        return sorted(row.id for row in connection.execute(text(f"SELECT id FROM pois WHERE {sql}"), params))
+
+
+def test_stale_tree_is_rebuilt_on_install(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'spatial.db'}")
+    POI.__table__.create(engine)  # installs the index with the table
+    with engine.begin() as connection:
+        for i in range(10):
+            connection.execute(POI.__table__.insert().values(
+                id=f"poi-{i}", name=f"Place {i}", category="food", latitude=41.0 + i * 0.01, longitude=29.0
+            ))
+    assert _ids_near(engine, 41.0, 29.0, 0.5) == ["poi-0"]
+
+    # Entries that no longer match their rows, e.g. after rowids were renumbered
+    with engine.begin() as connection:
+        connection.execute(text(f"UPDATE {RTREE_TABLE} SET min_lat = 41.05, max_lat = 41.05 WHERE id = 1"))
+        connection.execute(text(f"DELETE FROM {RTREE_TABLE} WHERE id = 3"))
+    assert _ids_near(engine, 41.0, 29.0, 0.5) == []
+
+    assert install_spatial_index(engine) is True
+    assert _ids_near(engine, 41.0, 29.0, 0.5) == ["poi-0"]
+    assert _ids_near(engine, 41.02, 29.0, 0.5) == ["poi-2"]
+    engine.dispose()